@@ -5,6 +5,7 @@
 from odoo import models, fields, api
 from odoo.addons.connector.connector import ConnectorEnvironment
 from odoo.addons.connector.checkpoint import checkpoint
+from .unit.binder import clear_binder_cache
 
 
 def get_environment(session, model_name, backend_id=None):
@@ -48,6 +49,18 @@ class CarepointBinding(models.AbstractModel):
     carepoint_id = fields.Char(string='ID on Carepoint')
     created_at = fields.Date('Created At (on Carepoint)')
     updated_at = fields.Date('Updated At (on Carepoint)')
+    import_hash = fields.Char(
+        readonly=True,
+        copy=False,
+        help='Fingerprint of the Carepoint data last imported, used to skip '
+             'the imports of unchanged records.',
+    )
+    export_hash = fields.Char(
+        readonly=True,
+        copy=False,
+        help='Hash of the values last exported to Carepoint, used to skip '
+             'the exports that would not change anything.',
+    )
 
     _sql_constraints = [
         ('carepoint_uniq', 'unique(backend_id, carepoint_id)',
@@ -63,6 +76,12 @@ class CarepointBinding(models.AbstractModel):
             limit=1,
         )
 
+    @api.multi
+    def unlink(self):
+        """ It drops the binder cache, which may point to these bindings """
+        clear_binder_cache(self.env.cr)
+        return super(CarepointBinding, self).unlink()
+
 
 def add_checkpoint(session, model_name, record_id, backend_id):
     """ Add a row in the model ``connector.checkpoint`` for a record,
@@ -2,8 +2,18 @@
 # Copyright 2015-2016 LasLabs Inc.
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+import threading
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
 from odoo.addons.connector.connector import Binder
-from .unit.export_synchronizer import export_record
+from odoo.addons.connector.exception import NoConnectorUnitError
+from .unit.export_synchronizer import (CarepointExporter,
+                                       delay_export_coalesced,
+                                       export_batch,
+                                       )
+from .unit.mapper import export_source_fields
 # from .unit.delete_synchronizer import export_delete_record
 from .connector import get_environment
 from odoo.addons.connector.event import (on_record_write,
@@ -15,6 +25,85 @@ from odoo.addons.connector.event import (on_record_write,
 import logging
 _logger = logging.getLogger(__name__)
 
+# Fields read by the export mappers, keyed by mapper class
+_export_fields = {}
+
+# Maximum amount of bindings exported by an ``export_batch`` job
+EXPORT_BATCH_SIZE = 100
+
+# Thread-local state of the current ``export_collector``. Its ``exports``
+# attribute maps ``(binding model, fields)`` to the ``(session, ids)`` of
+# the bindings to export. It is None out of a collector.
+_collector = threading.local()
+
+
+@contextmanager
+def export_collector():
+    """ Collect the exports requested by the consumers in the block, then
+    delay them in batches (see :func:`delay_export_batch`) when it exits
+    Nothing is delayed if the block raises. Nested blocks join the outer
+    one.
+    """
+    if getattr(_collector, 'exports', None) is not None:
+        yield
+        return
+    _collector.exports = OrderedDict()
+    try:
+        yield
+        exports = _collector.exports
+    finally:
+        _collector.exports = None
+    for (model_name, fields), (session, binding_ids) in exports.items():
+        delay_export_batch(session, model_name, binding_ids,
+                           fields=fields and list(fields))
+
+
+def delay_export_batch(session, model_name, binding_ids, fields=None):
+    """ Delay the export of several bindings in ``export_batch`` jobs
+    Each job exports at most ``EXPORT_BATCH_SIZE`` bindings. A single
+    binding is delayed with :func:`delay_export_coalesced` instead.
+    """
+    if len(binding_ids) == 1:
+        delay_export_coalesced(session, model_name, binding_ids[0],
+                               fields=fields)
+        return
+    for start in range(0, len(binding_ids), EXPORT_BATCH_SIZE):
+        export_batch.delay(session, model_name,
+                           binding_ids[start:start + EXPORT_BATCH_SIZE],
+                           fields=fields)
+
+
+def _delay_binding_export(session, model_name, binding_id, fields=None):
+    """ Delay the export of a binding, or add it to the current
+    ``export_collector``
+    """
+    exports = getattr(_collector, 'exports', None)
+    if exports is None:
+        delay_export_coalesced(session, model_name, binding_id,
+                               fields=fields)
+        return
+    key = (model_name, fields and tuple(sorted(fields)))
+    _session, binding_ids = exports.setdefault(key, (session, []))
+    if binding_id not in binding_ids:
+        binding_ids.append(binding_id)
+
+
+def get_export_fields(session, binding):
+    """ Return the fields read by the export mapper of a binding
+    :param binding: Singleton of the binding record
+    :return: Set of field names, or None if they are unknown
+    :rtype: set or None
+    """
+    env = get_environment(session, binding._name, binding.backend_id.id)
+    try:
+        mapper = env.get_connector_unit(CarepointExporter).mapper
+    except NoConnectorUnitError:
+        return None
+    mapper_class = type(mapper)
+    if mapper_class not in _export_fields:
+        _export_fields[mapper_class] = export_source_fields(mapper)
+    return _export_fields[mapper_class]
+
 
 # @on_record_create(model_names=['carepoint.medical.patient',
 #                                'carepoint.carepoint.address',
@@ -28,7 +117,7 @@ def delay_export(session, model_name, record_id, vals):
     if session.context.get('connector_no_export'):
         return
     fields = vals.keys()
-    export_record.delay(session, model_name, record_id, fields=fields)
+    delay_export_coalesced(session, model_name, record_id, fields=fields)
 
 
 @on_record_write(model_names=['medical.prescription.order.line',
@@ -54,8 +143,13 @@ def delay_export_all_bindings(session, model_name, record_id, vals):
     record = session.env[model_name].browse(record_id)
     fields = vals.keys()
     for binding in record.carepoint_bind_ids:
-        export_record.delay(session, binding._name, binding.id,
-                            fields=fields)
+        export_fields = get_export_fields(session, binding)
+        if export_fields is not None and export_fields.isdisjoint(fields):
+            _logger.debug('No exported field written on %s, %s, skipping',
+                          binding._name, binding.id)
+            continue
+        _delay_binding_export(session, binding._name, binding.id,
+                              fields=fields)
 
 
 @on_record_create(model_names=['medical.prescription.order.line',
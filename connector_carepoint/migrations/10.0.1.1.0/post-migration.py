@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# Copyright 2015-2016 LasLabs Inc.
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, SUPERUSER_ID
+
+# Former import date columns of the backend, with the model and change date
+# column they were importing
+FROM_DATE_COLUMNS = [
+    ('import_items_from_date', 'carepoint.carepoint.item', 'chg_date'),
+    ('import_patients_from_date', 'carepoint.medical.patient', 'chg_date'),
+    ('import_physicians_from_date', 'carepoint.medical.physician',
+     'chg_date'),
+    ('import_prescriptions_from_date', 'carepoint.rx.ord.ln', 'chg_date'),
+    ('import_sales_from_date', 'carepoint.sale.order.line', 'chg_date'),
+    ('import_addresses_from_date', 'carepoint.carepoint.address',
+     'chg_date'),
+    ('import_phones_from_date', 'carepoint.carepoint.phone', 'chg_date'),
+    ('import_pickings_from_date', 'carepoint.stock.picking', 'chg_date'),
+    ('import_invoices_from_date', 'carepoint.account.invoice.line',
+     'primary_pay_date'),
+]
+
+
+def migrate(cr, version):
+    """ Move the import dates of the backends to their watermarks """
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    Watermark = env['carepoint.sync.watermark']
+    for column, model, chg_date_field in FROM_DATE_COLUMNS:
+        cr.execute(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'carepoint_backend' AND column_name = %s",
+            (column, ),
+        )
+        if not cr.fetchone():
+            continue
+        cr.execute(
+            'SELECT id, %s FROM carepoint_backend WHERE %s IS NOT NULL' % (
+                column, column,
+            )
+        )
+        for backend_id, from_date in cr.fetchall():
+            backend = env['carepoint.backend'].browse(backend_id)
+            watermark = Watermark._get_watermark(
+                backend, model, chg_date_field,
+            )
+            watermark.low_mark = from_date
+        cr.execute(
+            'ALTER TABLE carepoint_backend DROP COLUMN %s' % column
+        )
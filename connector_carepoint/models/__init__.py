@@ -4,8 +4,12 @@
 
 # Backend
 from . import carepoint_backend
+from . import carepoint_sync_watermark
+from . import carepoint_import_window
+from . import carepoint_import_batch
 
 # Base Models
+from . import base
 from . import res_users
 from . import sale_order
 from . import sale_order_line
@@ -13,6 +17,7 @@ from . import procurement_order
 from . import account_invoice_line
 from . import stock_picking
 from . import stock_warehouse
+from . import queue_job
 
 # Address / Relations
 from . import address
@@ -12,7 +12,7 @@ from odoo.addons.connector.unit.mapper import (mapping,
                                                none,
                                                )
 from ..unit.backend_adapter import CarepointCRUDAdapter
-from ..unit.mapper import CarepointImportMapper
+from ..unit.mapper import CarepointImportMapper, reads
 from ..unit.mapper import trim_and_titleize
 from ..backend import carepoint
 from ..unit.import_synchronizer import (DelayedBatchImporter,
@@ -147,6 +147,7 @@ class CarepointAddressImportMapper(CarepointImportMapper):
     ]
 
     @mapping
+    @reads('zip', 'zip_plus4')
     def zip(self, record):
         zip_plus4 = (record['zip_plus4'] or '').strip()
         _zip = (record['zip'] or '').strip()
@@ -155,6 +156,7 @@ class CarepointAddressImportMapper(CarepointImportMapper):
         return {'zip': _zip}
 
     @mapping
+    @reads('state_cd')
     def state_id(self, record):
         state_id = self.env['res.country.state'].search([
             ('code', '=', record['state_cd'].strip()),
@@ -167,6 +169,7 @@ class CarepointAddressImportMapper(CarepointImportMapper):
         }
 
     @mapping
+    @reads('addr_id')
     def carepoint_id(self, record):
         return {'carepoint_id': record['addr_id']}
 
@@ -211,6 +214,7 @@ class CarepointAddressExportMapper(ExportMapper):
         return {'country_cd': record.country_id.code}
 
     @mapping
+    @reads('carepoint_id')
     def addr_id(self, record):
         return {'addr_id': record.carepoint_id}
 
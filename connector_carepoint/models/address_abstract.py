@@ -5,10 +5,11 @@
 import logging
 from odoo import models, fields, api, _
 from odoo.addons.connector.unit.mapper import (mapping,
+                                               changed_by,
                                                only_create,
                                                ExportMapper,
                                                )
-from ..unit.mapper import CarepointImportMapper
+from ..unit.mapper import CarepointImportMapper, reads
 from ..backend import carepoint
 from ..unit.import_synchronizer import CarepointImporter
 from ..unit.export_synchronizer import CarepointExporter
@@ -201,6 +202,7 @@ class CarepointAddressAbstractImportMapper(CarepointImportMapper):
 
     @mapping
     @only_create
+    @reads('addr_id')
     def address_id(self, record):
         binder = self.binder_for('carepoint.carepoint.address')
         address_id = binder.to_odoo(record['addr_id'])
@@ -228,12 +230,14 @@ class CarepointAddressAbstractImporter(CarepointImporter):
 class CarepointAddressAbstractExportMapper(ExportMapper):
 
     @mapping
+    @changed_by('address_id')
     def addr_id(self, binding):
         binder = self.binder_for('carepoint.carepoint.address')
         rec_id = binder.to_backend(binding.address_id.id)
         return {'addr_id': rec_id}
 
     @mapping
+    @reads()
     def static_defaults(self, binding, addr_type='business'):
         res = {
             'priority': 1,
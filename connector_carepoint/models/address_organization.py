@@ -11,6 +11,7 @@ from odoo.addons.connector.unit.mapper import (mapping,
 from ..unit.backend_adapter import CarepointCRUDAdapter
 from ..backend import carepoint
 from ..unit.import_synchronizer import DelayedBatchImporter
+from ..unit.mapper import reads
 
 from .address_abstract import (CarepointAddressAbstractImportMapper,
                                CarepointAddressAbstractImporter,
@@ -79,6 +80,7 @@ class CarepointAddressOrganizationImportMapper(
 
     @mapping
     @only_create
+    @reads('org_id')
     def partner_id(self, record):
         """ It returns either the commercial partner or parent & defaults """
         binder = self.binder_for('carepoint.medical.organization')
@@ -89,6 +91,7 @@ class CarepointAddressOrganizationImportMapper(
         )
 
     @mapping
+    @reads('addr_id', 'org_id')
     def carepoint_id(self, record):
         return {'carepoint_id': '%d,%d' % (record['org_id'],
                                            record['addr_id'])}
@@ -129,6 +132,7 @@ class CarepointAddressOrganizationExportMapper(
     _model_name = 'carepoint.carepoint.address.organization'
 
     @mapping
+    @reads('partner_id', 'res_id')
     def org_id(self, binding):
         binder = self.binder_for('carepoint.org.bind')
         rec_id = binder.to_backend(binding.res_id)
@@ -11,6 +11,7 @@ from odoo.addons.connector.unit.mapper import (mapping,
 from ..unit.backend_adapter import CarepointCRUDAdapter
 from ..backend import carepoint
 from ..unit.import_synchronizer import DelayedBatchImporter
+from ..unit.mapper import reads
 
 from .address_abstract import (CarepointAddressAbstractImportMapper,
                                CarepointAddressAbstractImporter,
@@ -79,6 +80,7 @@ class CarepointAddressPatientImportMapper(
 
     @mapping
     @only_create
+    @reads('pat_id')
     def partner_id(self, record):
         """ It returns either the commercial partner or parent & defaults """
         binder = self.binder_for('carepoint.medical.patient')
@@ -90,6 +92,7 @@ class CarepointAddressPatientImportMapper(
 
     @mapping
     @only_create
+    @reads('pat_id')
     def res_model_and_id(self, record):
         binder = self.binder_for('carepoint.medical.patient')
         patient_id = binder.to_odoo(record['pat_id'], browse=True)
@@ -99,6 +102,7 @@ class CarepointAddressPatientImportMapper(
         )
 
     @mapping
+    @reads('addr_id', 'pat_id')
     def carepoint_id(self, record):
         return {'carepoint_id': '%d,%d' % (record['pat_id'],
                                            record['addr_id'])}
@@ -137,11 +141,13 @@ class CarepointAddressPatientExportMapper(
     _model_name = 'carepoint.carepoint.address.patient'
 
     @mapping
+    @reads()
     def static_defaults(self, binding):
         sup = super(CarepointAddressPatientExportMapper, self)
         return sup.static_defaults(binding, 'home')
 
     @mapping
+    @reads('partner_id', 'res_id')
     def pat_id(self, binding):
         binder = self.binder_for('carepoint.medical.patient')
         rec_id = binder.to_backend(binding.res_id)
@@ -11,6 +11,7 @@ from odoo.addons.connector.unit.mapper import (mapping,
 from ..unit.backend_adapter import CarepointCRUDAdapter
 from ..backend import carepoint
 from ..unit.import_synchronizer import DelayedBatchImporter
+from ..unit.mapper import reads
 
 from .address_abstract import (CarepointAddressAbstractImportMapper,
                                CarepointAddressAbstractImporter,
@@ -79,6 +80,7 @@ class CarepointAddressPhysicianImportMapper(
 
     @mapping
     @only_create
+    @reads('md_id')
     def partner_id(self, record):
         """ It returns either the commercial partner or parent & defaults """
         binder = self.binder_for('carepoint.medical.physician')
@@ -90,6 +92,7 @@ class CarepointAddressPhysicianImportMapper(
 
     @mapping
     @only_create
+    @reads('md_id')
     def res_model_and_id(self, record):
         binder = self.binder_for('carepoint.medical.physician')
         physician = binder.to_odoo(record['md_id'], browse=True)
@@ -99,6 +102,7 @@ class CarepointAddressPhysicianImportMapper(
         )
 
     @mapping
+    @reads('addr_id', 'md_id')
     def carepoint_id(self, record):
         return {'carepoint_id': '%d,%d' % (record['md_id'],
                                            record['addr_id'])}
@@ -137,6 +141,7 @@ class CarepointAddressPhysicianExportMapper(
     _model_name = 'carepoint.carepoint.address.physician'
 
     @mapping
+    @reads('partner_id', 'res_id')
     def md_id(self, binding):
         binder = self.binder_for('carepoint.medical.physician')
         rec_id = binder.to_backend(binding.res_id)
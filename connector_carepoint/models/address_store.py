@@ -11,6 +11,7 @@ from odoo.addons.connector.unit.mapper import (mapping,
 from ..unit.backend_adapter import CarepointCRUDAdapter
 from ..backend import carepoint
 from ..unit.import_synchronizer import DelayedBatchImporter
+from ..unit.mapper import reads
 
 from .address_abstract import (CarepointAddressAbstractImportMapper,
                                CarepointAddressAbstractImporter,
@@ -72,6 +73,7 @@ class CarepointAddressStoreImportMapper(
 
     @mapping
     @only_create
+    @reads('store_id')
     def partner_id(self, record):
         """ It returns either the commercial partner or parent & defaults """
         binder = self.binder_for('carepoint.carepoint.store')
@@ -82,6 +84,7 @@ class CarepointAddressStoreImportMapper(
         )
 
     @mapping
+    @reads('addr_id', 'store_id')
     def carepoint_id(self, record):
         return {'carepoint_id': '%d,%d' % (record['store_id'],
                                            record['addr_id'])}
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Copyright 2015-2016 LasLabs Inc.
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, models
+
+from ..consumer import export_collector
+
+
+class Base(models.AbstractModel):
+    """ Exports the bindings of the records written together in batches
+    (see :func:`export_collector`), instead of one job per binding
+    """
+    _inherit = 'base'
+
+    @api.multi
+    def write(self, vals):
+        if len(self) < 2 or 'carepoint_bind_ids' not in self._fields:
+            return super(Base, self).write(vals)
+        with export_collector():
+            return super(Base, self).write(vals)
@@ -6,10 +6,11 @@ import logging
 from odoo import models, fields, api
 from odoo.addons.connector.connector import ConnectorUnit
 from odoo.addons.connector.unit.mapper import (mapping,
+                                               changed_by,
                                                ExportMapper,
                                                )
 from ..unit.backend_adapter import CarepointCRUDAdapter
-from ..unit.mapper import CarepointImportMapper
+from ..unit.mapper import CarepointImportMapper, reads
 from ..backend import carepoint
 from ..unit.import_synchronizer import (DelayedBatchImporter,
                                         CarepointImporter,
@@ -145,16 +146,19 @@ class CarepointAccountExportMapper(ExportMapper):
     direct = []
 
     @mapping
+    @changed_by('patient_id')
     def pat_id(self, binding):
         binder = self.binder_for('carepoint.medical.patient')
         patient_id = binder.to_backend(binding.patient_id)
         return {'pat_id': patient_id}
 
     @mapping
+    @reads('carepoint_id')
     def ID(self, binding):
         return {'ID': binding.carepoint_id}
 
     @mapping
+    @reads()
     def static_defaults(self, binding):
         return {
             'acct_type_cn': 0,
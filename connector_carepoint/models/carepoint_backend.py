@@ -10,10 +10,15 @@ from odoo.exceptions import ValidationError
 from odoo.addons.connector.session import ConnectorSession
 from odoo.addons.base.res.res_partner import _tz_get
 from ..unit.import_synchronizer import (import_batch,
-                                        import_record,
+                                        delay_import_coalesced,
                                         DirectBatchImporter,
                                         )
+from ..unit.backend_adapter import (CONNECTION_FIELDS,
+                                    CarepointCRUDAdapter,
+                                    clear_carepoint,
+                                    )
 from ..backend import carepoint
+from ..connector import get_environment
 
 _logger = logging.getLogger(__name__)
 
@@ -23,6 +28,7 @@ except ImportError:
     _logger.warning('Cannot import CarePoint')
 
 IMPORT_DELTA_BUFFER = 30  # seconds
+IMPORT_MIN_WINDOW = 60  # seconds
 
 
 class CarepointBackend(models.Model):
@@ -32,6 +38,20 @@ class CarepointBackend(models.Model):
 
     _backend_type = 'carepoint'
 
+    # Models synchronized before any import, see synchronize_metadata
+    _metadata_models = ['carepoint.carepoint.store',
+                        # 'carepoint.res.users',
+                        ]
+
+    # Models always imported incrementally, see import_watermarks
+    _watermark_models = [('carepoint.rx.ord.ln', 'chg_date'),
+                         ('carepoint.sale.order.line', 'chg_date'),
+                         ('carepoint.medical.physician', 'chg_date'),
+                         ('carepoint.medical.patient', 'chg_date'),
+                         ('carepoint.carepoint.address', 'chg_date'),
+                         ('carepoint.carepoint.phone', 'chg_date'),
+                         ]
+
     _sql_constraints = [
         ('sale_prefix_uniq', 'unique(sale_prefix)',
          "A backend with the same sale prefix already exists"),
@@ -64,6 +84,38 @@ class CarepointBackend(models.Model):
         default=30,
         help='This is passed to SQLAlchemy `create_engine`',
     )
+    db_sequence_block_size = fields.Integer(
+        required=True,
+        default=1,
+        help='Amount of primary keys reserved at once from each Carepoint '
+             'sequence when creating records. Reserved keys that are not '
+             'used before the server restarts are skipped, leaving gaps '
+             'in the sequence.',
+    )
+    import_window_size = fields.Integer(
+        required=True,
+        default=50000,
+        help='Estimated amount of records imported by each batch job of '
+             'the incremental imports. Larger imports are split by change '
+             'date in windows of about this size, imported in parallel.',
+    )
+    metadata_sync_ttl = fields.Integer(
+        string='Metadata Sync Interval',
+        required=True,
+        default=600,
+        help='Seconds during which the metadata (stores) synchronized with '
+             'Carepoint are reused by the imports. The metadata are then '
+             'only synchronized again if they changed on Carepoint.',
+    )
+    metadata_sync_date = fields.Datetime(
+        string='Metadata Sync Date',
+        readonly=True,
+    )
+    metadata_signature = fields.Char(
+        readonly=True,
+        help='Signature of the Carepoint metadata at the last '
+             'synchronization.',
+    )
     server = fields.Char(
         required=True,
         help="IP/DNS to Carepoint database",
@@ -180,15 +232,17 @@ class CarepointBackend(models.Model):
         comodel_name='account.payment.term',
         required=True,
     )
-    import_items_from_date = fields.Datetime()
-    import_patients_from_date = fields.Datetime()
-    import_physicians_from_date = fields.Datetime()
-    import_prescriptions_from_date = fields.Datetime()
-    import_sales_from_date = fields.Datetime()
-    import_addresses_from_date = fields.Datetime()
-    import_phones_from_date = fields.Datetime()
-    import_pickings_from_date = fields.Datetime()
-    import_invoices_from_date = fields.Datetime()
+    watermark_ids = fields.One2many(
+        string='Incremental Imports',
+        comodel_name='carepoint.sync.watermark',
+        inverse_name='backend_id',
+    )
+    import_batch_ids = fields.One2many(
+        string='Batch Imports',
+        comodel_name='carepoint.import.batch',
+        inverse_name='backend_id',
+        readonly=True,
+    )
     company_id = fields.Many2one(
         string='Company',
         comodel_name='res.company',
@@ -225,6 +279,14 @@ class CarepointBackend(models.Model):
                     'This company already has a default CarePoint connector.',
                 ))
 
+    @api.multi
+    def write(self, vals):
+        """ It drops the pooled CarePoint connections on settings change """
+        res = super(CarepointBackend, self).write(vals)
+        if any(name in vals for name in CONNECTION_FIELDS):
+            clear_carepoint(self.ids)
+        return res
+
     @api.model
     def __get_model_session(self):
         return ConnectorSession(
@@ -243,62 +305,155 @@ class CarepointBackend(models.Model):
     @api.multi
     def check_carepoint_structure(self):
         """ Used in each data import """
-        self.synchronize_metadata()
+        for backend in self:
+            if not backend._metadata_is_current():
+                backend.synchronize_metadata()
+        return True
+
+    @api.multi
+    def _get_metadata_signature(self):
+        """ Return the signature of the metadata on Carepoint
+        It changes whenever metadata records are added, removed or changed.
+        :rtype: str
+        """
+        self.ensure_one()
+        session = self.__get_model_session()
+        signatures = []
+        for model in self._metadata_models:
+            env = get_environment(session, model, self.id)
+            adapter = env.get_connector_unit(CarepointCRUDAdapter)
+            signatures.append(adapter.get_change_signature())
+        return ';'.join(signatures)
+
+    @api.multi
+    def _metadata_is_current(self):
+        """ Return True if the metadata do not need to be synchronized
+        They are current during ``metadata_sync_ttl`` after a
+        synchronization, then as long as their signature is the same.
+        """
+        self.ensure_one()
+        if not self.metadata_sync_date:
+            return False
+        now = fields.Datetime.from_string(fields.Datetime.now())
+        sync_date = fields.Datetime.from_string(self.metadata_sync_date)
+        if now - sync_date < timedelta(seconds=self.metadata_sync_ttl):
+            return True
+        if self._get_metadata_signature() != self.metadata_signature:
+            return False
+        self.write({'metadata_sync_date': fields.Datetime.to_string(now)})
         return True
 
     @api.multi
     def synchronize_metadata(self):
         session = self.__get_model_session()
         for backend in self:
-            for model in ('carepoint.carepoint.store',
-                          # 'carepoint.res.users',
-                          ):
+            # Read before the import, so that changes done meanwhile are
+            # synchronized next time
+            signature = backend._get_metadata_signature()
+            for model in self._metadata_models:
                 # import directly, do not delay because this
                 # is a fast operation, a direct return is fine
                 # and it is simpler to import them sequentially
                 import_batch(session, model, backend.id)
+            backend.write({
+                'metadata_sync_date': fields.Datetime.now(),
+                'metadata_signature': signature,
+            })
         return True
 
     @api.multi
     def _import_all(self, model):
         session = self.__get_model_session()
+        Batch = self.env['carepoint.import.batch']
         for backend in self:
             backend.check_carepoint_structure()
-            import_batch.delay(session, model, backend.id)
+            batch = Batch._new_batch(backend, model)
+            import_batch.delay(session, model, backend.id, batch_id=batch.id)
 
     @api.multi
-    def _import_from_date(self, model, from_date_field,
-                          chg_date_field='chg_date'):
+    def _import_from_date(self, model, chg_date_field='chg_date'):
+        """ Import the records of a model changed since its watermark
+        :param model: Name of the binding model to import
+        :type model: str
+        :param chg_date_field: Carepoint column of the change dates
+        :type chg_date_field: str
+        """
         session = self.__get_model_session()
         utc_now = pytz.timezone('UTC').localize(datetime.utcnow())
+        Watermark = self.env['carepoint.sync.watermark']
         for backend in self:
             local_tz = pytz.timezone(backend.server_tz)
             import_start_time = utc_now.astimezone(local_tz).replace(
                 tzinfo=None
             )
             backend.check_carepoint_structure()
-            filters = {chg_date_field: {'<=': import_start_time}}
-            from_date = getattr(backend, from_date_field)
-            if from_date:
-                filters[chg_date_field]['>='] = fields.Datetime.from_string(
-                    from_date
+            watermark = Watermark._get_watermark(
+                backend, model, chg_date_field,
+            )
+            watermark._resume_windows(session)
+            slices = backend._slice_import_range(
+                model, chg_date_field, watermark._get_import_start(),
+                import_start_time,
+            )
+            windows = watermark._add_windows(slices)
+            for window in windows.filtered(lambda r: r.state == 'pending'):
+                window._delay_import(session)
+            watermark._advance()
+
+    @api.multi
+    def import_watermarks(self):
+        """ Run the incremental imports of all of the watermarks
+        The watermarks of ``_watermark_models`` are created when missing.
+        """
+        Watermark = self.env['carepoint.sync.watermark']
+        for backend in self:
+            for model, chg_date_field in self._watermark_models:
+                Watermark._get_watermark(backend, model, chg_date_field)
+            for watermark in backend.watermark_ids:
+                backend._import_from_date(
+                    watermark.model, watermark.chg_date_field,
                 )
-            else:
-                from_date = None
-            import_batch.delay(session, model, backend.id, filters=filters)
-            # Records from Carepoint are imported based on their `add_date`
-            # date.  This date is set on Carepoint at the beginning of a
-            # transaction, so if the import is run between the beginning and
-            # the end of a transaction, the import of a record may be
-            # missed.  That's why we add a small buffer back in time where
-            # the eventually missed records will be retrieved.  This also
-            # means that we'll have jobs that import twice the same records,
-            # but this is not a big deal because they will be skipped when
-            # the last `sync_date` is the same.
-            next_time = (import_start_time -
-                         timedelta(seconds=IMPORT_DELTA_BUFFER))
-            next_time = fields.Datetime.to_string(next_time)
-            backend.write({from_date_field: next_time})
+        return True
+
+    @api.model
+    def cron_import_watermarks(self):
+        self.search([]).import_watermarks()
+
+    @api.multi
+    def _slice_import_range(self, model, chg_date_field, date_from, date_to):
+        """ Split a range of change dates in windows of about
+        ``import_window_size`` records
+        The amount of records in the range is read from Carepoint, then
+        the range is halved until its windows are small enough.
+        :param date_from: Start of the range, None for the whole history
+        :type date_from: datetime or None
+        :param date_to: End of the range
+        :type date_to: datetime
+        :return: ``(date_from, date_to, record count)`` of each window,
+            ordered by date
+        :rtype: list
+        """
+        self.ensure_one()
+        filters = {chg_date_field: {'<=': date_to}}
+        if date_from:
+            filters[chg_date_field]['>='] = date_from
+        session = self.__get_model_session()
+        env = get_environment(session, model, self.id)
+        adapter = env.get_connector_unit(CarepointCRUDAdapter)
+        count, min_date, _max_date = adapter.get_date_range(
+            chg_date_field, **filters
+        )
+        if count <= self.import_window_size or not min_date:
+            return [(date_from, date_to, count)]
+        start = max(date_from, min_date) if date_from else min_date
+        if date_to - start < timedelta(seconds=IMPORT_MIN_WINDOW):
+            return [(date_from, date_to, count)]
+        middle = start + (date_to - start) / 2
+        return (
+            self._slice_import_range(model, chg_date_field, date_from,
+                                     middle) +
+            self._slice_import_range(model, chg_date_field, middle, date_to)
+        )
 
     @api.model
     def resync_all(self, binding_model):
@@ -306,98 +461,37 @@ class CarepointBackend(models.Model):
         session = self.__get_model_session()
         for record_id in self.env[binding_model].search([]):
             for binding_id in record_id.carepoint_bind_ids:
-                import_record.delay(session,
-                                    binding_model,
-                                    binding_id.backend_id.id,
-                                    binding_id.carepoint_id,
-                                    force=True,
-                                    )
+                delay_import_coalesced(session,
+                                       binding_model,
+                                       binding_id.backend_id.id,
+                                       binding_id.carepoint_id,
+                                       force=True,
+                                       )
 
     @api.model
     def force_sync(self, binding_model, remote_pk, backend_id):
         """ Force sycronization based on model and primary key """
         session = self.__get_model_session()
-        import_record.delay(session,
-                            binding_model,
-                            backend_id,
-                            remote_pk,
-                            force=True,
-                            )
-
-    @api.multi
-    def import_carepoint_item(self):
-        self._import_from_date('carepoint.carepoint.item',
-                               'import_items_from_date')
-        return True
-
-    @api.multi
-    def import_medical_patient(self):
-        self._import_from_date('carepoint.medical.patient',
-                               'import_patients_from_date')
-        return True
-
-    @api.model
-    def cron_import_medical_patient(self):
-        self.search([]).import_medical_patient()
-
-    @api.multi
-    def import_medical_physician(self):
-        self._import_from_date('carepoint.medical.physician',
-                               'import_physicians_from_date')
-        return True
-
-    @api.model
-    def cron_import_medical_physician(self):
-        self.search([]).import_medical_physician()
+        delay_import_coalesced(session,
+                               binding_model,
+                               backend_id,
+                               remote_pk,
+                               force=True,
+                               )
 
     @api.multi
-    def import_medical_prescription(self):
-        self._import_from_date('carepoint.rx.ord.ln',
-                               'import_prescriptions_from_date')
+    def import_updated(self):
+        """ Import the records changed since the watermark of the model in
+        the ``carepoint_import_model`` context key
+        The Carepoint column of the change dates is read from the
+        ``carepoint_chg_date_field`` context key, ``chg_date`` by default.
+        """
+        self._import_from_date(
+            self.env.context['carepoint_import_model'],
+            self.env.context.get('carepoint_chg_date_field', 'chg_date'),
+        )
         return True
 
-    @api.model
-    def cron_import_medical_prescription(self):
-        self.search([]).import_medical_prescription()
-
-    @api.multi
-    def import_sale_order(self):
-        self._import_from_date('carepoint.sale.order.line',
-                               'import_sales_from_date')
-
-    @api.model
-    def cron_import_sale_order(self):
-        self.search([]).import_sale_order()
-
-    @api.multi
-    def import_stock_picking(self):
-        self._import_from_date('carepoint.stock.picking',
-                               'import_pickings_from_date')
-
-    @api.multi
-    def import_account_invoice(self):
-        self._import_from_date('carepoint.account.invoice.line',
-                               'import_invoices_from_date',
-                               'primary_pay_date')
-
-    @api.multi
-    def import_address(self):
-        self._import_from_date('carepoint.carepoint.address',
-                               'import_addresses_from_date')
-
-    @api.model
-    def cron_import_address(self):
-        self.search([]).import_address()
-
-    @api.multi
-    def import_phone(self):
-        self._import_from_date('carepoint.carepoint.phone',
-                               'import_phones_from_date')
-
-    @api.model
-    def cron_import_phone(self):
-        self.search([]).import_phone()
-
     @api.multi
     def import_fdb(self):
         # self._import_all('carepoint.fdb.img.mfg')
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# Copyright 2015-2016 LasLabs Inc.
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+import json
+
+from odoo import models, fields, api
+
+
+class CarepointImportBatch(models.Model):
+    """ Progress of an ``import_batch`` job
+
+    The batch importer saves the id of the last record it processed,
+    along with the jobs it delayed up to it. When the job is restarted,
+    the import resumes after this record.
+    """
+    _name = 'carepoint.import.batch'
+    _description = 'Carepoint Import Batch'
+    _rec_name = 'model'
+    _order = 'id desc'
+
+    backend_id = fields.Many2one(
+        string='Carepoint Backend',
+        comodel_name='carepoint.backend',
+        required=True,
+        ondelete='cascade',
+    )
+    model = fields.Char(
+        required=True,
+        help='Name of the binding model imported.',
+    )
+    window_id = fields.Many2one(
+        string='Window',
+        comodel_name='carepoint.import.window',
+        ondelete='cascade',
+        help='Window of changes imported by the batch, if any.',
+    )
+    cursor = fields.Char(
+        readonly=True,
+        help='Id of the last record processed, encoded in JSON. The '
+             'primary key values of composite ids are separated by commas. '
+             'A restarted batch resumes after this record.',
+    )
+    record_count = fields.Integer(
+        readonly=True,
+        help='Amount of records estimated in the batch when it started.',
+    )
+    processed_count = fields.Integer(
+        string='Processed Records',
+        readonly=True,
+    )
+    date_start = fields.Datetime(
+        string='Started At',
+        readonly=True,
+    )
+    date_progress = fields.Datetime(
+        string='Last Progress',
+        readonly=True,
+    )
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+    ],
+        required=True,
+        default='pending',
+        readonly=True,
+    )
+    progress = fields.Float(
+        compute='_compute_progress',
+        help='Percentage of the records processed.',
+    )
+    rows_per_second = fields.Float(
+        compute='_compute_progress',
+        help='Average amount of records processed per second since the '
+             'batch started.',
+    )
+
+    @api.multi
+    @api.depends('record_count', 'processed_count', 'state',
+                 'date_start', 'date_progress')
+    def _compute_progress(self):
+        from_string = fields.Datetime.from_string
+        for record in self:
+            progress = rows_per_second = 0.0
+            if record.state == 'done':
+                progress = 100.0
+            elif record.record_count:
+                progress = min(
+                    100.0,
+                    100.0 * record.processed_count / record.record_count,
+                )
+            if record.date_start and record.date_progress:
+                elapsed = (from_string(record.date_progress) -
+                           from_string(record.date_start)).total_seconds()
+                if elapsed > 0:
+                    rows_per_second = record.processed_count / elapsed
+            record.progress = progress
+            record.rows_per_second = rows_per_second
+
+    @api.model
+    def _new_batch(self, backend, model, window=None):
+        """ Create the batch of an ``import_batch`` job
+        The batches that are done for the same import are removed.
+        :param backend: Singleton of the Carepoint backend
+        :param model: Name of the binding model
+        :type model: str
+        :param window: Singleton of the window imported, if any
+        :rtype: :class:`CarepointImportBatch`
+        """
+        window_id = window and window.id or False
+        self.search([
+            ('backend_id', '=', backend.id),
+            ('model', '=', model),
+            ('window_id', '=', window_id),
+            ('state', '=', 'done'),
+        ]).unlink()
+        return self.create({
+            'backend_id': backend.id,
+            'model': model,
+            'window_id': window_id,
+        })
+
+    @api.multi
+    def _get_cursor(self):
+        """ Return the id of the last record processed
+        :return: Record id, or None to start from the beginning
+        """
+        self.ensure_one()
+        if not self.cursor:
+            return None
+        return json.loads(self.cursor)
+
+    @api.multi
+    def _start(self, record_count):
+        """ Mark the batch as running, unless it is resumed
+        :param record_count: Amount of records estimated in the batch
+        :type record_count: int
+        """
+        for record in self.filtered(lambda r: not r.date_start):
+            now = fields.Datetime.now()
+            record.write({
+                'state': 'running',
+                'record_count': record_count,
+                'date_start': now,
+                'date_progress': now,
+            })
+
+    @api.multi
+    def _save_progress(self, cursor, count):
+        """ Save the position of the import
+        :param cursor: Id of the last record processed
+        :param count: Amount of records processed since the last save
+        :type count: int
+        """
+        self.ensure_one()
+        self.write({
+            'cursor': json.dumps(cursor),
+            'processed_count': self.processed_count + count,
+            'date_progress': fields.Datetime.now(),
+        })
+
+    @api.multi
+    def _set_done(self):
+        """ Mark the batches as done """
+        self.write({
+            'state': 'done',
+            'date_progress': fields.Datetime.now(),
+        })
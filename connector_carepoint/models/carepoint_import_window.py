@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# Copyright 2015-2016 LasLabs Inc.
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from odoo import models, fields, api
+
+from ..unit.import_synchronizer import import_batch
+
+
+class CarepointImportWindow(models.Model):
+    """ Slice of the change dates imported by an ``import_batch`` job
+
+    Incremental imports are split in windows, which are imported in
+    parallel. The low mark of the watermark only advances over the windows
+    that are done, and that have no pending window before them.
+    """
+    _name = 'carepoint.import.window'
+    _description = 'Carepoint Import Window'
+    _order = 'date_to, id'
+
+    watermark_id = fields.Many2one(
+        string='Watermark',
+        comodel_name='carepoint.sync.watermark',
+        required=True,
+        ondelete='cascade',
+    )
+    date_from = fields.Datetime(
+        help='Change date the window starts from, in the time zone of the '
+             'server. Empty for the whole history.',
+    )
+    date_to = fields.Datetime(
+        required=True,
+        help='Change date the window ends on, in the time zone of the '
+             'server.',
+    )
+    record_count = fields.Integer(
+        readonly=True,
+        help='Amount of records estimated in the window when it was '
+             'created.',
+    )
+    job_uuid = fields.Char(
+        string='Job UUID',
+        readonly=True,
+    )
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+    ],
+        required=True,
+        default='pending',
+    )
+
+    @api.multi
+    def _get_filters(self):
+        """ Return the Carepoint search filters of the window
+        :rtype: dict
+        """
+        self.ensure_one()
+        chg_date_field = self.watermark_id.chg_date_field
+        from_string = fields.Datetime.from_string
+        filters = {chg_date_field: {'<=': from_string(self.date_to)}}
+        if self.date_from:
+            filters[chg_date_field]['>='] = from_string(self.date_from)
+        return filters
+
+    @api.multi
+    def _get_batch(self):
+        """ Return the batch importing the window, creating it if needed
+        A batch that is not done is reused, so that the import resumes
+        where it stopped.
+        :rtype: :class:`CarepointImportBatch`
+        """
+        self.ensure_one()
+        Batch = self.env['carepoint.import.batch']
+        batch = Batch.search([
+            ('window_id', '=', self.id),
+            ('state', '!=', 'done'),
+        ], limit=1)
+        if not batch:
+            batch = Batch._new_batch(
+                self.watermark_id.backend_id, self.watermark_id.model, self,
+            )
+        return batch
+
+    @api.multi
+    def _delay_import(self, session):
+        """ Delay the ``import_batch`` job of the window """
+        self.ensure_one()
+        self.job_uuid = import_batch.delay(
+            session,
+            self.watermark_id.model,
+            self.watermark_id.backend_id.id,
+            filters=self._get_filters(),
+            window_id=self.id,
+            batch_id=self._get_batch().id,
+        )
+
+    @api.multi
+    def _set_done(self):
+        """ Mark the windows as done, and advance the watermarks """
+        self.write({'state': 'done'})
+        self.mapped('watermark_id')._advance()
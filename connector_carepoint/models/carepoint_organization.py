@@ -12,6 +12,7 @@ from ..unit.backend_adapter import CarepointCRUDAdapter
 from ..unit.mapper import (PartnerImportMapper,
                            ExportMapper,
                            trim,
+                           reads,
                            )
 from ..backend import carepoint
 from ..unit.import_synchronizer import (DelayedBatchImporter,
@@ -136,6 +137,7 @@ class CarepointOrganizationExportMapper(ExportMapper):
     ]
 
     @mapping
+    @reads('carepoint_id')
     def org_id(self, record):
         return {'org_id': record.carepoint_id}
 
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+# Copyright 2015-2016 LasLabs Inc.
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+import logging
+import psycopg2
+
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+from .carepoint_backend import IMPORT_DELTA_BUFFER
+
+_logger = logging.getLogger(__name__)
+
+
+class CarepointSyncWatermark(models.Model):
+    """ Progress of the incremental imports of a model from Carepoint
+
+    The records changed before the low mark are imported. The changes up to
+    the high mark are split in windows, which are imported by separate jobs
+    and removed once the low mark advances over them.
+    """
+    _name = 'carepoint.sync.watermark'
+    _description = 'Carepoint Sync Watermark'
+    _rec_name = 'model'
+    _order = 'backend_id, model'
+
+    _sql_constraints = [
+        ('backend_model_uniq', 'unique(backend_id, model, chg_date_field)',
+         'A watermark already exists for this model and date column.'),
+    ]
+
+    backend_id = fields.Many2one(
+        string='Carepoint Backend',
+        comodel_name='carepoint.backend',
+        required=True,
+        ondelete='cascade',
+    )
+    model = fields.Char(
+        required=True,
+        help='Name of the binding model imported.',
+    )
+    chg_date_field = fields.Char(
+        string='Date Column',
+        required=True,
+        default='chg_date',
+        help='Carepoint column holding the change dates of the records.',
+    )
+    low_mark = fields.Datetime(
+        string='Imported Until',
+        help='The records changed before this date, in the time zone of '
+             'the server, are imported. Empty to import the whole '
+             'history.',
+    )
+    high_mark = fields.Datetime(
+        readonly=True,
+        help='End of the last window of changes being imported.',
+    )
+    window_ids = fields.One2many(
+        string='Windows',
+        comodel_name='carepoint.import.window',
+        inverse_name='watermark_id',
+        readonly=True,
+    )
+    pending_window_count = fields.Integer(
+        compute='_compute_pending_window_count',
+    )
+
+    @api.multi
+    @api.depends('window_ids.state')
+    def _compute_pending_window_count(self):
+        for record in self:
+            record.pending_window_count = len(record.window_ids.filtered(
+                lambda r: r.state == 'pending'
+            ))
+
+    @api.model
+    def _get_watermark(self, backend, model, chg_date_field='chg_date'):
+        """ Return the watermark of a model, creating it if needed
+        :param backend: Singleton of the Carepoint backend
+        :param model: Name of the binding model
+        :type model: str
+        :param chg_date_field: Carepoint column of the change dates
+        :type chg_date_field: str
+        :rtype: :class:`CarepointSyncWatermark`
+        """
+        domain = [
+            ('backend_id', '=', backend.id),
+            ('model', '=', model),
+            ('chg_date_field', '=', chg_date_field),
+        ]
+        watermark = self.search(domain, limit=1)
+        if not watermark:
+            watermark = self.create({
+                'backend_id': backend.id,
+                'model': model,
+                'chg_date_field': chg_date_field,
+            })
+        return watermark
+
+    @api.multi
+    def _get_import_start(self):
+        """ Return the change date the next import starts from
+        It follows the windows that are not imported yet, so that they are
+        not sliced and imported again.
+        :rtype: datetime or None
+        """
+        self.ensure_one()
+        if self.pending_window_count and self.high_mark:
+            # See _advance for the buffer
+            return (fields.Datetime.from_string(self.high_mark) -
+                    timedelta(seconds=IMPORT_DELTA_BUFFER))
+        if not self.low_mark:
+            return None
+        return fields.Datetime.from_string(self.low_mark)
+
+    @api.multi
+    def _add_windows(self, slices):
+        """ Record new windows of changes to import
+        :param slices: ``(date_from, date_to, record count)`` of the
+            windows, ordered by date
+        :type slices: list
+        :return: Windows created
+        :rtype: :class:`CarepointImportWindow`
+        """
+        self.ensure_one()
+        windows = self.env['carepoint.import.window']
+        to_string = fields.Datetime.to_string
+        for date_from, date_to, count in slices:
+            windows += windows.create({
+                'watermark_id': self.id,
+                'date_from': date_from and to_string(date_from),
+                'date_to': to_string(date_to),
+                'record_count': count,
+                'state': 'pending' if count else 'done',
+            })
+        if windows:
+            self.high_mark = windows[-1].date_to
+        return windows
+
+    @api.multi
+    def _resume_windows(self, session):
+        """ Delay again the pending windows whose job was lost
+        Failed jobs are left to be retried from the jobs.
+        :return: Windows delayed again
+        :rtype: :class:`CarepointImportWindow`
+        """
+        windows = self.mapped('window_ids').filtered(
+            lambda r: r.state == 'pending'
+        )
+        uuids = [w.job_uuid for w in windows if w.job_uuid]
+        jobs = self.env['queue.job'].search([('uuid', 'in', uuids)])
+        job_uuids = set(jobs.mapped('uuid'))
+        lost = windows.filtered(lambda r: r.job_uuid not in job_uuids)
+        for window in lost:
+            window._delay_import(session)
+        return lost
+
+    @api.multi
+    def _lock(self):
+        """ Lock the watermarks until the end of the transaction
+        The windows of a watermark are imported by parallel jobs, which all
+        advance it when they are done. The watermarks locked or changed by
+        another transaction are skipped, rather than failing the job with a
+        serialization error. The next advance catches up with them.
+        :return: Watermarks locked
+        :rtype: :class:`CarepointSyncWatermark`
+        """
+        sql = ("SELECT id FROM %s WHERE id = %%s FOR UPDATE NOWAIT" %
+               self._table)
+        locked = self.browse()
+        for watermark in self:
+            try:
+                with self.env.cr.savepoint():
+                    self.env.cr.execute(sql, (watermark.id, ),
+                                        log_exceptions=False)
+            except psycopg2.OperationalError:
+                _logger.info('The watermark of %s is being advanced by a '
+                             'concurrent job, it is skipped.',
+                             watermark.model)
+                continue
+            locked += watermark
+        return locked
+
+    @api.multi
+    def _advance(self):
+        """ Advance the low marks over the windows that are done
+        A low mark only moves up to the first window that is not imported
+        yet. The windows before it are not needed anymore and are removed.
+        Only the watermarks that can be locked are advanced, see
+        :meth:`_lock`.
+        """
+        for watermark in self._lock():
+            done = self.env['carepoint.import.window']
+            for window in watermark.window_ids:
+                if window.state != 'done':
+                    break
+                done += window
+            if not done:
+                continue
+            # Records from Carepoint are imported based on their `add_date`
+            # date.  This date is set on Carepoint at the beginning of a
+            # transaction, so if the import is run between the beginning
+            # and the end of a transaction, the import of a record may be
+            # missed.  That's why we add a small buffer back in time where
+            # the eventually missed records will be retrieved.  This also
+            # means that we'll have jobs that import twice the same
+            # records, but this is not a big deal because they will be
+            # skipped when the last `sync_date` is the same.
+            low_mark = (fields.Datetime.from_string(done[-1].date_to) -
+                        timedelta(seconds=IMPORT_DELTA_BUFFER))
+            watermark.low_mark = fields.Datetime.to_string(low_mark)
+            done.unlink()
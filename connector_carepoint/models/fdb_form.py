@@ -57,6 +57,8 @@ class FdbFormBatchImporter(DelayedBatchImporter):
     Import from a date
     """
     _model_name = ['carepoint.fdb.form']
+    _chunk_size = 500
+    _job_chunk_size = 100
 
 
 @carepoint
@@ -91,4 +93,5 @@ class FdbFormImportMapper(CarepointImportMapper):
 @carepoint
 class FdbFormImporter(CarepointImporter):
     _model_name = ['carepoint.fdb.form']
+    _bind_with_data = True
     _base_mapper = FdbFormImportMapper
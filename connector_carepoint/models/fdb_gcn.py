@@ -53,6 +53,8 @@ class FdbGcnBatchImporter(DelayedBatchImporter):
     Import from a date
     """
     _model_name = ['carepoint.fdb.gcn']
+    _chunk_size = 500
+    _job_chunk_size = 100
 
 
 @carepoint
@@ -71,6 +73,7 @@ class FdbGcnImportMapper(CarepointImportMapper):
 @carepoint
 class FdbGcnImporter(CarepointImporter):
     _model_name = ['carepoint.fdb.gcn']
+    _bind_with_data = True
     _base_mapper = FdbGcnImportMapper
 
     def _import_dependencies(self):
@@ -53,6 +53,8 @@ class FdbLblRidBatchImporter(DelayedBatchImporter):
     Import from a date
     """
     _model_name = ['carepoint.fdb.lbl.rid']
+    _chunk_size = 500
+    _job_chunk_size = 100
 
 
 @carepoint
@@ -71,4 +73,5 @@ class FdbLblRidImportMapper(CarepointImportMapper):
 @carepoint
 class FdbLblRidImporter(CarepointImporter):
     _model_name = ['carepoint.fdb.lbl.rid']
+    _bind_with_data = True
     _base_mapper = FdbLblRidImportMapper
@@ -10,6 +10,7 @@ from odoo.addons.connector.unit.mapper import (mapping,
 from ..unit.backend_adapter import CarepointCRUDAdapter
 from ..unit.mapper import CarepointImportMapper
 from ..unit.mapper import trim
+from ..unit.mapper import reads
 from ..backend import carepoint
 from ..unit.import_synchronizer import (DelayedBatchImporter,
                                         CarepointImporter,
@@ -61,6 +62,8 @@ class FdbNdcBatchImporter(DelayedBatchImporter):
     Import from a date
     """
     _model_name = ['carepoint.fdb.ndc']
+    _chunk_size = 500
+    _job_chunk_size = 100
 
 
 @carepoint
@@ -264,6 +267,7 @@ class FdbNdcImportMapper(CarepointImportMapper):
         }
 
     @mapping
+    @reads('bn', 'gcn_seqno', 'ndc', 'gpi', 'dea', 'hcfa_unit')
     def medicament_id(self, record):
 
         medicament_obj = self.env['medical.medicament']
@@ -293,12 +297,14 @@ class FdbNdcImportMapper(CarepointImportMapper):
         return {'medicament_id': medicament_id[0].id}
 
     @mapping
+    @reads('lblrid')
     def lbl_mfg_id(self, record):
         binder = self.binder_for('carepoint.fdb.lbl.rid')
         lbl_rid = binder.to_odoo(record['lblrid'].strip())
         return {'lbl_mfg_id': lbl_rid}
 
     @mapping
+    @reads('ndc')
     def carepoint_id(self, record):
         return {'carepoint_id': record['ndc'].strip()}
 
@@ -307,10 +313,15 @@ class FdbNdcImportMapper(CarepointImportMapper):
 class FdbNdcImporter(CarepointImporter):
     _model_name = ['carepoint.fdb.ndc']
     _base_mapper = FdbNdcImportMapper
+    _dependency_workers = 2
 
     def _import_dependencies(self):
         """ Import depends for record """
         record = self.carepoint_record
+        self._prefetch_dependencies([
+            (record['ndc'], 'carepoint.fdb.ndc.cs.ext'),
+            (record['gcn_seqno'], 'carepoint.fdb.gcn'),
+        ])
         try:
             self._import_dependency(record['ndc'],
                                     'carepoint.fdb.ndc.cs.ext')
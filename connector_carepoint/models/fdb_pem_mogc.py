@@ -10,7 +10,7 @@ from ..unit.mapper import CarepointImportMapper
 from ..backend import carepoint
 from ..unit.import_synchronizer import (DelayedBatchImporter,
                                         CarepointImporter,
-                                        import_record,
+                                        delay_import_coalesced,
                                         )
 from .fdb_pem_moe import FdbPemMoeAdapter
 
@@ -95,7 +95,7 @@ class FdbPemMogcImporter(CarepointImporter):
         domain = {'pemono': record['pemono']}
         attributes = ['pemono', 'pemono_sn']
         for rec_id in pem_adapter.search_read(attributes, **domain):
-            import_record.delay(
+            delay_import_coalesced(
                 self.session,
                 'carepoint.fdb.pem.moe',
                 self.backend_record.id,
@@ -57,6 +57,8 @@ class FdbRouteBatchImporter(DelayedBatchImporter):
     Import from a date
     """
     _model_name = ['carepoint.fdb.route']
+    _chunk_size = 500
+    _job_chunk_size = 100
 
 
 @carepoint
@@ -90,4 +92,5 @@ class FdbRouteImportMapper(CarepointImportMapper):
 @carepoint
 class FdbRouteImporter(CarepointImporter):
     _model_name = ['carepoint.fdb.route']
+    _bind_with_data = True
     _base_mapper = FdbRouteImportMapper
@@ -78,6 +78,8 @@ class FdbUnitBatchImporter(DelayedBatchImporter):
     Import from a date
     """
     _model_name = ['carepoint.fdb.unit']
+    _chunk_size = 500
+    _job_chunk_size = 100
 
 
 @carepoint
@@ -186,4 +188,5 @@ class FdbUnitImportMapper(CarepointImportMapper):
 @carepoint
 class FdbUnitImporter(CarepointImporter):
     _model_name = ['carepoint.fdb.unit']
+    _bind_with_data = True
     _base_mapper = FdbUnitImportMapper
@@ -13,6 +13,7 @@ from ..unit.backend_adapter import CarepointCRUDAdapter
 from ..unit.mapper import (PersonImportMapper,
                            PersonExportMapper,
                            trim,
+                           reads,
                            )
 from ..backend import carepoint
 from ..unit.import_synchronizer import (DelayedBatchImporter,
@@ -152,6 +153,7 @@ class MedicalPatientExportMapper(PersonExportMapper):
             return {'gender_cd': record.gender.upper()}
 
     @mapping
+    @reads()
     def static_defaults(self, record):
         """ It provides all static default mappings """
         return {
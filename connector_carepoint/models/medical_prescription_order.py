@@ -6,6 +6,7 @@ import logging
 from odoo import fields
 from odoo import models
 from odoo.addons.connector.unit.mapper import (mapping,
+                                               changed_by,
                                                ExportMapper,
                                                none,
                                                convert,
@@ -120,6 +121,7 @@ class MedicalPrescriptionOrderExportMapper(ExportMapper):
     ]
 
     @mapping
+    @changed_by('active')
     def status_cn(self, record):
         if not record.active:
             return {'status_cn': 3}
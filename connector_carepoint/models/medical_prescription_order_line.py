@@ -3,6 +3,7 @@
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
 import logging
+from collections import OrderedDict
 from odoo import fields
 from odoo import models
 from odoo.addons.connector.unit.mapper import (mapping,
@@ -12,7 +13,11 @@ from odoo.addons.connector.unit.mapper import (mapping,
                                                convert,
                                                )
 from ..unit.backend_adapter import CarepointCRUDAdapter
-from ..unit.mapper import CarepointImportMapper, add_to
+from ..unit.mapper import (CarepointImportMapper,
+                           add_to,
+                           prefetch,
+                           reads,
+                           )
 from ..backend import carepoint
 from ..unit.import_synchronizer import (DelayedBatchImporter,
                                         CarepointImporter,
@@ -70,28 +75,51 @@ class MedicalPrescriptionOrderLineAdapter(CarepointCRUDAdapter):
         Return:
             (str) Newly generated script number
         """
+        return self._get_next_script_nos(store_id, dea, 1, otc)[0]
+
+    def _get_next_script_nos(self, store_id, dea, count, otc=False):
+        """ It generates and returns several Rx IDs in sequence
+        The stored procedure is run ``count`` times in a single batch, on
+        one connection and in one transaction.
+        Params:
+            store_id (int): ID of the store in CarepPoint
+            dea (int): DEA code for medicament
+            count (int): Amount of script numbers to generate
+            otc (bool): True if medicament is OTC
+        Return:
+            (list) Newly generated script numbers, in generation order
+        """
         with self.carepoint.dbs['cph'].begin() as conn:
-            with conn.begin():
-                res = conn.execute(
-                    text(
-                        "SET NOCOUNT ON;"
-                        "DECLARE @out VARCHAR(30);"
-                        "EXEC CpGetScriptNo :store_id, "
-                        ":dea, @out output, :otc;"
-                        "SELECT @out;"
-                        "SET NOCOUNT OFF;",
-                        bindparams=[
-                            bindparam('store_id'),
-                            bindparam('dea'),
-                            bindparam('otc'),
-                        ],
-                    ),
-                    store_id=store_id,
-                    dea=dea,
-                    otc=otc,
-                )
-                id_int = res.fetchall()[0][0]
-        return id_int
+            res = conn.execute(
+                text(
+                    "SET NOCOUNT ON;"
+                    "DECLARE @out VARCHAR(30), @i INT;"
+                    "DECLARE @nos TABLE "
+                    "(seq INT IDENTITY(1, 1), script_no VARCHAR(30));"
+                    "SET @i = 0;"
+                    "WHILE @i < :count "
+                    "BEGIN "
+                    "EXEC CpGetScriptNo :store_id, "
+                    ":dea, @out output, :otc;"
+                    "INSERT INTO @nos (script_no) VALUES (@out);"
+                    "SET @i = @i + 1;"
+                    "END;"
+                    "SELECT script_no FROM @nos ORDER BY seq;"
+                    "SET NOCOUNT OFF;",
+                    bindparams=[
+                        bindparam('store_id'),
+                        bindparam('dea'),
+                        bindparam('otc'),
+                        bindparam('count'),
+                    ],
+                ),
+                store_id=store_id,
+                dea=dea,
+                otc=otc,
+                count=count,
+            )
+            script_nos = [row[0] for row in res.fetchall()]
+        return script_nos
 
     def create(self, data):
         """ It gets the next Rx sequence, appends to data, and calls super """
@@ -100,6 +128,31 @@ class MedicalPrescriptionOrderLineAdapter(CarepointCRUDAdapter):
         )
         return super(MedicalPrescriptionOrderLineAdapter, self).create(data)
 
+    def create_many(self, data_list):
+        """ It creates several Rx, generating their script numbers in bulk
+        Script numbers are generated with one call per store, DEA class and
+        OTC flag.
+        Params:
+            data_list (list): ``dict`` of Data to create each record with
+        Return:
+            (list) ``str`` of external carepoint_id for each record
+        """
+        groups = OrderedDict()
+        for data in data_list:
+            key = (data['store_id'],
+                   data['drug_dea_class'],
+                   data.get('otc', False),
+                   )
+            groups.setdefault(key, []).append(data)
+        for (store_id, dea, otc), group in groups.items():
+            script_nos = self._get_next_script_nos(
+                store_id, dea, len(group), otc,
+            )
+            for data, script_no in zip(group, script_nos):
+                data['script_no'] = script_no
+        _super = super(MedicalPrescriptionOrderLineAdapter, self)
+        return [_super.create(data) for data in data_list]
+
 
 @carepoint
 class MedicalPrescriptionOrderLineBatchImporter(DelayedBatchImporter):
@@ -107,6 +160,8 @@ class MedicalPrescriptionOrderLineBatchImporter(DelayedBatchImporter):
     For every prescription in the list, a delayed job is created.
     """
     _model_name = ['carepoint.rx.ord.ln']
+    _chunk_size = 500
+    _job_chunk_size = 100
 
 
 @carepoint
@@ -123,7 +178,56 @@ class MedicalPrescriptionOrderLineImportMapper(CarepointImportMapper):
         ('refills_orig', 'refill_qty_original')
     ]
 
+    @prefetch
+    def _prefetch_bindings(self, records):
+        """ Load the bindings of the batch in the binder caches """
+        lookups = [
+            ('carepoint.fdb.ndc', 'ndc'),
+            ('carepoint.fdb.gcn', 'gcn_seqno'),
+            ('carepoint.medical.patient', 'pat_id'),
+            ('carepoint.medical.physician', 'md_id'),
+            ('carepoint.medical.prescription.order', 'rx_id'),
+        ]
+        for model_name, field in lookups:
+            ids = [record[field] for record in records if record[field]]
+            if field == 'ndc':
+                ids = [_id.strip() for _id in ids]
+            self.binder_for(model_name).to_odoo_many(ids)
+
+    @prefetch
+    def _prefetch_medication_dosages(self, records):
+        """ Search the dosages of the batch by sig text or code at once """
+        sig_codes = set((r['sig_code'] or '').strip() for r in records)
+        sig_texts = set(
+            (r['sig_text_english'] or '').strip() for r in records
+        )
+        sig_codes.discard('')
+        sig_texts.discard('')
+        dose_ids = self.env['medical.medication.dosage'].search([
+            '|',
+            ('name', 'in', list(sig_texts)),
+            ('code', 'in', list(sig_codes)),
+        ])
+        dosages = {}
+        # Reversed so that the first record in search order wins
+        for dose_id in reversed(dose_ids):
+            dosages[('name', dose_id.name)] = dose_id
+            dosages[('code', dose_id.code)] = dose_id
+        self.prefetched['medication_dosage'] = dosages
+
+    @prefetch
+    def _prefetch_duration_uom(self, records):
+        """ Search the days UOM once for the batch """
+        self.prefetched['duration_uom'] = self._get_duration_uom()
+
+    def _get_duration_uom(self):
+        # @TODO: make this use self.env.ref to core days - verify it exists
+        return self.env['product.uom'].search(
+            [('name', '=', 'DAYS')], limit=1,
+        )
+
     @mapping
+    @reads('script_no')
     def name(self, record):
         name = '{prefix}{name}'.format(
             prefix=self.backend_record.rx_prefix,
@@ -133,6 +237,7 @@ class MedicalPrescriptionOrderLineImportMapper(CarepointImportMapper):
 
     @mapping
     @only_create
+    @reads('days_supply', 'refills_orig')
     def duration(self, record):
         days_supply = record['days_supply'] or 0
         refills = (record['refills_orig'] or 0) + 1
@@ -141,6 +246,7 @@ class MedicalPrescriptionOrderLineImportMapper(CarepointImportMapper):
 
     @mapping
     @only_create
+    @reads('ndc')
     def medicament_and_meta(self, record):
         binder = self.binder_for('carepoint.fdb.ndc')
         ndc_id = binder.to_odoo(record['ndc'], browse=True)
@@ -150,10 +256,12 @@ class MedicalPrescriptionOrderLineImportMapper(CarepointImportMapper):
                 }
 
     @mapping
+    @reads('daw_yn')
     def is_substitutable(self, record):
         return {'is_substitutable': not bool(record['daw_yn'])}
 
     @mapping
+    @reads('pat_id')
     def patient_id(self, record):
         binder = self.binder_for('carepoint.medical.patient')
         patient_id = binder.to_odoo(record['pat_id'])
@@ -161,6 +269,7 @@ class MedicalPrescriptionOrderLineImportMapper(CarepointImportMapper):
 
     @mapping
     @only_create
+    @reads('ndc')
     def ndc_id(self, record):
         binder = self.binder_for('carepoint.fdb.ndc')
         ndc_id = binder.to_odoo(record['ndc'].strip())
@@ -168,6 +277,7 @@ class MedicalPrescriptionOrderLineImportMapper(CarepointImportMapper):
 
     @mapping
     @only_create
+    @reads('gcn_seqno')
     def gcn_id(self, record):
         binder = self.binder_for('carepoint.fdb.gcn')
         gcn_id = binder.to_odoo(record['gcn_seqno'])
@@ -175,11 +285,24 @@ class MedicalPrescriptionOrderLineImportMapper(CarepointImportMapper):
 
     @mapping
     @only_create
+    @reads('sig_code', 'sig_text_english')
     def medication_dosage_id(self, record):
         # @TODO: Find sig codes table & integrate instead of search
         dose_obj = self.env['medical.medication.dosage']
         sig_code = record['sig_code'].strip()
         sig_text = record['sig_text_english'].strip()
+        dosages = self.prefetched.get('medication_dosage')
+        if dosages is not None:
+            dose_id = dosages.get(('name', sig_text)) or \
+                dosages.get(('code', sig_code))
+            if not dose_id:
+                dose_id = dose_obj.create({
+                    'name': sig_text,
+                    'code': sig_code,
+                })
+                dosages[('name', sig_text)] = dose_id
+                dosages[('code', sig_code)] = dose_id
+            return {'medication_dosage_id': dose_id.id}
         dose_id = dose_obj.search([
             '|',
             ('name', '=', sig_text),
@@ -196,26 +319,29 @@ class MedicalPrescriptionOrderLineImportMapper(CarepointImportMapper):
 
     @mapping
     @only_create
+    @reads()
     def duration_uom_id(self, record):
-        # @TODO: make this use self.env.ref to core days - verify it exists
-        uom_id = self.env['product.uom'].search(
-            [('name', '=', 'DAYS')], limit=1,
-        )
+        uom_id = self.prefetched.get('duration_uom')
+        if uom_id is None:
+            uom_id = self._get_duration_uom()
         return {'duration_uom_id': uom_id.id}
 
     @mapping
+    @reads('md_id')
     def physician_id(self, record):
         binder = self.binder_for('carepoint.medical.physician')
         physician_id = binder.to_odoo(record['md_id'])
         return {'physician_id': physician_id}
 
     @mapping
+    @reads('rx_id')
     def prescription_order_id(self, record):
         binder = self.binder_for('carepoint.medical.prescription.order')
         prescription_order_id = binder.to_odoo(record['rx_id'])
         return {'prescription_order_id': prescription_order_id}
 
     @mapping
+    @reads('rx_id')
     def carepoint_id(self, record):
         return {'carepoint_id': record['rx_id']}
 
@@ -356,6 +482,7 @@ class MedicalPrescriptionOrderLineExportMapper(ExportMapper):
         return {'daw_yn': not record.is_substitutable}
 
     @mapping
+    @reads()
     def static_defaults(self, record):
         return {
             'df': 1,
@@ -375,6 +502,23 @@ class MedicalPrescriptionOrderLineExporter(CarepointExporter):
     _model_name = ['carepoint.rx.ord.ln']
     _base_mapper = MedicalPrescriptionOrderLineExportMapper
 
+    _batch_create = True
+    _batch_write = True
+
+    def _prefetch_batch(self, bindings):
+        """ Resolve the manufacturers of the Rx at once for the mapper """
+        fdb_ndcs = self.env['carepoint.fdb.ndc'].search([
+            ('odoo_id', 'in', bindings.mapped('ndc_id').ids),
+        ])
+        binder = self.binder_for('carepoint.fdb.img.mfg')
+        binder.to_backend_many(fdb_ndcs.mapped('lbl_mfg_id.mfg'))
+
+    def _create_many(self, data_list):
+        """ Create several Rx, generating their script numbers in bulk """
+        for data in data_list:
+            self._validate_create_data(data)
+        return self.backend_adapter.create_many(data_list)
+
     def _export_dependencies(self):
         self._export_dependency(
             self.binding_record.patient_id,
@@ -11,7 +11,7 @@ from odoo.addons.connector.unit.mapper import (mapping,
                                                ExportMapper,
                                                )
 from ..unit.backend_adapter import CarepointCRUDAdapter
-from ..unit.mapper import CarepointImportMapper
+from ..unit.mapper import CarepointImportMapper, reads
 from ..backend import carepoint
 from ..unit.import_synchronizer import (DelayedBatchImporter,
                                         CarepointImporter,
@@ -124,6 +124,7 @@ class CarepointPhoneImportMapper(CarepointImportMapper):
     _model_name = 'carepoint.carepoint.phone'
 
     @mapping
+    @reads('area_code', 'extension', 'phone_no')
     def phone(self, record):
         phone_no = (record['phone_no'] or '').strip()
         area_code = (record['area_code'] or '').strip()
@@ -137,6 +138,7 @@ class CarepointPhoneImportMapper(CarepointImportMapper):
         return {'phone': phone}
 
     @mapping
+    @reads('phone_id')
     def carepoint_id(self, record):
         return {'carepoint_id': record['phone_id']}
 
@@ -170,6 +172,7 @@ class CarepointPhoneExportMapper(ExportMapper):
         return vals
 
     @mapping
+    @reads('carepoint_id')
     def phone_id(self, record):
         return {'phone_id': record.carepoint_id}
 
@@ -5,10 +5,11 @@
 import logging
 from odoo import models, fields, api, _
 from odoo.addons.connector.unit.mapper import (mapping,
+                                               changed_by,
                                                only_create,
                                                ExportMapper,
                                                )
-from ..unit.mapper import CarepointImportMapper
+from ..unit.mapper import CarepointImportMapper, reads
 from ..backend import carepoint
 from ..unit.import_synchronizer import CarepointImporter
 from ..unit.export_synchronizer import CarepointExporter
@@ -177,6 +178,7 @@ class CarepointPhoneAbstractImportMapper(CarepointImportMapper):
         }
 
     @mapping
+    @reads('phone_type_cn')
     def partner_field_name(self, record):
         """ It determines what type of phone number this is """
         phone_type = EnumPhoneType(record['phone_type_cn'])
@@ -190,6 +192,7 @@ class CarepointPhoneAbstractImportMapper(CarepointImportMapper):
 
     @mapping
     @only_create
+    @reads('phone_id')
     def phone_id(self, record):
         binder = self.binder_for('carepoint.carepoint.phone')
         phone_id = binder.to_odoo(record['phone_id'])
@@ -223,6 +226,7 @@ class CarepointPhoneAbstractExportMapper(ExportMapper):
     }
 
     @mapping
+    @changed_by('phone_id')
     def phone_id(self, binding):
         binder = self.binder_for('carepoint.carepoint.phone')
         rec_id = binder.to_backend(binding.phone_id.id)
@@ -241,6 +245,7 @@ class CarepointPhoneAbstractExportMapper(ExportMapper):
             return
 
     @mapping
+    @changed_by('partner_field_name')
     def phone_type_cn(self, binding):
         phone_type = self._get_phone_type(
             binding.partner_field_name,
@@ -251,6 +256,7 @@ class CarepointPhoneAbstractExportMapper(ExportMapper):
             }
 
     @mapping
+    @reads()
     def static_defaults(self, binding):
         return {
             'priority': 1,
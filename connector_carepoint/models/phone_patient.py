@@ -11,6 +11,7 @@ from odoo.addons.connector.unit.mapper import (mapping,
 from ..unit.backend_adapter import CarepointCRUDAdapter
 from ..backend import carepoint
 from ..unit.import_synchronizer import DelayedBatchImporter
+from ..unit.mapper import reads
 
 from .phone_abstract import (CarepointPhoneAbstractImportMapper,
                              CarepointPhoneAbstractImporter,
@@ -84,6 +85,7 @@ class CarepointPhonePatientImportMapper(
 
     @mapping
     @only_create
+    @reads('pat_id')
     def partner_id(self, record):
         """ It returns either the commercial partner or parent & defaults """
         binder = self.binder_for('carepoint.medical.patient')
@@ -95,6 +97,7 @@ class CarepointPhonePatientImportMapper(
 
     @mapping
     @only_create
+    @reads('pat_id')
     def res_model_and_id(self, record):
         binder = self.binder_for('carepoint.medical.patient')
         patient_id = binder.to_odoo(record['pat_id'], browse=True)
@@ -104,6 +107,7 @@ class CarepointPhonePatientImportMapper(
         )
 
     @mapping
+    @reads('pat_id', 'phone_id')
     def carepoint_id(self, record):
         return {'carepoint_id': '%d,%d' % (record['pat_id'],
                                            record['phone_id'])}
@@ -160,6 +164,7 @@ class CarepointPhonePatientExportMapper(
             return
 
     @mapping
+    @reads('partner_id', 'res_id')
     def pat_id(self, binding):
         binder = self.binder_for('carepoint.medical.patient')
         rec_id = binder.to_backend(binding.res_id)
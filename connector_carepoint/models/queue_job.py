@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# Copyright 2015-2016 LasLabs Inc.
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+import logging
+
+import psycopg2
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+
+class QueueJob(models.Model):
+    """ Adds identity keys used to coalesce the Carepoint jobs """
+    _inherit = 'queue.job'
+
+    carepoint_identity_key = fields.Char(
+        index=True,
+        readonly=True,
+        help='Identifies the Carepoint jobs doing the same work, so that '
+             'a pending job can absorb the new ones.',
+    )
+    carepoint_export_fields = fields.Char(
+        readonly=True,
+        help='Comma separated fields exported by the job. Empty when all '
+             'of the fields are exported.',
+    )
+    carepoint_force = fields.Boolean(
+        readonly=True,
+        help='The job imports the record even if it is up to date.',
+    )
+
+    @api.model
+    def _carepoint_lock_pending(self, identity_key):
+        """ Lock and return the last pending job for an identity key
+        Only the pending jobs that are not locked by another transaction
+        are considered. Enqueued jobs may already be taken by the job
+        runner, with the arguments they had then, so they cannot absorb
+        new ones.
+        The lock is kept until the end of the transaction, so the job
+        cannot start before the changes it absorbs are committed.
+        :param identity_key: Identity key of the job
+        :type identity_key: str
+        :return: Singleton of the job, or an empty recordset
+        """
+        try:
+            with self.env.cr.savepoint():
+                self.env.cr.execute(
+                    "SELECT id FROM queue_job "
+                    "WHERE carepoint_identity_key = %s "
+                    "AND state = 'pending' "
+                    "ORDER BY id DESC LIMIT 1 "
+                    "FOR UPDATE NOWAIT",
+                    (identity_key, ),
+                    log_exceptions=False,
+                )
+                row = self.env.cr.fetchone()
+        except psycopg2.OperationalError:
+            _logger.debug('Pending job %s is locked, not coalescing',
+                          identity_key)
+            return self.browse()
+        return self.browse(row and row[0] or [])
+
+    @api.multi
+    def _carepoint_get_export_fields(self):
+        """ Return the fields exported by the job
+        :return: List of field names, or None for all fields
+        :rtype: list or None
+        """
+        self.ensure_one()
+        if not self.carepoint_export_fields:
+            return None
+        return self.carepoint_export_fields.split(',')
+
+    @api.model
+    def _carepoint_set_identity(self, uuid, identity_key, export_fields=None,
+                                force=False):
+        """ Store the identity of a newly delayed job
+        :param uuid: UUID of the job
+        :type uuid: str
+        :param identity_key: Identity key of the job
+        :type identity_key: str
+        :param export_fields: Fields exported by the job, None for all
+        :type export_fields: list or None
+        :param force: Whether the job forces the import of the record
+        :type force: bool
+        """
+        self.search([('uuid', '=', uuid)]).write({
+            'carepoint_identity_key': identity_key,
+            'carepoint_export_fields':
+                export_fields and ','.join(export_fields) or False,
+            'carepoint_force': force,
+        })
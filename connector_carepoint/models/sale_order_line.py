@@ -124,10 +124,15 @@ class SaleOrderLineImporter(CarepointImporter):
     _model_name = ['carepoint.sale.order.line']
 
     _base_mapper = SaleOrderLineImportMapper
+    _dependency_workers = 2
 
     def _import_dependencies(self):
         """ Import depends for record """
         record = self.carepoint_record
+        self._prefetch_dependencies([
+            (record['rx_id'], 'carepoint.rx.ord.ln'),
+            (record['order_id'], 'carepoint.sale.order'),
+        ])
         self._import_dependency(record['rx_id'],
                                 'carepoint.rx.ord.ln')
         self._import_dependency(record['order_id'],
@@ -4,6 +4,8 @@
 
 from . import test_carepoint_backend
 from . import test_backend_adapter
+from . import test_carepoint_sync_watermark
+from . import test_carepoint_import_batch
 
 from . import test_binder
 from . import test_related_action
@@ -11,6 +11,9 @@ import mock
 from contextlib import contextmanager
 import odoo.tests.common as common
 from odoo.addons.connector.session import ConnectorSession
+from odoo.addons.connector_carepoint.unit.backend_adapter import (
+    clear_carepoint,
+)
 
 try:
     from carepoint.db import Db as CarepointDb
@@ -51,8 +54,10 @@ def mock_job_delay_to_direct(job_path):
 @contextmanager
 def mock_api(instantiated=False):
     """ Mock CarePoint API for testing """
+    clear_carepoint()
     with mock.patch('%s.Carepoint' % backend_adapter) as API:
         yield API() if instantiated else API
+    clear_carepoint()
 
 
 @contextmanager
@@ -68,6 +68,14 @@ class TestCarepointAddressImportMapper(CarepointAddressTestBase):
         expect = {'carepoint_id': self.record['addr_id']}
         self.assertDictEqual(expect, res)
 
+    def test_source_fields(self):
+        """ It should return the fields read by the mappings """
+        self.assertEqual(
+            {'addr1', 'addr2', 'city', 'zip', 'zip_plus4', 'state_cd',
+             'addr_id'},
+            self.unit.source_fields(),
+        )
+
 
 class TestCarepointAddressUnit(CarepointAddressTestBase):
 
@@ -299,7 +299,10 @@ class TestFdbNdcImporter(FdbNdcTestBase):
 
     def test_import_dependencies(self):
         """ It should import all dependencies """
-        with mock.patch.object(self.unit, '_import_dependency') as mk:
+        with mock.patch.multiple(self.unit,
+                                 _import_dependency=mock.DEFAULT,
+                                 _prefetch_dependencies=mock.DEFAULT):
+            mk = self.unit._import_dependency
             self.unit._import_dependencies()
             mk.assert_has_calls([
                 mock.call(
@@ -312,6 +315,17 @@ class TestFdbNdcImporter(FdbNdcTestBase):
                 ),
             ])
 
+    def test_import_dependencies_prefetch(self):
+        """ It should prefetch the independent dependencies """
+        with mock.patch.multiple(self.unit,
+                                 _import_dependency=mock.DEFAULT,
+                                 _prefetch_dependencies=mock.DEFAULT):
+            self.unit._import_dependencies()
+            self.unit._prefetch_dependencies.assert_called_once_with([
+                (self.record['ndc'], 'carepoint.fdb.ndc.cs.ext'),
+                (self.record['gcn_seqno'], 'carepoint.fdb.gcn'),
+            ])
+
     def test_after_import_unit(self):
         """ It should get proper unit """
         with mock.patch.object(self.unit, 'unit_for'):
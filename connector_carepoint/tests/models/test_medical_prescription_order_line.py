@@ -47,6 +47,76 @@ class MedicalPrescriptionOrderLineTestBase(SetUpCarepointBase):
         }
 
 
+class TestMedicalPrescriptionOrderLineAdapter(
+    MedicalPrescriptionOrderLineTestBase
+):
+
+    def setUp(self):
+        super(TestMedicalPrescriptionOrderLineAdapter, self).setUp()
+        self.Unit = medical_prescription_order_line.\
+            MedicalPrescriptionOrderLineAdapter
+
+    def test_get_next_script_no(self):
+        """ It should return the first script number of a batch of one """
+        with self.mock_api():
+            unit = self.Unit(self.mock_env)
+            with mock.patch.object(unit, '_get_next_script_nos') as mk:
+                mk.return_value = ['expect']
+                res = unit._get_next_script_no(1, 2)
+                mk.assert_called_once_with(1, 2, 1, False)
+                self.assertEqual('expect', res)
+
+    def test_get_next_script_nos(self):
+        """ It should generate the script numbers in one execution """
+        with self.mock_api() as api:
+            unit = self.Unit(self.mock_env)
+            conn = api().dbs['cph'].begin().__enter__()
+            conn.execute().fetchall.return_value = [('1', ), ('2', )]
+            res = unit._get_next_script_nos(1, 2, 2, True)
+            conn.execute.assert_called_with(
+                mock.ANY, store_id=1, dea=2, otc=True, count=2,
+            )
+            self.assertEqual(['1', '2'], res)
+
+    def test_create_many(self):
+        """ It should generate the script numbers per store and DEA """
+        data_list = [
+            {'store_id': 1, 'drug_dea_class': 2},
+            {'store_id': 3, 'drug_dea_class': 2},
+            {'store_id': 1, 'drug_dea_class': 2},
+        ]
+        with self.mock_api():
+            unit = self.Unit(self.mock_env)
+            with mock.patch.object(unit, '_get_next_script_nos') as mk:
+                mk.side_effect = [['a', 'b'], ['c']]
+                with mock.patch('%s.CarepointCRUDAdapter.create' % model):
+                    unit.create_many(data_list)
+                mk.assert_has_calls([
+                    mock.call(1, 2, 2, False),
+                    mock.call(3, 2, 1, False),
+                ])
+        self.assertEqual(
+            ['a', 'c', 'b'], [data['script_no'] for data in data_list],
+        )
+
+    def test_create_many_otc(self):
+        """ It should generate the script numbers of OTC apart """
+        data_list = [
+            {'store_id': 1, 'drug_dea_class': 2},
+            {'store_id': 1, 'drug_dea_class': 2, 'otc': True},
+        ]
+        with self.mock_api():
+            unit = self.Unit(self.mock_env)
+            with mock.patch.object(unit, '_get_next_script_nos') as mk:
+                mk.side_effect = [['a'], ['b']]
+                with mock.patch('%s.CarepointCRUDAdapter.create' % model):
+                    unit.create_many(data_list)
+                mk.assert_has_calls([
+                    mock.call(1, 2, 1, False),
+                    mock.call(1, 2, 1, True),
+                ])
+
+
 class TestMedicalPrescriptionOrderLineImportMapper(
     MedicalPrescriptionOrderLineTestBase
 ):
@@ -258,6 +328,79 @@ class TestMedicalPrescriptionOrderLineImportMapper(
             }
             self.assertEqual(expect, res)
 
+    def test_prefetch_bindings_ndc(self):
+        """ It should warm the NDC binder with the stripped NDCs """
+        with mock.patch.object(self.unit, 'binder_for') as binder_for:
+            self.unit._prefetch_bindings([self.record])
+            binder_for.assert_any_call('carepoint.fdb.ndc')
+            binder_for().to_odoo_many.assert_any_call(
+                [self.record['ndc'].strip()],
+            )
+
+    def test_prefetch_medication_dosages_search(self):
+        """ It should search the dosages of the batch at once """
+        with mock.patch.object(self.unit.session, 'env') as env:
+            search = env['medical.medication.dosage'].search
+            search.side_effect = EndTestException
+            with self.assertRaises(EndTestException):
+                self.unit._prefetch_medication_dosages([self.record])
+            search.assert_called_once_with([
+                '|',
+                ('name', 'in', [self.record['sig_text_english'].strip()]),
+                ('code', 'in', [self.record['sig_code'].strip()]),
+            ])
+
+    def test_prefetch_medication_dosages_empty_sig(self):
+        """ It should skip the empty sig values of the batch """
+        record = dict(self.record, sig_code=None, sig_text_english='  ')
+        with mock.patch.object(self.unit.session, 'env') as env:
+            search = env['medical.medication.dosage'].search
+            search.side_effect = EndTestException
+            with self.assertRaises(EndTestException):
+                self.unit._prefetch_medication_dosages([record])
+            search.assert_called_once_with([
+                '|',
+                ('name', 'in', []),
+                ('code', 'in', []),
+            ])
+
+    def test_medication_dosage_id_prefetched(self):
+        """ It should use the prefetched dosage without searching """
+        dose_id = mock.MagicMock()
+        self.unit.prefetched['medication_dosage'] = {
+            ('code', self.record['sig_code'].strip()): dose_id,
+        }
+        with mock.patch.object(self.unit.session, 'env') as env:
+            res = self.unit.medication_dosage_id(self.record)
+            env['medical.medication.dosage'].search.assert_not_called()
+            self.assertDictEqual({'medication_dosage_id': dose_id.id}, res)
+
+    def test_medication_dosage_id_prefetched_create(self):
+        """ It should create missing dosages once per batch """
+        self.unit.prefetched['medication_dosage'] = {}
+        with mock.patch.object(self.unit.session, 'env') as env:
+            self.unit.medication_dosage_id(self.record)
+            self.unit.medication_dosage_id(self.record)
+            env['medical.medication.dosage'].create.assert_called_once_with({
+                'name': self.record['sig_text_english'].strip(),
+                'code': self.record['sig_code'].strip(),
+            })
+
+    def test_duration_uom_id_prefetched(self):
+        """ It should use the prefetched UOM without searching """
+        uom_id = mock.MagicMock()
+        self.unit.prefetched['duration_uom'] = uom_id
+        with mock.patch.object(self.unit.session, 'env') as env:
+            res = self.unit.duration_uom_id(self.record)
+            env['product.uom'].search.assert_not_called()
+            self.assertDictEqual({'duration_uom_id': uom_id.id}, res)
+
+    def test_source_fields(self):
+        """ It should declare all of its source fields """
+        res = self.unit.source_fields()
+        self.assertIsNotNone(res)
+        self.assertIn('sig_text_english', res)
+
     def test_gcn_id_return(self):
         """ It should return the proper values dict """
         with mock.patch.object(self.unit, 'binder_for'):
@@ -347,3 +490,54 @@ class TestMedicalPrescriptionOrderLineImporter(
                     'carepoint.fdb.ndc',
                 ),
             ])
+
+
+class TestMedicalPrescriptionOrderLineExporter(
+    MedicalPrescriptionOrderLineTestBase
+):
+
+    def setUp(self):
+        super(TestMedicalPrescriptionOrderLineExporter, self).setUp()
+        self.Unit = medical_prescription_order_line.\
+            MedicalPrescriptionOrderLineExporter
+        self.unit = self.Unit(self.mock_env)
+
+    def test_batch_create(self):
+        """ It should create the new Rx of a batch at once """
+        self.assertTrue(self.unit._batch_create)
+
+    def test_batch_write(self):
+        """ It should update the Rx of a batch at once """
+        self.assertTrue(self.unit._batch_write)
+
+    def test_prefetch_batch_binder(self):
+        """ It should resolve the manufacturers with a single lookup """
+        with mock.patch.object(self.unit, 'binder_for') as mk:
+            self.unit._prefetch_batch(self.env[self.model].browse())
+            mk.assert_called_once_with('carepoint.fdb.img.mfg')
+            mk().to_backend_many.assert_called_once_with(
+                self.env['carepoint.fdb.ndc'].mapped('lbl_mfg_id.mfg'),
+            )
+
+    def test_create_many_validates(self):
+        """ It should validate the data of every new Rx """
+        with mock.patch.multiple(self.unit,
+                                 unit_for=mock.DEFAULT,
+                                 _validate_create_data=mock.DEFAULT,
+                                 ) as mk:
+            self.unit._create_many(['data1', 'data2'])
+            mk['_validate_create_data'].assert_has_calls([
+                mock.call('data1'), mock.call('data2'),
+            ])
+
+    def test_create_many_adapter(self):
+        """ It should create the Rx with the adapter create_many """
+        with mock.patch.multiple(self.unit,
+                                 unit_for=mock.DEFAULT,
+                                 _validate_create_data=mock.DEFAULT,
+                                 ) as mk:
+            res = self.unit._create_many(['data1', 'data2'])
+            mk['unit_for']().create_many.assert_called_once_with(
+                ['data1', 'data2'],
+            )
+            self.assertEqual(mk['unit_for']().create_many(), res)
@@ -221,7 +221,10 @@ class TestSaleOrderLineImporter(SaleOrderLineTestBase):
 
     def test_import_dependencies(self):
         """ It should import all depedencies """
-        with mock.patch.object(self.unit, '_import_dependency') as mk:
+        with mock.patch.multiple(self.unit,
+                                 _import_dependency=mock.DEFAULT,
+                                 _prefetch_dependencies=mock.DEFAULT):
+            mk = self.unit._import_dependency
             self.unit._import_dependencies()
             mk.assert_has_calls([
                 mock.call(
@@ -234,6 +237,17 @@ class TestSaleOrderLineImporter(SaleOrderLineTestBase):
                 ),
             ])
 
+    def test_import_dependencies_prefetch(self):
+        """ It should prefetch the independent dependencies """
+        with mock.patch.multiple(self.unit,
+                                 _import_dependency=mock.DEFAULT,
+                                 _prefetch_dependencies=mock.DEFAULT):
+            self.unit._import_dependencies()
+            self.unit._prefetch_dependencies.assert_called_once_with([
+                (self.record['rx_id'], 'carepoint.rx.ord.ln'),
+                (self.record['order_id'], 'carepoint.sale.order'),
+            ])
+
     def test_after_import_depends(self):
         """ It should trigger reverse dependency chain after import """
         with mock.patch.object(self.unit, '_import_dependency') as mk:
@@ -3,11 +3,20 @@
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
 import mock
+import threading
 
 from odoo.addons.connector_carepoint.unit import backend_adapter
 
 from .common import SetUpCarepointBase
 
+try:
+    from carepoint.db import Db as CarepointDb
+    from sqlalchemy import Column, Integer, String, create_engine
+    from sqlalchemy.ext.declarative import declarative_base
+    from sqlalchemy.orm import Query, sessionmaker
+except ImportError:
+    pass
+
 
 model = 'odoo.addons.connector_carepoint.unit.backend_adapter'
 
@@ -41,8 +50,89 @@ class TestBackendAdapter(SetUpCarepointBase):
                 user=self.backend.username,
                 passwd=self.backend.password,
                 db_args={'drv': self.backend.db_driver},
+                pool_size=self.backend.db_pool_size,
+                max_overflow=self.backend.db_max_overflow,
+                pool_timeout=self.backend.db_pool_timeout,
+            )
+
+    def test_init_sqlite_no_pool_args(self):
+        """ It should not pass pool arguments to SQLite engines """
+        self.backend.db_driver = CarepointDb.SQLITE
+        with self.mock_api() as api:
+            self._init_model()
+            api.assert_called_once_with(
+                server=self.backend.server,
+                user=self.backend.username,
+                passwd=self.backend.password,
+                db_args={'drv': CarepointDb.SQLITE},
             )
 
+    def test_build_carepoint_locks(self):
+        """ It should build the engines while holding the registry lock """
+        with mock.patch('%s._connections_lock' % model) as lock:
+            with self.mock_api() as api:
+
+                def build(*args, **kwargs):
+                    lock.__enter__.assert_called_once_with()
+                    lock.__exit__.assert_not_called()
+                    return mock.DEFAULT
+
+                api.side_effect = build
+                backend_adapter._build_carepoint(self.backend)
+                self.assertEqual(1, api.call_count)
+
+    def test_reset_carepoint_locks(self):
+        """ It should rebuild the engines while holding the registry lock """
+        carepoint = mock.MagicMock()
+        carepoint._init_env.side_effect = lambda: (
+            self.assertTrue(lock.__enter__.called)
+        )
+        with mock.patch('%s._connections_lock' % model) as lock:
+            backend_adapter.reset_carepoint(carepoint)
+            carepoint._init_env.assert_called_once_with()
+            self.assertEqual(1, lock.__exit__.call_count)
+
+    def test_init_rebuilds_engine(self):
+        """ It should give each connection an engine of its own """
+        backend_adapter.clear_carepoint()
+        self.backend.db_driver = CarepointDb.SQLITE
+        try:
+            carepoint = backend_adapter.get_carepoint(self.backend)
+            engine = carepoint.dbs['cph']
+            with mock.patch.object(engine, 'dispose') as dispose:
+                self.backend.server = 'other.server'
+                dispose.assert_called_once_with()
+            res = backend_adapter.get_carepoint(self.backend)
+            self.assertIsNot(engine, res.dbs['cph'])
+            self.assertIsNot(carepoint.dbs, res.dbs)
+            self.assertIs(res.dbs['cph'], res.env['cph'].kw['bind'])
+        finally:
+            backend_adapter.clear_carepoint()
+
+    def test_init_shares_connection(self):
+        """ It should reuse the connection of the backend across adapters """
+        with self.mock_api() as api:
+            res1 = self._init_model()
+            res2 = self._init_model('carepoint.fdb.unit')
+            self.assertEqual(1, api.call_count)
+            self.assertIs(res1.carepoint, res2.carepoint)
+
+    def test_init_rebuilds_on_settings_change(self):
+        """ It should build a new connection when settings changed """
+        with self.mock_api() as api:
+            self._init_model()
+            self.backend.db_pool_size = 5
+            self._init_model()
+            self.assertEqual(2, api.call_count)
+
+    def test_clear_carepoint(self):
+        """ It should drop the connection of the backend """
+        with self.mock_api() as api:
+            self._init_model()
+            backend_adapter.clear_carepoint([self.backend.id])
+            self._init_model()
+            self.assertEqual(2, api.call_count)
+
     def test_init_assigns_instance(self):
         """ It should assign carepoint instance variable during init """
         with self.mock_api() as api:
@@ -87,6 +177,51 @@ class TestBackendAdapter(SetUpCarepointBase):
             with self.assertRaises(model.RECONNECT_EXCEPTIONS[0]):
                 model.search()
 
+    def test_metadata_cached(self):
+        """ It should resolve the model and its pks once per backend """
+        with self.mock_api() as api:
+            self._init_model().search()
+            self._init_model().search()
+            api().__getitem__.assert_called_once_with(self.api_camel)
+            self.assertEqual(1, api().get_pks.call_count)
+
+    def test_metadata_cleared_with_connection(self):
+        """ It should drop the metadata along with the connection """
+        with self.mock_api() as api:
+            self._init_model().search()
+            backend_adapter.clear_carepoint([self.backend.id])
+            self._init_model().search()
+            self.assertEqual(2, api().get_pks.call_count)
+
+    def test_metadata_cleared_on_reconnect(self):
+        """ It should drop the metadata of the backend on reconnect """
+        with self.mock_api():
+            other = self._init_model('carepoint.fdb.unit')
+            other.search()
+            model = self._init_model()
+            model.carepoint = mock.MagicMock()
+            model.carepoint.__getitem__.side_effect = [
+                model.RECONNECT_EXCEPTIONS[0],
+                mock.MagicMock(),
+            ]
+            model.search()
+            self.assertNotIn(
+                (self.backend.id, other.model._cp_lib),
+                backend_adapter._metadata,
+            )
+
+    def test_get_columns(self):
+        """ It should return and cache the column names of the model """
+        with self.mock_api() as api:
+            model = self._init_model()
+            with mock.patch.object(backend_adapter, 'inspect') as inspect:
+                col = mock.MagicMock()
+                col.key = 'col'
+                inspect.return_value.mapper.column_attrs = [col]
+                self.assertEqual(('col', ), model.get_columns())
+                model.get_columns()
+                inspect.assert_called_once_with(api()[self.api_camel])
+
     def test_search_gets_pks(self):
         """ It should get the primary keys of the db """
         with self.mock_api() as api:
@@ -106,11 +241,13 @@ class TestBackendAdapter(SetUpCarepointBase):
                 'col1': 'Test',
                 'col2': 1234,
             }
+            api().get_pks.return_value = ['pk']
             self._init_model().search(**expect)
             api().search.assert_called_once_with(
-                api()[self.api_camel],
-                expect,
-                [api().get_pks().__getitem__()],
+                api()[self.api_camel], expect, None,
+            )
+            api().search().with_entities.assert_called_once_with(
+                api()[self.api_camel].pk,
             )
 
     def test_read_gets_pks(self):
@@ -133,20 +270,61 @@ class TestBackendAdapter(SetUpCarepointBase):
             api().search.assert_called_once_with(
                 api()[self.api_camel],
                 dict(zip(pk_expect, id_expect.split(','))),
-                attr_expect,
+                None,
+            )
+            api().search().with_entities.assert_called_once_with(
+                api()[self.api_camel].col1, api()[self.api_camel].col2,
             )
 
     def test_read_returns_first(self):
         """ It should return first record result """""
         with self.mock_api() as api:
-            res = self._init_model().read(123, ['expect', 'no_expect'])
+            res = self._init_model().read(123)
             self.assertEqual(api().search()[0], res)
 
+    def test_read_returns_first_dict(self):
+        """ It should return the first projected record as a dict """
+        with self.mock_api() as api:
+            res = self._init_model().read(123, ['expect', 'no_expect'])
+            self.assertEqual(
+                api().search().with_entities()[0]._asdict(), res,
+            )
+
     def test_read_returns_all(self):
-        """ It should return first record result """""
+        """ It should return all of the projected records as dicts """
         with self.mock_api() as api:
+            row = mock.MagicMock()
+            api().search().with_entities().__iter__.return_value = [row]
             res = self._init_model().read(123, ['expect', 'no_expect'], True)
-            self.assertEqual(api().search(), res)
+            self.assertEqual([row._asdict()], res)
+
+    def test_read_many_no_ids(self):
+        """ It should not search without ids """
+        with self.mock_api() as api:
+            res = self._init_model().read_many([])
+            self.assertEqual({}, res)
+            api().search.assert_not_called()
+
+    def test_read_many_filters_ids(self):
+        """ It should read the records in one query on their ids """
+        with self.mock_api() as api:
+            api().get_pks.return_value = ['pk']
+            self._init_model().read_many([1, 2], ['col'])
+            api().search().with_entities.assert_called_once_with(
+                api()[self.api_camel].col, api()[self.api_camel].pk,
+            )
+            api()[self.api_camel].pk.in_.assert_called_once_with([1, 2])
+
+    def test_read_many_returns_dicts(self):
+        """ It should return the projected records as dicts by id """
+        with self.mock_api() as api:
+            api().get_pks.return_value = ['pk']
+            row = mock.MagicMock(pk=2)
+            api().search().with_entities().filter().__iter__.return_value = [
+                row,
+            ]
+            res = self._init_model().read_many([2], ['col'])
+            self.assertEqual({2: row._asdict()}, res)
 
     def test_read_image_gets_file(self):
         """ It should get proper file path from server """
@@ -193,17 +371,230 @@ class TestBackendAdapter(SetUpCarepointBase):
             api().search.assert_called_once_with(
                 api()[self.api_camel],
                 filter_expect,
-                attr_expect,
+                None,
+            )
+            api().search().with_entities.assert_called_once_with(
+                api()[self.api_camel].col1, api()[self.api_camel].col2,
             )
 
     def test_search_read_returns_result(self):
         """ It should return result of search """""
         with self.mock_api() as api:
-            attr_expect = ['col1', 'col2']
             filter_expect = {'col4': 1234, 'col8': 'test'}
-            res = self._init_model().search_read(attr_expect, **filter_expect)
+            res = self._init_model().search_read(**filter_expect)
             self.assertEqual(api().search(), res)
 
+    def test_search_read_returns_dicts(self):
+        """ It should yield the projected records as dicts """
+        with self.mock_api() as api:
+            row = mock.MagicMock()
+            api().search().with_entities().__iter__.return_value = [row]
+            res = self._init_model().search_read(['col1'])
+            self.assertEqual([row._asdict()], list(res))
+
+    def test_search_emits_columns(self):
+        """ It should only select the attributes in the emitted query """
+        class ProjectedTable(declarative_base()):
+            __tablename__ = 'projected_table'
+            pk = Column(Integer, primary_key=True)
+            col = Column(String)
+            other = Column(String)
+
+        with self.mock_api() as api:
+            api().__getitem__.return_value = ProjectedTable
+            api().get_pks.return_value = ['pk']
+            api().search.side_effect = lambda model_obj, filters, attrs: (
+                Query(model_obj).filter_by(**filters)
+            )
+            adapter = self._init_model()
+            query = adapter._CarepointCRUDAdapter__search(
+                ProjectedTable, {'pk': 1}, ['col', 'pk'],
+            )
+            self.assertEqual(
+                ['col', 'pk'],
+                [c['name'] for c in query.column_descriptions],
+            )
+            self.assertNotIn('other', str(query))
+
+    def test_search_count(self):
+        """ It should count the records matching the filters """
+        with self.mock_api() as api:
+            with mock.patch('%s.func' % model):
+                query = api().search().with_entities()
+                res = self._init_model().search_count(col=1)
+                api().search.assert_called_with(
+                    api()[self.api_camel], {'col': 1}, None,
+                )
+                self.assertEqual(query.scalar(), res)
+
+    def test_get_change_signature(self):
+        """ It should count the records and get their latest change """
+        with self.mock_api() as api:
+            with mock.patch('%s.func' % model) as func:
+                query = api().search().with_entities()
+                query.one.return_value = (3, '2016-05-10 00:00:00')
+                res = self._init_model().get_change_signature(col=1)
+                api().search.assert_called_with(
+                    api()[self.api_camel], {'col': 1}, None,
+                )
+                func.max.assert_called_once_with(
+                    api()[self.api_camel].chg_date,
+                )
+                self.assertEqual('3,2016-05-10 00:00:00', res)
+
+    def test_get_date_range(self):
+        """ It should count the records and get their change date range """
+        with self.mock_api() as api:
+            with mock.patch('%s.func' % model):
+                query = api().search().with_entities()
+                res = self._init_model().get_date_range(col=1)
+                api().search.assert_called_with(
+                    api()[self.api_camel], {'col': 1}, None,
+                )
+                self.assertEqual(query.one(), res)
+
+    def _mock_pages(self, api, pages):
+        api().get_pks.return_value = ['pk']
+        # Projected and full searches page through the same query
+        api().search().with_entities.return_value = api().search()
+        query = api().search().order_by()
+        query.limit().all.side_effect = pages
+        query.filter().limit().all.side_effect = pages[1:]
+        return query
+
+    def test_iter_search_read_orders(self):
+        """ It should order the search by primary key """
+        with self.mock_api() as api:
+            self._mock_pages(api, [[]])
+            list(self._init_model().iter_search_read(col=1))
+            api().search.assert_called_with(
+                api()[self.api_camel], {'col': 1}, None,
+            )
+            api().search().order_by.assert_called_with(
+                api()[self.api_camel].pk,
+            )
+
+    def test_iter_search_read_adds_pk(self):
+        """ It should always read the primary key """
+        with self.mock_api() as api:
+            self._mock_pages(api, [[]])
+            list(self._init_model().iter_search_read(['col']))
+            api().search.assert_called_with(
+                api()[self.api_camel], {}, None,
+            )
+            api().search().with_entities.assert_called_with(
+                api()[self.api_camel].col, api()[self.api_camel].pk,
+            )
+
+    def test_iter_search_read_pages(self):
+        """ It should read the next page after the last primary key """
+        with self.mock_api() as api:
+            rows = [mock.MagicMock(pk=i) for i in range(3)]
+            query = self._mock_pages(api, [rows[:2], rows[2:]])
+            res = list(self._init_model().iter_search_read(page_size=2))
+            self.assertEqual(rows, res)
+            query.limit.assert_called_with(2)
+            query.filter().limit().all.assert_called_once_with()
+
+    def test_iter_search_read_stops(self):
+        """ It should stop after a partial page """
+        with self.mock_api() as api:
+            rows = [mock.MagicMock(pk=1)]
+            query = self._mock_pages(api, [rows])
+            res = list(self._init_model().iter_search_read(page_size=2))
+            self.assertEqual(rows, res)
+            query.filter.assert_not_called()
+
+    def test_iter_search(self):
+        """ It should yield the primary keys of the records """
+        with self.mock_api() as api:
+            rows = [mock.MagicMock(pk=1), mock.MagicMock(pk=2)]
+            self._mock_pages(api, [rows])
+            res = list(self._init_model().iter_search(page_size=5))
+            self.assertEqual([1, 2], res)
+
+    def test_search_read_chunks(self):
+        """ It should yield chunks of record ids and dicts """
+        with self.mock_api() as api:
+            rows = [mock.MagicMock(pk=i) for i in range(3)]
+            self._mock_pages(api, [rows[:2], rows[2:]])
+            model = self._init_model()
+            with mock.patch.object(model, 'to_dict') as to_dict:
+                res = list(model.search_read_chunks(2))
+            self.assertEqual(
+                [[(0, to_dict()), (1, to_dict())], [(2, to_dict())]], res,
+            )
+
+    def test_search_read_chunks_after(self):
+        """ It should only read the records after the cursor """
+        with self.mock_api():
+            model = self._init_model()
+            with mock.patch.object(model, 'iter_search_read') as iter_read:
+                iter_read.return_value = []
+                list(model.search_read_chunks(2, after=5, col=1))
+                iter_read.assert_called_once_with(None, 2, 5, col=1)
+
+    def test_iter_search_composite_ids(self):
+        """ It should join the values of composite primary keys """
+        with self.mock_api() as api:
+            rows = [mock.MagicMock(pk=1, pk2=2)]
+            self._mock_pages(api, [rows])
+            api().get_pks.return_value = ['pk', 'pk2']
+            res = list(self._init_model().iter_search(page_size=5))
+            self.assertEqual(['1,2'], res)
+
+    def test_iter_search_composite_keyset(self):
+        """ It should page through all the rows of composite keys """
+        class CompositeTable(declarative_base()):
+            __tablename__ = 'composite_table'
+            pk = Column(Integer, primary_key=True, autoincrement=False)
+            pk2 = Column(Integer, primary_key=True, autoincrement=False)
+
+        engine = create_engine('sqlite://')
+        CompositeTable.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        for pk, pk2 in [(2, 1), (1, 2), (1, 1), (1, 3), (3, 1)]:
+            session.add(CompositeTable(pk=pk, pk2=pk2))
+        session.commit()
+        with self.mock_api() as api:
+            api().__getitem__.return_value = CompositeTable
+            api().get_pks.return_value = ['pk', 'pk2']
+            api().search.side_effect = lambda model_obj, filters, attrs: (
+                session.query(model_obj).filter_by(**filters)
+            )
+            adapter = self._init_model()
+            self.assertEqual(
+                ['1,1', '1,2', '1,3', '2,1', '3,1'],
+                list(adapter.iter_search(page_size=2)),
+            )
+            self.assertEqual(
+                ['1,3', '2,1', '3,1'],
+                list(adapter.iter_search(page_size=2, after='1,2')),
+            )
+
+    def test_to_dict_dict(self):
+        """ It should return dicts untouched """
+        with self.mock_api():
+            expect = {'col': 1}
+            self.assertIs(expect, self._init_model().to_dict(expect))
+
+    def test_to_dict_keyed_tuple(self):
+        """ It should convert keyed tuples w/ their asdict method """
+        with self.mock_api():
+            row = mock.MagicMock()
+            self.assertEqual(
+                row._asdict(), self._init_model().to_dict(row),
+            )
+
+    def test_to_dict_model(self):
+        """ It should read the columns of model instances """
+        with self.mock_api():
+            model = self._init_model()
+            row = mock.MagicMock(spec=['col'])
+            with mock.patch.object(model, 'get_columns') as get_columns:
+                get_columns.return_value = ('col', )
+                self.assertDictEqual({'col': row.col}, model.to_dict(row))
+
     def test_create_creates(self):
         """ It should create w/ proper vals """
         with self.mock_api() as api:
@@ -250,6 +641,88 @@ class TestBackendAdapter(SetUpCarepointBase):
                 res,
             )
 
+    def test_get_next_sequence_single(self):
+        """ It should get every value from CarePoint w/o block size """
+        with self.mock_api() as api:
+            res = self._init_model().get_next_sequence('seq')
+            api().get_next_sequence.assert_called_once_with('seq')
+            self.assertEqual(api().get_next_sequence(), res)
+
+    def test_get_next_sequence_block(self):
+        """ It should reserve a block and hand out its values in order """
+        self.backend.db_sequence_block_size = 2
+        with self.mock_api():
+            model = self._init_model()
+            with mock.patch.object(model, '_reserve_sequence') as reserve:
+                reserve.return_value = [1, 2]
+                res = [model.get_next_sequence('seq') for _ in range(3)]
+                self.assertEqual([1, 2, 1], res)
+                self.assertEqual(2, reserve.call_count)
+                reserve.assert_called_with('seq', 2)
+
+    def test_get_next_sequence_block_shared(self):
+        """ It should share the reserved values between adapters """
+        self.backend.db_sequence_block_size = 2
+        with self.mock_api():
+            model1 = self._init_model()
+            model2 = self._init_model()
+            with mock.patch.object(model1, '_reserve_sequence') as reserve:
+                reserve.return_value = [1, 2]
+                model1.get_next_sequence('seq')
+                self.assertEqual(2, model2.get_next_sequence('seq'))
+
+    def test_get_next_sequence_block_concurrent(self):
+        """ It should not block other sequences during a reservation """
+        self.backend.db_sequence_block_size = 2
+        reserving = threading.Event()
+        release = threading.Event()
+
+        def reserve(sequence_name, count):
+            if sequence_name == 'seq1':
+                reserving.set()
+                release.wait(5)
+            return [1, 2]
+
+        with self.mock_api():
+            model = self._init_model()
+            # Read in this thread, so that the other one uses the cache
+            model.backend_record.read(['db_sequence_block_size'])
+            with mock.patch.object(model, '_reserve_sequence') as mk:
+                mk.side_effect = reserve
+                thread = threading.Thread(
+                    target=model.get_next_sequence, args=('seq1', ),
+                )
+                thread.start()
+                try:
+                    reserving.wait(5)
+                    self.assertEqual(1, model.get_next_sequence('seq2'))
+                    self.assertTrue(thread.is_alive())
+                finally:
+                    release.set()
+                    thread.join()
+
+    def test_clear_carepoint_sequences(self):
+        """ It should drop the reserved values along with the connection """
+        self.backend.db_sequence_block_size = 2
+        with self.mock_api():
+            model = self._init_model()
+            with mock.patch.object(model, '_reserve_sequence') as reserve:
+                reserve.return_value = [1, 2]
+                model.get_next_sequence('seq')
+                backend_adapter.clear_carepoint([self.backend.id])
+                self.assertEqual(1, model.get_next_sequence('seq'))
+
+    def test_reserve_sequence(self):
+        """ It should return the values of the reserved block """
+        with self.mock_api() as api:
+            conn = api().dbs['cph'].begin().__enter__()
+            conn.execute().fetchall.return_value = [(1, ), (2, )]
+            res = self._init_model()._reserve_sequence('seq', 2)
+            conn.execute.assert_called_with(
+                mock.ANY, seq_name='seq', count=2,
+            )
+            self.assertEqual([1, 2], res)
+
     def test_delete_deletes(self):
         """ It should delete w/ proper vals """
         with self.mock_api() as api:
@@ -266,17 +739,16 @@ class TestBackendAdapter(SetUpCarepointBase):
             res = self._init_model().delete(123)
             self.assertEqual(api().delete(), res)
 
-    def test_write_reads(self):
-        """ It should get record for id """
-        expect1, expect2 = 123, {'test': 'TEST'}
-        with self.mock_api():
-            model = self._init_model()
-            with mock.patch.object(model, 'read') as read:
-                model.write(expect1, expect2)
-                read.assert_called_once_with(
-                    expect1,
-                    return_all=True,
-                )
+    def test_write_searches_pk(self):
+        """ It should search the record by its primary keys """
+        with self.mock_api() as api:
+            api().get_pks.return_value = ['pk1', 'pk2']
+            self._init_model().write('123,456', {'test': 'TEST'})
+            api().search.assert_called_once_with(
+                api()[self.api_camel],
+                {'pk1': '123', 'pk2': '456'},
+                None,
+            )
 
     def test_write_updates(self):
         """ It should update record w/ data """
@@ -284,7 +756,7 @@ class TestBackendAdapter(SetUpCarepointBase):
         with self.mock_api() as api:
             self._init_model().write(expect1, expect2)
             api().search().update.assert_called_once_with(
-                expect2,
+                expect2, synchronize_session=False,
             )
 
     def test_write_commits(self):
@@ -303,3 +775,103 @@ class TestBackendAdapter(SetUpCarepointBase):
                 api().search(),
                 res
             )
+
+    def test_write_many_updates(self):
+        """ It should update every record in the session of the first """
+        data = {'test': 'TEST'}
+        with self.mock_api() as api:
+            api().get_pks.return_value = ['pk']
+            self._init_model().write_many({1: data, 2: data})
+            session = api().search().session
+            session.query.assert_called_once_with(api()[self.api_camel])
+            self.assertEqual(1, api().search().update.call_count)
+            session.query().filter_by().update.assert_called_once_with(
+                data, synchronize_session=False,
+            )
+
+    def test_write_many_commits(self):
+        """ It should commit all of the updates at once """
+        with self.mock_api() as api:
+            self._init_model().write_many({1: {}, 2: {}})
+            api().search().session.commit.assert_called_once_with()
+
+    def test_write_many_rollback(self):
+        """ It should rollback the updates and raise on error """
+        with self.mock_api() as api:
+            api().search().update.side_effect = self.EndTestException
+            with self.assertRaises(self.EndTestException):
+                self._init_model().write_many({1: {}})
+            api().search().session.rollback.assert_called_once_with()
+            api().search().session.commit.assert_not_called()
+
+    def test_carepoint_transaction_state(self):
+        """ It should flag the thread while the transaction is open """
+        self.assertFalse(backend_adapter.in_carepoint_transaction())
+        with backend_adapter.carepoint_transaction():
+            self.assertTrue(backend_adapter.in_carepoint_transaction())
+            with backend_adapter.carepoint_transaction():
+                pass
+            self.assertTrue(backend_adapter.in_carepoint_transaction())
+        self.assertFalse(backend_adapter.in_carepoint_transaction())
+
+    def test_carepoint_transaction_write(self):
+        """ It should update in the transaction session and commit once """
+        with self.mock_api() as api:
+            session = api().search().session
+            with backend_adapter.carepoint_transaction():
+                model = self._init_model()
+                model.write(1, {'test': 'TEST'})
+                model.write(2, {'test': 'TEST'})
+                session.commit.assert_not_called()
+                update = session.query().filter_by().update
+                self.assertEqual(2, update.call_count)
+            session.commit.assert_called_once_with()
+
+    def test_carepoint_transaction_create(self):
+        """ It should add new records to the transaction session """
+        with self.mock_api() as api:
+            api().get_pks.return_value = ['pk']
+            session = api().search().session
+            with backend_adapter.carepoint_transaction():
+                self._init_model().create({'pk': 1, 'col': 2})
+            api().create.assert_not_called()
+            session.add.assert_called_once_with(
+                api()[self.api_camel](pk=1, col=2),
+            )
+            session.commit.assert_called_once_with()
+
+    def test_carepoint_transaction_before_commit(self):
+        """ It should call before_commit before committing the sessions """
+        with self.mock_api() as api:
+            session = api().search().session
+            before_commit = mock.MagicMock()
+            before_commit.side_effect = (
+                lambda: session.commit.assert_not_called()
+            )
+            with backend_adapter.carepoint_transaction(before_commit):
+                self._init_model().write(1, {'test': 'TEST'})
+                before_commit.assert_not_called()
+            before_commit.assert_called_once_with()
+            session.commit.assert_called_once_with()
+
+    def test_carepoint_transaction_before_commit_error(self):
+        """ It should rollback the sessions if before_commit raises """
+        with self.mock_api() as api:
+            session = api().search().session
+            before_commit = mock.MagicMock(side_effect=self.EndTestException)
+            with self.assertRaises(self.EndTestException):
+                with backend_adapter.carepoint_transaction(before_commit):
+                    self._init_model().write(1, {'test': 'TEST'})
+            session.rollback.assert_called_once_with()
+            session.commit.assert_not_called()
+
+    def test_carepoint_transaction_rollback(self):
+        """ It should rollback the transaction sessions and raise """
+        with self.mock_api() as api:
+            session = api().search().session
+            with self.assertRaises(self.EndTestException):
+                with backend_adapter.carepoint_transaction():
+                    self._init_model().write(1, {'test': 'TEST'})
+                    raise self.EndTestException()
+            session.rollback.assert_called_once_with()
+            session.commit.assert_not_called()
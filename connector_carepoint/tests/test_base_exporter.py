@@ -9,6 +9,9 @@ from odoo import fields
 from odoo.addons.connector.exception import IDMissingInBackend
 
 from odoo.addons.connector_carepoint.unit import export_synchronizer
+from odoo.addons.connector_carepoint.unit.backend_adapter import (
+    carepoint_transaction,
+)
 
 from .common import SetUpCarepointBase
 
@@ -67,12 +70,12 @@ class TestBaseExporter(SetUpCarepointBase):
         with self.assertRaises(AssertionError):
             exporter._delay_import()
 
-    @mock.patch('%s.import_record' % model)
+    @mock.patch('%s.delay_import_coalesced' % model)
     def test_delay_import_delays_import(self, mk):
         """ It should call delayed import w/ proper args """
         exporter = self._new_exporter(self.carepoint_id)
         exporter._delay_import()
-        mk.delay.assert_called_once_with(
+        mk.assert_called_once_with(
             exporter.session,
             exporter.model._name,
             exporter.backend_record.id,
@@ -284,6 +287,21 @@ class TestBaseExporter(SetUpCarepointBase):
                         with self.assertRaises(EndTestException):
                             exporter.run(self.binding_id)
 
+    def test_commit(self):
+        """ It should commit the session outside of a batch """
+        exporter = self._new_exporter()
+        with mock.patch.object(exporter, 'session') as session:
+            exporter._commit()
+            session.commit.assert_called_once_with()
+
+    def test_commit_in_transaction(self):
+        """ It should not commit the session in a batch transaction """
+        exporter = self._new_exporter()
+        with mock.patch.object(exporter, 'session') as session:
+            with carepoint_transaction():
+                exporter._commit()
+            session.commit.assert_not_called()
+
     def test_run_calls_after_export(self):
         """ It should call _after_export when done """
         exporter = self._new_exporter(
@@ -4,6 +4,8 @@
 
 import mock
 
+from odoo import fields
+
 from odoo.addons.connector_carepoint.unit import import_synchronizer
 
 from .common import SetUpCarepointBase
@@ -38,11 +40,12 @@ class TestBatchImporter(SetUpCarepointBase):
         expect = {}
         importer = self._new_importer()
         with self.mock_adapter(importer):
-            importer.backend_adapter.search.side_effect = EndTestException
+            adapter = importer.backend_adapter
+            adapter.iter_search.side_effect = EndTestException
             with self.assertRaises(EndTestException):
                 importer.run()
-            importer.backend_adapter.search.assert_called_once_with(
-                **expect
+            adapter.iter_search.assert_called_once_with(
+                after=None, **expect
             )
 
     def test_run_search(self):
@@ -50,12 +53,13 @@ class TestBatchImporter(SetUpCarepointBase):
         expect = {'expect': 1234, 'test': 45456}
         importer = self._new_importer()
         with self.mock_adapter(importer):
+            adapter = importer.backend_adapter
             with mock.patch.object(importer, '_import_record'):
-                importer.backend_adapter.search.side_effect = EndTestException
+                adapter.iter_search.side_effect = EndTestException
                 with self.assertRaises(EndTestException):
                     importer.run(expect)
-            importer.backend_adapter.search.assert_called_once_with(
-                **expect
+            adapter.iter_search.assert_called_once_with(
+                after=None, **expect
             )
 
     def test_run_import(self):
@@ -64,7 +68,7 @@ class TestBatchImporter(SetUpCarepointBase):
         importer = self._new_importer()
         with self.mock_adapter(importer):
             with mock.patch.object(importer, '_import_record'):
-                importer.backend_adapter.search.return_value = expect
+                importer.backend_adapter.iter_search.return_value = expect
                 importer._import_record.side_effect = EndTestException
                 with self.assertRaises(EndTestException):
                     importer.run()
@@ -72,6 +76,194 @@ class TestBatchImporter(SetUpCarepointBase):
                     expect[0]
                 )
 
+    def test_run_chunked_search_read(self):
+        """ It should read the records in chunks when chunk size is set """
+        expect = {'expect': 1234}
+        importer = self._new_importer()
+        importer._chunk_size = 50
+        with self.mock_adapter(importer):
+            with mock.patch.multiple(importer,
+                                     _import_record=mock.DEFAULT,
+                                     _get_chunk_attributes=mock.DEFAULT,
+                                     ):
+                importer._get_chunk_attributes.return_value = ['col']
+                importer.backend_adapter.search_read_chunks.return_value = []
+                importer.run(expect)
+            adapter = importer.backend_adapter
+            adapter.search_read_chunks.assert_called_once_with(
+                50, ['col'], after=None, **expect
+            )
+            importer.backend_adapter.iter_search.assert_not_called()
+
+    def test_get_chunk_attributes(self):
+        """ It should read the fields read by the record importer """
+        importer = self._new_importer()
+        with mock.patch.object(importer, 'unit_for') as unit_for:
+            res = importer._get_chunk_attributes()
+            unit_for.assert_called_once_with(
+                import_synchronizer.CarepointImporter,
+            )
+            self.assertEqual(unit_for()._get_read_attributes(), res)
+
+    def test_run_chunked_import(self):
+        """ It should import each record of the chunks w/ its data """
+        record = {'pk': 1, 'col': 'test'}
+        importer = self._new_importer()
+        importer._chunk_size = 50
+        with self.mock_adapter(importer):
+            with mock.patch.object(importer, '_import_record'):
+                importer.backend_adapter.search_read_chunks.return_value = [
+                    [(1, record)],
+                ]
+                importer.run()
+                importer._import_record.assert_called_once_with(
+                    1, record=record,
+                )
+
+    def _new_record(self, carepoint_id, sync_date):
+        return self.env[self.model].create({
+            'name': 'Test Pharm',
+            'carepoint_id': carepoint_id,
+            'sync_date': sync_date,
+            'backend_id': self.backend.id,
+            'warehouse_id': self.env.ref('stock.warehouse0').id,
+        })
+
+    def test_filter_current(self):
+        """ It should only return records that changed after the sync """
+        self._new_record(1, '2016-01-01 00:00:00')
+        self._new_record(2, '2016-01-01 00:00:00')
+        from_string = fields.Datetime.from_string
+        res = self._new_importer()._filter_current({
+            1: from_string('2015-12-31 00:00:00'),
+            2: from_string('2016-01-02 00:00:00'),
+            3: from_string('2015-12-31 00:00:00'),
+            4: None,
+        })
+        self.assertEqual([2, 3, 4], res)
+
+    def test_run_filters_current(self):
+        """ It should search dates & filter current for incremental runs """
+        expect = {'chg_date': {'>=': 'date'}}
+        importer = self._new_importer()
+        with self.mock_adapter(importer):
+            adapter = importer.backend_adapter
+            adapter.search_read_chunks.return_value = [
+                [(1, {'chg_date': 'date1'}), (2, {'chg_date': 'date2'})],
+            ]
+            with mock.patch.multiple(importer,
+                                     _import_record=mock.DEFAULT,
+                                     _filter_current=mock.DEFAULT):
+                importer._filter_current.return_value = [1]
+                importer.run(expect)
+                adapter.search_read_chunks.assert_called_once_with(
+                    attributes=['chg_date'], after=None, **expect
+                )
+                importer._filter_current.assert_called_once_with(
+                    {1: 'date1', 2: 'date2'},
+                )
+                importer._import_record.assert_called_once_with(1)
+            adapter.iter_search.assert_not_called()
+
+    def test_run_no_filter_current(self):
+        """ It should not filter current records when disabled """
+        expect = {'chg_date': {'>=': 'date'}}
+        importer = self._new_importer()
+        importer._skip_current = False
+        with self.mock_adapter(importer):
+            with mock.patch.object(importer, '_import_record'):
+                importer.backend_adapter.iter_search.return_value = []
+                importer.run(expect)
+            importer.backend_adapter.search_read_chunks.assert_not_called()
+
+    def _new_batch(self):
+        return self.env['carepoint.import.batch']._new_batch(
+            self.backend, self.model,
+        )
+
+    def test_run_starts_batch(self):
+        """ It should count the records when the batch starts """
+        importer = self._new_importer()
+        importer.batch = self._new_batch()
+        with self.mock_adapter(importer) as adapter:
+            adapter.search_count.return_value = 10
+            adapter.iter_search.return_value = []
+            importer.run({'col': 1})
+            adapter.search_count.assert_called_once_with(col=1)
+        self.assertEqual('running', importer.batch.state)
+        self.assertEqual(10, importer.batch.record_count)
+
+    def test_run_resumes_batch(self):
+        """ It should resume after the cursor of a started batch """
+        importer = self._new_importer()
+        importer.batch = self._new_batch()
+        importer.batch._start(10)
+        importer.batch._save_progress(5, 5)
+        with self.mock_adapter(importer) as adapter:
+            adapter.iter_search.return_value = []
+            importer.run()
+            adapter.search_count.assert_not_called()
+            adapter.iter_search.assert_called_once_with(after=5)
+
+    def test_run_checkpoints(self):
+        """ It should save the position every checkpoint size records """
+        importer = self._new_importer()
+        importer._checkpoint_size = 2
+        with self.mock_adapter(importer) as adapter:
+            adapter.iter_search.return_value = [1, 2, 3]
+            with mock.patch.multiple(importer,
+                                     _import_record=mock.DEFAULT,
+                                     _checkpoint=mock.DEFAULT):
+                importer.run()
+                importer._checkpoint.assert_has_calls([
+                    mock.call(2, 2), mock.call(3, 1),
+                ])
+
+    def test_run_chunked_checkpoints(self):
+        """ It should save the position after each chunk """
+        importer = self._new_importer()
+        importer._chunk_size = 50
+        with self.mock_adapter(importer) as adapter:
+            adapter.search_read_chunks.return_value = [
+                [(1, {}), (2, {})],
+            ]
+            with mock.patch.multiple(importer,
+                                     _import_record=mock.DEFAULT,
+                                     _checkpoint=mock.DEFAULT):
+                importer.run()
+                importer._checkpoint.assert_called_once_with(2, 2)
+
+    def test_checkpoint_saves_progress(self):
+        """ It should save the cursor in the batch and commit """
+        importer = self._new_importer()
+        importer.batch = self._new_batch()
+        with mock.patch.object(importer.session, 'commit') as commit:
+            importer._checkpoint('pk', 3)
+            importer._checkpoint('pk2', 2)
+            self.assertEqual(2, commit.call_count)
+        self.assertEqual('pk2', importer.batch._get_cursor())
+        self.assertEqual(5, importer.batch.processed_count)
+
+    def test_checkpoint_no_batch(self):
+        """ It should not commit without a batch """
+        importer = self._new_importer()
+        with mock.patch.object(importer.session, 'commit') as commit:
+            importer._checkpoint('pk', 3)
+            commit.assert_not_called()
+
+    def test_import_batch_done(self):
+        """ It should run the importer for the batch & mark it done """
+        batch = self._new_batch()
+        with mock.patch('%s.get_environment' % model) as env:
+            importer = env().get_connector_unit()
+            import_synchronizer.import_batch(
+                self.session, self.model, self.backend.id, batch_id=batch.id,
+            )
+            self.assertEqual(batch, importer.batch)
+            importer.run.assert_called_once_with(filters=None)
+        self.assertEqual('done', batch.state)
+        self.assertEqual(100, batch.progress)
+
     def test_import_record(self):
         """ It should raise NotImplemented on base class """
         importer = self._new_importer()
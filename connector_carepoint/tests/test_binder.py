@@ -142,6 +142,35 @@ class TestBinder(SetUpCarepointBase):
             'sync_date': odoo.fields.Datetime.now(),
         })
 
+    @mock.patch('%s.odoo' % model)
+    def test_bind_values(self, odoo):
+        """ It should return the binding and sync time values """
+        binder = self._new_binder()
+        self.assertDictEqual(
+            {
+                'carepoint_id': str(self.carepoint_id),
+                'sync_date': odoo.fields.Datetime.now(),
+            },
+            binder.bind_values(self.carepoint_id),
+        )
+
+    @mock.patch('%s.odoo' % model)
+    def test_bind_no_write(self, odoo):
+        """ It should not write the record when asked not to """
+        rec = mock.MagicMock()
+        odoo.models.BaseModel = type(rec)
+        binder = self._new_binder()
+        binder.bind(self.carepoint_id, rec, write=False)
+        rec.with_context().write.assert_not_called()
+
+    def test_bind_no_write_fills_cache(self):
+        """ It should still cache the binding when not writing """
+        rec = self._new_record(False)
+        binder = self._new_binder()
+        binder.bind(self.carepoint_id, rec, write=False)
+        key = binder._cache_key('odoo', str(self.carepoint_id))
+        self.assertEqual(rec.id, binder.cache.get(key))
+
     def test_unwrap_binding_id_browse(self):
         """ It should return normal record given binding id """
         rec = self._new_record()
@@ -200,3 +229,110 @@ class TestBinder(SetUpCarepointBase):
         binder = self._new_binder()
         with self.assertRaises(ValueError):
             binder.unwrap_model()
+
+    def test_to_odoo_cache_hit(self):
+        """ It should not search again for a cached external ID """
+        rec = self._new_record()
+        binder = self._new_binder()
+        binder.to_odoo(self.carepoint_id)
+        with mock.patch.object(type(self.env[self.model]), 'search') as mk:
+            res = binder.to_odoo(self.carepoint_id, unwrap=False)
+            mk.assert_not_called()
+        self.assertEqual(rec.id, res)
+        self.assertEqual(1, binder.cache.hits)
+
+    def test_to_odoo_cache_miss_not_cached(self):
+        """ It should not cache lookups without a binding """
+        binder = self._new_binder()
+        self.assertEqual(None, binder.to_odoo(self.carepoint_id))
+        self.assertEqual(0, len(binder.cache))
+        self.assertEqual(1, binder.cache.misses)
+
+    def test_to_backend_cache_hit(self):
+        """ It should return the cached external ID """
+        rec = self._new_record()
+        binder = self._new_binder()
+        binder.to_backend(rec.odoo_id.id)
+        res = binder.to_backend(rec.odoo_id.id)
+        self.assertEqual(rec.carepoint_id, res)
+        self.assertEqual(1, binder.cache.hits)
+
+    def test_bind_fills_cache(self):
+        """ It should cache the new binding in both directions """
+        rec = self._new_record(False)
+        binder = self._new_binder()
+        binder.bind(self.carepoint_id, rec)
+        key = binder._cache_key('odoo', str(self.carepoint_id))
+        self.assertEqual(rec.id, binder.cache.get(key))
+        self.assertEqual(
+            str(self.carepoint_id),
+            binder.cache.get(binder._cache_key('backend', rec.odoo_id.id)),
+        )
+
+    def test_get_binder_cache_rollback(self):
+        """ It should drop the cache at the end of the transaction """
+        cr = mock.MagicMock()
+        cache = binder.get_binder_cache(cr, 10)
+        self.assertIs(cache, binder.get_binder_cache(cr, 10))
+        cr.after.assert_has_calls([
+            mock.call('commit', mock.ANY),
+            mock.call('rollback', mock.ANY),
+        ])
+        cr.after.call_args[0][1]()
+        self.assertIsNot(cache, binder.get_binder_cache(cr, 10))
+
+    def test_binder_cache_lru(self):
+        """ It should evict the least recently used entries """
+        cache = binder.BinderCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(None, cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+
+    def test_to_odoo_many(self):
+        """ It should return Odoo IDs keyed by external ID """
+        rec = self._new_record()
+        res = self._new_binder().to_odoo_many([self.carepoint_id, 'none'])
+        self.assertEqual({str(self.carepoint_id): rec.odoo_id.id}, res)
+
+    def test_to_odoo_many_wrap(self):
+        """ It should return binding IDs when not unwrapping """
+        rec = self._new_record()
+        res = self._new_binder().to_odoo_many(
+            [self.carepoint_id], unwrap=False,
+        )
+        self.assertEqual({str(self.carepoint_id): rec.id}, res)
+
+    def test_to_odoo_many_fills_cache(self):
+        """ It should cache the bindings that were found """
+        rec = self._new_record()
+        binder = self._new_binder()
+        binder.to_odoo_many([self.carepoint_id])
+        self.assertEqual(rec.id, binder.to_odoo(self.carepoint_id,
+                                                unwrap=False))
+        self.assertEqual(1, binder.cache.hits)
+
+    def test_to_odoo_many_empty(self):
+        """ It should return an empty dict w/o external IDs """
+        self.assertEqual({}, self._new_binder().to_odoo_many([]))
+
+    def test_to_backend_many(self):
+        """ It should return external IDs keyed by Odoo ID """
+        rec = self._new_record()
+        res = self._new_binder().to_backend_many([rec.odoo_id.id])
+        self.assertEqual({rec.odoo_id.id: rec.carepoint_id}, res)
+
+    def test_to_backend_many_unwrapped(self):
+        """ It should return external IDs keyed by binding ID """
+        rec = self._new_record()
+        res = self._new_binder().to_backend_many(rec, wrap=False)
+        self.assertEqual({rec.id: rec.carepoint_id}, res)
+
+    def test_to_backend_many_unbound(self):
+        """ It should omit records w/o external ID """
+        rec = self._new_record(False)
+        res = self._new_binder().to_backend_many(rec, wrap=False)
+        self.assertEqual({}, res)
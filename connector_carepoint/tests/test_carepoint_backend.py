@@ -17,6 +17,8 @@ from odoo.addons.connector_carepoint.models.carepoint_backend import (
 
 
 model = 'odoo.addons.connector_carepoint.models.carepoint_backend'
+window_model = \
+    'odoo.addons.connector_carepoint.models.carepoint_import_window'
 
 
 class TestCarepointBackend(SetUpCarepointBase):
@@ -24,6 +26,12 @@ class TestCarepointBackend(SetUpCarepointBase):
     def setUp(self):
         super(TestCarepointBackend, self).setUp()
         self.Model = self.env['carepoint.backend']
+        patcher = mock.patch.object(
+            type(self.Model), '_get_metadata_signature',
+            return_value='signature',
+        )
+        self.get_signature = patcher.start()
+        self.addCleanup(patcher.stop)
 
     def test_check_default_for_company(self):
         """ It should not allow two defaults for the same company """
@@ -33,6 +41,18 @@ class TestCarepointBackend(SetUpCarepointBase):
                 'rx_prefix': 'RXTEST',
             })
 
+    @mock.patch('%s.clear_carepoint' % model)
+    def test_write_clears_connection(self, clear):
+        """ It should drop the pooled connection on settings change """
+        self.backend.write({'server': '127.0.0.2'})
+        clear.assert_called_once_with([self.backend.id])
+
+    @mock.patch('%s.clear_carepoint' % model)
+    def test_write_keeps_connection(self, clear):
+        """ It should keep the pooled connection on other changes """
+        self.backend.write({'sale_prefix': 'TEST/'})
+        clear.assert_not_called()
+
     def test_select_versions(self):
         """ It should return proper versions """
         self.assertEqual(
@@ -49,6 +69,55 @@ class TestCarepointBackend(SetUpCarepointBase):
             session(), 'carepoint.carepoint.store', self.backend.id,
         )
 
+    @mock.patch('%s.import_batch' % model)
+    @mock.patch('%s.ConnectorSession' % model)
+    def test_synchronize_metadata_stores_signature(self, session, batch):
+        """ It should store the metadata signature and sync date """
+        self.backend.synchronize_metadata()
+        self.assertEqual('signature', self.backend.metadata_signature)
+        self.assertTrue(self.backend.metadata_sync_date)
+
+    def _sync_metadata_ago(self, seconds):
+        sync_date = fields.Datetime.from_string(fields.Datetime.now())
+        self.backend.write({
+            'metadata_sync_ttl': 600,
+            'metadata_signature': 'signature',
+            'metadata_sync_date': fields.Datetime.to_string(
+                sync_date - timedelta(seconds=seconds),
+            ),
+        })
+
+    @mock.patch('%s.import_batch' % model)
+    @mock.patch('%s.ConnectorSession' % model)
+    def test_check_structure_within_ttl(self, session, batch):
+        """ It should not synchronize metadata again within the TTL """
+        self._sync_metadata_ago(60)
+        self.backend.check_carepoint_structure()
+        batch.assert_not_called()
+        self.get_signature.assert_not_called()
+
+    @mock.patch('%s.import_batch' % model)
+    @mock.patch('%s.ConnectorSession' % model)
+    def test_check_structure_unchanged(self, session, batch):
+        """ It should extend the TTL if the metadata did not change """
+        self._sync_metadata_ago(3600)
+        sync_date = self.backend.metadata_sync_date
+        self.backend.check_carepoint_structure()
+        batch.assert_not_called()
+        self.assertGreater(self.backend.metadata_sync_date, sync_date)
+
+    @mock.patch('%s.import_batch' % model)
+    @mock.patch('%s.ConnectorSession' % model)
+    def test_check_structure_changed(self, session, batch):
+        """ It should synchronize metadata if they changed """
+        self._sync_metadata_ago(3600)
+        self.get_signature.return_value = 'changed'
+        self.backend.check_carepoint_structure()
+        batch.assert_called_once_with(
+            session(), 'carepoint.carepoint.store', self.backend.id,
+        )
+        self.assertEqual('changed', self.backend.metadata_signature)
+
     @mock.patch('%s.import_batch' % model)
     @mock.patch('%s.ConnectorSession' % model)
     def test_import_all_checks_stucture(self, session, batch):
@@ -64,212 +133,189 @@ class TestCarepointBackend(SetUpCarepointBase):
         """ It should call delayed batch import for model """
         expect = 'model'
         self.backend._import_all(expect)
+        import_batch = self.env['carepoint.import.batch'].search([
+            ('backend_id', '=', self.backend.id),
+            ('model', '=', expect),
+        ])
+        self.assertEqual(1, len(import_batch))
         batch.delay.assert_called_once_with(
-            session(), expect, self.backend.id,
+            session(), expect, self.backend.id, batch_id=import_batch.id,
+        )
+
+    def _patch_slice(self, count=1):
+        """ Patch the slicing of the import ranges to a single window """
+        return mock.patch.object(
+            type(self.Model), '_slice_import_range',
+            side_effect=lambda model, field, date_from, date_to: [
+                (date_from, date_to, count),
+            ],
         )
 
     @mock.patch('%s.import_batch' % model)
     @mock.patch('%s.ConnectorSession' % model)
     def test_import_from_date_checks_stucture(self, session, batch):
         """ It should check internal structure on all backends """
-        self.backend._import_from_date('model', 'import_patients_from_date')
+        with self._patch_slice():
+            self.backend._import_from_date('model')
         batch.assert_called_once_with(
             session(), 'carepoint.carepoint.store', self.backend.id,
         )
 
+    def _get_watermark(self, chg_date_field='chg'):
+        return self.env['carepoint.sync.watermark']._get_watermark(
+            self.backend, 'model', chg_date_field,
+        )
+
     @mock.patch('%s.datetime' % model)
     @mock.patch('%s.import_batch' % model)
     @mock.patch('%s.ConnectorSession' % model)
-    def test_import_from_date_calls_import(self, session, batch, dt_mk):
-        """ It should call delayed batch import for model """
-        expect = 'model', 'import_patients_from_date', 'chg'
+    def test_import_from_date_calls_import(self, session, _batch, dt_mk):
+        """ It should call delayed batch import for each window """
         dt_mk.utcnow.return_value = datetime.utcnow()
-        expect_date = dt_mk.utcnow() - timedelta(days=5)
-        self.backend.import_patients_from_date = expect_date
-        expect_date = self.backend.import_patients_from_date
-        self.backend._import_from_date(*expect)
-        utc_now = pytz.timezone('UTC').localize(dt_mk.utcnow()).astimezone(
-            pytz.timezone(self.backend.server_tz)
-        )
-        batch.delay.assert_called_once_with(
-            session(), expect[0], self.backend.id,
-            filters={
-                expect[2]: {
-                    '>=': fields.Datetime.from_string(
-                        expect_date,
-                    ),
-                    '<=': utc_now.replace(tzinfo=None),
+        watermark = self._get_watermark()
+        watermark.low_mark = dt_mk.utcnow() - timedelta(days=5)
+        expect_date = watermark.low_mark
+        with mock.patch('%s.import_batch' % window_model) as batch:
+            batch.delay.return_value = 'uuid'
+            with self._patch_slice():
+                self.backend._import_from_date('model', 'chg')
+            utc_now = pytz.timezone('UTC').localize(
+                dt_mk.utcnow()
+            ).astimezone(pytz.timezone(self.backend.server_tz))
+            window = watermark.window_ids
+            batch.delay.assert_called_once_with(
+                session(), 'model', self.backend.id,
+                filters={
+                    'chg': {
+                        '>=': fields.Datetime.from_string(expect_date),
+                        '<=': fields.Datetime.from_string(
+                            fields.Datetime.to_string(utc_now),
+                        ),
+                    },
                 },
-            }
-        )
+                window_id=window.id,
+                batch_id=window._get_batch().id,
+            )
+            self.assertEqual('uuid', window.job_uuid)
+
+    @mock.patch('%s.datetime' % model)
+    @mock.patch('%s.import_batch' % model)
+    @mock.patch('%s.ConnectorSession' % model)
+    def test_import_from_date_keeps_date(self, session, batch, dt_mk):
+        """ It should not advance the mark before the window is imported """
+        dt_mk.utcnow.return_value = datetime.utcnow()
+        watermark = self._get_watermark()
+        watermark.low_mark = dt_mk.utcnow()
+        expect = watermark.low_mark
+        with mock.patch('%s.import_batch' % window_model):
+            with self._patch_slice():
+                self.backend._import_from_date('model', 'chg')
+        self.assertEqual(expect, watermark.low_mark)
+        self.assertEqual(1, watermark.pending_window_count)
 
     @mock.patch('%s.datetime' % model)
     @mock.patch('%s.import_batch' % model)
     @mock.patch('%s.ConnectorSession' % model)
     def test_import_from_date_writes_new_date(self, session, batch, dt_mk):
-        """ It should call delayed batch import for model """
+        """ It should advance the mark when there is nothing to import """
         dt_mk.utcnow.return_value = datetime.utcnow()
-        expect_date = dt_mk.utcnow() - timedelta(days=5)
-        self.backend.import_patients_from_date = expect_date
-        self.backend._import_from_date(
-            'model', 'import_patients_from_date', 'chg'
-        )
+        watermark = self._get_watermark()
+        watermark.low_mark = dt_mk.utcnow() - timedelta(days=5)
+        with mock.patch('%s.import_batch' % window_model) as window_batch:
+            with self._patch_slice(0):
+                self.backend._import_from_date('model', 'chg')
+            window_batch.delay.assert_not_called()
         utc_now = pytz.timezone('UTC').localize(dt_mk.utcnow())
         local_now = utc_now.astimezone(
             pytz.timezone(self.backend.default_tz)
         )
         expect = local_now - timedelta(seconds=IMPORT_DELTA_BUFFER)
         self.assertEqual(
-            fields.Datetime.to_string(expect),
-            self.backend.import_patients_from_date,
+            fields.Datetime.to_string(expect), watermark.low_mark,
         )
+        self.assertFalse(watermark.window_ids)
 
-    def test_cron_import_medical_prescription_search(self):
-        """ It should search for all backends """
-        with mock.patch.object(self.backend, 'search') as mk:
-            self.backend.cron_import_medical_prescription()
-            mk.assert_called_once_with([])
-
-    def test_cron_import_medical_prescription_import(self):
-        """ It should call import on found backends """
-        with mock.patch.object(self.backend, 'search') as mk:
-            self.backend.cron_import_medical_prescription()
-            mk().import_medical_prescription.assert_called_once_with()
-
-    def test_cron_import_medical_patient_search(self):
-        """ It should search for all backends """
-        with mock.patch.object(self.backend, 'search') as mk:
-            self.backend.cron_import_medical_patient()
-            mk.assert_called_once_with([])
-
-    def test_cron_import_medical_patient_import(self):
-        """ It should call import on found backends """
-        with mock.patch.object(self.backend, 'search') as mk:
-            self.backend.cron_import_medical_patient()
-            mk().import_medical_patient.assert_called_once_with()
-
-    def test_cron_import_medical_physician_search(self):
-        """ It should search for all backends """
-        with mock.patch.object(self.backend, 'search') as mk:
-            self.backend.cron_import_medical_physician()
-            mk.assert_called_once_with([])
-
-    def test_cron_import_medical_physician_import(self):
-        """ It should call import on found backends """
-        with mock.patch.object(self.backend, 'search') as mk:
-            self.backend.cron_import_medical_physician()
-            mk().import_medical_physician.assert_called_once_with()
-
-    def test_cron_import_address_search(self):
-        """ It should search for all backends """
-        with mock.patch.object(self.backend, 'search') as mk:
-            self.backend.cron_import_address()
-            mk.assert_called_once_with([])
-
-    def test_cron_import_address_import(self):
-        """ It should call import on found backends """
-        with mock.patch.object(self.backend, 'search') as mk:
-            self.backend.cron_import_address()
-            mk().import_address.assert_called_once_with()
+    @mock.patch('%s.import_batch' % model)
+    @mock.patch('%s.ConnectorSession' % model)
+    def test_import_from_date_creates_watermark(self, session, batch):
+        """ It should create the watermark of a new model """
+        with self._patch_slice(0):
+            self.backend._import_from_date('model', 'chg')
+        self.assertTrue(self._get_watermark().low_mark)
+        self.assertEqual(1, len(self.backend.watermark_ids))
+
+    def test_import_watermarks(self):
+        """ It should import the models of all of the watermarks """
+        self._get_watermark()
+        with mock.patch.object(type(self.Model), '_import_from_date') as mk:
+            self.backend.import_watermarks()
+            mk.assert_any_call('model', 'chg')
+
+    def test_import_watermarks_default_models(self):
+        """ It should create and import the watermarks of default models """
+        with mock.patch.object(type(self.Model), '_import_from_date') as mk:
+            self.backend.import_watermarks()
+            for model, chg_date_field in self.Model._watermark_models:
+                mk.assert_any_call(model, chg_date_field)
+        self.assertEqual(
+            len(self.Model._watermark_models),
+            len(self.backend.watermark_ids),
+        )
 
-    def test_cron_import_sale_order_search(self):
+    @mock.patch('%s.get_environment' % model)
+    def test_slice_import_range(self, get_env):
+        """ It should split the range in windows of the maximum size """
+        start = datetime(2016, 1, 1)
+        dates = [start + timedelta(days=i) for i in range(5)]
+
+        def get_date_range(field, **filters):
+            domain = filters[field]
+            found = [d for d in dates
+                     if domain.get('>=', d) <= d <= domain['<=']]
+            return len(found), found and min(found), found and max(found)
+
+        adapter = get_env().get_connector_unit()
+        adapter.get_date_range.side_effect = get_date_range
+        self.backend.import_window_size = 2
+        res = self.backend._slice_import_range(
+            'model', 'chg', None, start + timedelta(days=10),
+        )
+        self.assertIs(None, res[0][0])
+        self.assertEqual(start + timedelta(days=10), res[-1][1])
+        for (_from, to, count), (next_from, _to, _count) in zip(res, res[1:]):
+            self.assertEqual(to, next_from)
+        self.assertTrue(all(c <= 2 for _f, _t, c in res))
+        self.assertGreaterEqual(sum(c for _f, _t, c in res), len(dates))
+
+    def test_cron_import_watermarks_search(self):
         """ It should search for all backends """
         with mock.patch.object(self.backend, 'search') as mk:
-            self.backend.cron_import_sale_order()
+            self.backend.cron_import_watermarks()
             mk.assert_called_once_with([])
 
-    def test_cron_import_sale_order_import(self):
-        """ It should call import on found backends """
+    def test_cron_import_watermarks_import(self):
+        """ It should import the watermarks of the found backends """
         with mock.patch.object(self.backend, 'search') as mk:
-            self.backend.cron_import_sale_order()
-            mk().import_sale_order.assert_called_once_with()
-
-    def test_cron_import_phone_import(self):
-        """ It should call import on found backends """
-        with mock.patch.object(self.backend, 'search') as mk:
-            self.backend.cron_import_phone()
-            mk().import_phone.assert_called_once_with()
-
-    def test_import_carepoint_item(self):
-        """ It should import proper model on date field """
-        with mock.patch.object(self.backend, '_import_from_date') as mk:
-            self.backend.import_carepoint_item()
-            mk.assert_called_once_with(
-                'carepoint.carepoint.item',
-                'import_items_from_date',
-            )
-
-    def test_import_medical_patient(self):
-        """ It should import proper model on date field """
-        with mock.patch.object(self.backend, '_import_from_date') as mk:
-            self.backend.import_medical_patient()
-            mk.assert_called_once_with(
-                'carepoint.medical.patient',
-                'import_patients_from_date',
-            )
-
-    def test_import_medical_physician(self):
-        """ It should import proper model on date field """
-        with mock.patch.object(self.backend, '_import_from_date') as mk:
-            self.backend.import_medical_physician()
-            mk.assert_called_once_with(
-                'carepoint.medical.physician',
-                'import_physicians_from_date',
-            )
-
-    def test_import_addresses(self):
-        """ It should import proper model on date field """
-        with mock.patch.object(self.backend, '_import_from_date') as mk:
-            self.backend.import_address()
-            mk.assert_called_once_with(
-                'carepoint.carepoint.address',
-                'import_addresses_from_date',
-            )
-
-    def test_import_medical_prescription(self):
-        """ It should import proper model on date field """
-        with mock.patch.object(self.backend, '_import_from_date') as mk:
-            self.backend.import_medical_prescription()
-            mk.assert_called_once_with(
-                'carepoint.rx.ord.ln',
-                'import_prescriptions_from_date',
-            )
-
-    def test_import_sale_order(self):
-        """ It should import proper model on date field """
-        with mock.patch.object(self.backend, '_import_from_date') as mk:
-            self.backend.import_sale_order()
-            mk.assert_called_once_with(
-                'carepoint.sale.order.line',
-                'import_sales_from_date',
-            )
-
-    def test_import_stock_picking(self):
-        """ It should import proper model on date field """
-        with mock.patch.object(self.backend, '_import_from_date') as mk:
-            self.backend.import_stock_picking()
-            mk.assert_called_once_with(
-                'carepoint.stock.picking',
-                'import_pickings_from_date',
-            )
-
-    def test_import_account_invoice(self):
-        """ It should import proper model on date field """
-        with mock.patch.object(self.backend, '_import_from_date') as mk:
-            self.backend.import_account_invoice()
-            mk.assert_called_once_with(
-                'carepoint.account.invoice.line',
-                'import_invoices_from_date',
-                'primary_pay_date',
-            )
-
-    def test_import_phone(self):
-        """ It should import proper model on date field """
-        with mock.patch.object(self.backend, '_import_from_date') as mk:
-            self.backend.import_phone()
+            self.backend.cron_import_watermarks()
+            mk().import_watermarks.assert_called_once_with()
+
+    def test_import_updated(self):
+        """ It should import the model of the context on date field """
+        with mock.patch.object(type(self.Model), '_import_from_date') as mk:
+            self.backend.with_context(
+                carepoint_import_model='carepoint.carepoint.item',
+            ).import_updated()
+            mk.assert_called_once_with('carepoint.carepoint.item', 'chg_date')
+
+    def test_import_updated_chg_date_field(self):
+        """ It should import on the date field of the context """
+        with mock.patch.object(type(self.Model), '_import_from_date') as mk:
+            self.backend.with_context(
+                carepoint_import_model='carepoint.account.invoice.line',
+                carepoint_chg_date_field='primary_pay_date',
+            ).import_updated()
             mk.assert_called_once_with(
-                'carepoint.carepoint.phone',
-                'import_phones_from_date',
+                'carepoint.account.invoice.line', 'primary_pay_date',
             )
 
     def test_import_fdb(self):
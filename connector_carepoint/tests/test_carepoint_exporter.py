@@ -9,6 +9,9 @@ from contextlib import contextmanager
 from odoo import _
 
 from odoo.addons.connector_carepoint.unit import export_synchronizer
+from odoo.addons.connector_carepoint.unit.backend_adapter import (
+    in_carepoint_transaction,
+)
 
 from .common import SetUpCarepointBase
 
@@ -388,7 +391,9 @@ class TestCarepointExporter(SetUpCarepointBase):
 
     def test_run_update_data(self):
         """ It should identify data to update on pre-existing binds """
-        exporter = self._new_exporter(self.carepoint_id, True, True)
+        exporter = self._new_exporter(
+            self.carepoint_id, mock.MagicMock(export_hash=False), True,
+        )
         expect = ['test1', 'test2']
         with mock_base_exporter(exporter, ['_has_to_skip',
                                            '_lock',
@@ -405,7 +410,9 @@ class TestCarepointExporter(SetUpCarepointBase):
 
     def test_run_update_no_record(self):
         """ It should identify data to update on pre-existing binds """
-        exporter = self._new_exporter(self.carepoint_id, True, True)
+        exporter = self._new_exporter(
+            self.carepoint_id, mock.MagicMock(export_hash=False), True,
+        )
         with mock_base_exporter(exporter, ['_has_to_skip',
                                            '_lock',
                                            '_map_data',
@@ -420,7 +427,9 @@ class TestCarepointExporter(SetUpCarepointBase):
 
     def test_run_update_no_record(self):
         """ It should identify data to update on pre-existing binds """
-        exporter = self._new_exporter(self.carepoint_id, True, True)
+        exporter = self._new_exporter(
+            self.carepoint_id, mock.MagicMock(export_hash=False), True,
+        )
         with mock_base_exporter(exporter, ['_has_to_skip',
                                            '_lock',
                                            '_map_data',
@@ -483,3 +492,401 @@ class TestCarepointExporter(SetUpCarepointBase):
             exporter._create.assert_called_once_with(
                 exporter._create_data()
             )
+
+    def test_get_export_hash(self):
+        """ It should hash all of the mapped values regardless of order """
+        exporter = self._new_exporter()
+        res = exporter._get_export_hash({'a': 1, 'b': 2})
+        self.assertEqual(res, exporter._get_export_hash({'b': 2, 'a': 1}))
+        self.assertNotEqual(res, exporter._get_export_hash({'b': 2, 'a': 3}))
+
+    def test_run_unchanged(self):
+        """ It should skip dependencies and update if values unchanged """
+        binding_record = mock.MagicMock(export_hash='hash')
+        exporter = self._new_exporter(self.carepoint_id, binding_record, True)
+        with mock_base_exporter(exporter, ['_has_to_skip',
+                                           '_export_dependencies',
+                                           '_lock',
+                                           '_map_data',
+                                           '_get_export_hash',
+                                           '_update',
+                                           ]):
+            exporter._has_to_skip.return_value = False
+            exporter._get_export_hash.return_value = 'hash'
+            exporter._run()
+            exporter._export_dependencies.assert_not_called()
+            exporter._update.assert_not_called()
+
+    def test_run_changed(self):
+        """ It should update and store the hash if values changed """
+        binding_record = mock.MagicMock(export_hash='hash')
+        exporter = self._new_exporter(self.carepoint_id, binding_record, True)
+        with mock_base_exporter(exporter, ['_has_to_skip',
+                                           '_export_dependencies',
+                                           '_lock',
+                                           '_map_data',
+                                           '_get_export_hash',
+                                           '_update',
+                                           '_set_export_hash',
+                                           ]):
+            exporter._has_to_skip.return_value = False
+            exporter._get_export_hash.return_value = 'new'
+            exporter._run()
+            exporter._export_dependencies.assert_called_once_with()
+            self.assertEqual(1, exporter._update.call_count)
+            exporter._set_export_hash.assert_called_once_with('new')
+
+    def test_run_changed_maps_once(self):
+        """ It should export the values mapped for the hash """
+        binding_record = mock.MagicMock(export_hash='hash')
+        exporter = self._new_exporter(self.carepoint_id, binding_record, True)
+        with mock_base_exporter(exporter, ['_has_to_skip',
+                                           '_export_dependencies',
+                                           '_lock',
+                                           '_map_data',
+                                           '_update',
+                                           '_set_export_hash',
+                                           ]):
+            exporter._has_to_skip.return_value = False
+            record = {'col': 1}
+            exporter._map_data().values.return_value = record
+            exporter._map_data.reset_mock()
+            exporter._run()
+            self.assertEqual(1, exporter._map_data.call_count)
+            self.assertEqual(1, exporter._map_data().values.call_count)
+            exporter._update.assert_called_once_with(record)
+            exporter._set_export_hash.assert_called_once_with(
+                exporter._get_export_hash(record),
+            )
+
+    def test_run_partial_clears_hash(self):
+        """ It should clear the hash after exporting some fields only """
+        binding_record = mock.MagicMock(export_hash=False)
+        exporter = self._new_exporter(self.carepoint_id, binding_record, True)
+        with mock_base_exporter(exporter, ['_has_to_skip',
+                                           '_lock',
+                                           '_map_data',
+                                           '_update',
+                                           '_set_export_hash',
+                                           ]):
+            exporter._has_to_skip.return_value = False
+            exporter._run(['name'])
+            exporter._set_export_hash.assert_called_once_with(False)
+
+    def test_set_export_hash(self):
+        """ It should write the hash on the binding """
+        record = self._new_record()
+        exporter = self._new_exporter(binding_record=record)
+        exporter._set_export_hash('hash')
+        self.assertEqual('hash', record.export_hash)
+
+    def test_run_batch(self):
+        """ It should export the records one by one """
+        exporter = self._new_exporter()
+        with mock.patch.object(exporter, 'run') as run:
+            exporter.run_batch([1, 2], fields=['name'])
+            run.assert_has_calls([
+                mock.call(1, fields=['name']),
+                mock.call(2, fields=['name']),
+            ])
+
+    def test_run_batch_prefetch(self):
+        """ It should prefetch the lookups of the records of the batch """
+        exporter = self._new_exporter()
+        with mock.patch.object(exporter.connector_env, 'model') as model_obj:
+            with mock_base_exporter(exporter, ['run', '_prefetch_batch']):
+                exporter.run_batch([1, 2])
+                model_obj.browse.assert_called_once_with([1, 2])
+                exporter._prefetch_batch.assert_called_once_with(
+                    model_obj.browse(),
+                )
+
+    def _run_batch_create(self, bindings, carepoint_ids=None,
+                          batch_write=False):
+        """ Run a batch export creating the new records at once """
+        exporter = self._new_exporter()
+        exporter._batch_create = True
+        exporter._batch_write = batch_write
+
+        def start_export(binding_id):
+            exporter.carepoint_id = next(
+                b.carepoint_id for b in bindings if b.id == binding_id
+            )
+
+        with mock.patch.object(exporter.connector_env, 'model') as model_obj:
+            model_obj.browse.return_value = bindings
+            with mock_base_exporter(exporter, ['run',
+                                               '_start_export',
+                                               '_prepare_export',
+                                               '_get_export_hash',
+                                               '_set_export_hash',
+                                               '_create_many',
+                                               '_write_many',
+                                               '_commit',
+                                               ]):
+                exporter._start_export.side_effect = start_export
+                exporter._prepare_export.return_value = ('record', None)
+                exporter._create_many.return_value = carepoint_ids or []
+                exporter.run_batch([1, 2], fields=['name'])
+                return exporter
+
+    def test_run_batch_create_existing(self):
+        """ It should export the records on Carepoint one by one """
+        binding = mock.MagicMock()
+        exporter = self._run_batch_create([binding])
+        exporter.run.assert_called_once_with(binding.id, fields=['name'])
+        exporter._create_many.assert_not_called()
+        exporter._write_many.assert_not_called()
+
+    def test_run_batch_create_many(self):
+        """ It should create the new records at once """
+        bindings = [mock.MagicMock(carepoint_id=False),
+                    mock.MagicMock(carepoint_id=False),
+                    ]
+        exporter = self._run_batch_create(bindings)
+        exporter.run.assert_not_called()
+        exporter._create_many.assert_called_once_with(['record', 'record'])
+
+    def test_run_batch_create_starts_export(self):
+        """ It should load each new record before preparing it """
+        bindings = [mock.MagicMock(carepoint_id=False)]
+        exporter = self._run_batch_create(bindings, ['3'])
+        exporter._start_export.assert_called_once_with(bindings[0].id)
+        exporter._prepare_export.assert_called_once_with()
+
+    def test_run_batch_create_skipped(self):
+        """ It should not create the records with nothing to export """
+        exporter = self._new_exporter()
+        exporter._batch_create = True
+        with mock.patch.object(exporter.connector_env, 'model') as model_obj:
+            model_obj.browse.return_value = [
+                mock.MagicMock(carepoint_id=False),
+            ]
+            with mock_base_exporter(exporter, ['_prepare_export',
+                                               '_create_many',
+                                               ]):
+                exporter._prepare_export.return_value = (None, None)
+                exporter.run_batch([1])
+                exporter._create_many.assert_not_called()
+
+    def test_run_batch_create_binds(self):
+        """ It should bind the new records to their Carepoint IDs """
+        bindings = [mock.MagicMock(carepoint_id=False),
+                    mock.MagicMock(carepoint_id=False),
+                    ]
+        exporter = self._run_batch_create(bindings, ['3', '4'])
+        exporter.binder_for().bind.assert_has_calls([
+            mock.call('3', bindings[0].id),
+            mock.call('4', bindings[1].id),
+        ])
+
+    def test_run_batch_create_hash(self):
+        """ It should store the hash of the values of each created record """
+        bindings = [mock.MagicMock(carepoint_id=False)]
+        exporter = self._run_batch_create(bindings, ['3'])
+        exporter._get_export_hash.assert_called_once_with('record')
+        exporter._set_export_hash.assert_called_once_with(
+            exporter._get_export_hash(),
+        )
+
+    def test_run_batch_write_many(self):
+        """ It should update the records on Carepoint at once """
+        bindings = [mock.MagicMock(carepoint_id='3'),
+                    mock.MagicMock(carepoint_id='4'),
+                    ]
+        exporter = self._run_batch_create(bindings, batch_write=True)
+        exporter.run.assert_not_called()
+        exporter._prepare_export.assert_has_calls([
+            mock.call(['name']), mock.call(['name']),
+        ])
+        exporter._write_many.assert_called_once_with({
+            '3': 'record', '4': 'record',
+        })
+
+    def test_run_batch_write_binds(self):
+        """ It should bind the updated records """
+        bindings = [mock.MagicMock(carepoint_id='3')]
+        exporter = self._run_batch_create(bindings, batch_write=True)
+        exporter.binder_for().bind.assert_called_once_with(
+            '3', bindings[0].id,
+        )
+
+    def test_run_batch_write_partial_clears_hash(self):
+        """ It should clear the hash of the records partially updated """
+        bindings = [mock.MagicMock(carepoint_id='3')]
+        exporter = self._run_batch_create(bindings, batch_write=True)
+        exporter._get_export_hash.assert_not_called()
+        exporter._set_export_hash.assert_called_once_with(False)
+
+    def test_run_batch_write_missing(self):
+        """ It should create the records missing on Carepoint """
+        bindings = [mock.MagicMock(carepoint_id='3')]
+        exporter = self._new_exporter()
+        exporter._batch_write = True
+        with mock.patch.object(exporter.connector_env, 'model') as model_obj:
+            model_obj.browse.return_value = bindings
+            with mock_base_exporter(exporter, ['_start_export',
+                                               '_prepare_export',
+                                               '_get_export_hash',
+                                               '_set_export_hash',
+                                               '_create_many',
+                                               '_write_many',
+                                               '_commit',
+                                               ]):
+                exporter._prepare_export.return_value = ('record', None)
+                exporter._create_many.return_value = ['5']
+                exporter.run_batch([1], fields=['name'])
+                exporter._create_many.assert_called_once_with(['record'])
+                exporter._write_many.assert_not_called()
+
+    def test_write_many_validates(self):
+        """ It should validate the data of every record """
+        exporter = self._new_exporter()
+        with mock_base_exporter(exporter, ['_validate_update_data']):
+            exporter._write_many({'3': 'data1', '4': 'data2'})
+            exporter._validate_update_data.assert_has_calls([
+                mock.call('data1'), mock.call('data2'),
+            ], any_order=True)
+
+    def test_write_many_adapter(self):
+        """ It should update the records with the adapter write_many """
+        exporter = self._new_exporter()
+        with mock_base_exporter(exporter) as mk:
+            exporter._write_many({'3': 'data1'})
+            mk['unit_for']().write_many.assert_called_once_with(
+                {'3': 'data1'},
+            )
+
+    def test_create_many(self):
+        """ It should create the records one by one by default """
+        exporter = self._new_exporter()
+        with mock.patch.object(exporter, '_create') as create:
+            create.side_effect = ['3', '4']
+            res = exporter._create_many(['data1', 'data2'])
+            self.assertEqual(['3', '4'], res)
+
+    def test_export_batch_runs(self):
+        """ It should export every binding in a CarePoint transaction """
+        record = self._new_record()
+        with mock.patch('%s.get_environment' % model) as env:
+            exporter = env().get_connector_unit()
+            exporter.run_batch.side_effect = lambda *args, **kwargs: (
+                self.assertTrue(in_carepoint_transaction())
+            )
+            with mock.patch.object(self.session, 'commit'):
+                export_synchronizer.export_batch(
+                    self.session, self.model, [record.id], fields=['name'],
+                )
+            exporter.run_batch.assert_called_once_with(
+                [record.id], fields=['name'],
+            )
+        self.assertFalse(in_carepoint_transaction())
+
+    def test_export_batch_commits_odoo_first(self):
+        """ It should commit Odoo before committing CarePoint """
+        record = self._new_record()
+        with mock.patch('%s.get_environment' % model):
+            with mock.patch('%s.carepoint_transaction' % model) as mk:
+                with mock.patch.object(self.session, 'commit') as commit:
+                    export_synchronizer.export_batch(
+                        self.session, self.model, [record.id],
+                    )
+                    commit.assert_not_called()
+                    mk.call_args[1]['before_commit']()
+                    commit.assert_called_once_with()
+
+    def test_export_batch_failure(self):
+        """ It should delay every binding separately on failure """
+        record = self._new_record()
+        with mock.patch('%s.get_environment' % model) as env:
+            env().get_connector_unit().run_batch.side_effect = (
+                EndTestException
+            )
+            with mock.patch('%s.delay_export_coalesced' % model) as mk:
+                with mock.patch.object(self.session, 'commit') as commit:
+                    export_synchronizer.export_batch(
+                        self.session, self.model, [record.id],
+                    )
+                    commit.assert_not_called()
+                mk.assert_called_once_with(
+                    self.session, self.model, record.id, fields=None,
+                )
+
+    def _export_batch_carepoint_failure(self, record, exported):
+        """ Run a batch export of the record whose CarePoint commit fails
+        :param exported: ``(binding, created)`` tuples of the bindings
+            exported in the batch
+        """
+
+        @contextmanager
+        def transaction(before_commit):
+            yield
+            before_commit()
+            raise EndTestException()
+
+        def run_batch(binding_ids, fields=None):
+            for binding, created in exported:
+                binding.write({'carepoint_id': binding.id,
+                               'export_hash': 'hash',
+                               })
+                export_synchronizer._add_batch_export(
+                    self.model, binding.id, created,
+                )
+
+        with mock.patch('%s.get_environment' % model) as env:
+            env().get_connector_unit().run_batch.side_effect = run_batch
+            with mock.patch('%s.carepoint_transaction' % model, transaction):
+                with mock.patch('%s.delay_export_coalesced' % model) as mk:
+                    with mock.patch.object(self.session, 'commit'):
+                        export_synchronizer.export_batch(
+                            self.session, self.model, [record.id],
+                        )
+                    return mk
+
+    def test_export_batch_carepoint_failure_unbinds(self):
+        """ It should unbind the records created if CarePoint fails """
+        record = self._new_record()
+        mk = self._export_batch_carepoint_failure(record, [(record, True)])
+        self.assertFalse(record.carepoint_id)
+        self.assertFalse(record.export_hash)
+        mk.assert_called_once_with(
+            self.session, self.model, record.id, fields=None,
+        )
+
+    def test_export_batch_carepoint_failure_hash(self):
+        """ It should clear the hash of the records updated if it fails """
+        record = self._new_record()
+        self._export_batch_carepoint_failure(record, [(record, False)])
+        self.assertEqual(str(record.id), record.carepoint_id)
+        self.assertFalse(record.export_hash)
+
+    def test_export_batch_carepoint_failure_dependency(self):
+        """ It should export again the dependencies exported in the batch """
+        record = self._new_record()
+        dependency = self._new_record()
+        mk = self._export_batch_carepoint_failure(
+            record, [(dependency, False), (record, True)],
+        )
+        self.assertFalse(dependency.export_hash)
+        mk.assert_has_calls([
+            mock.call(self.session, self.model, record.id, fields=None),
+            mock.call(self.session, self.model, dependency.id),
+        ])
+
+    def test_run_adds_batch_export(self):
+        """ It should record the exported binding in the current batch """
+        exporter = self._new_exporter()
+        record = self._new_record()
+        export_synchronizer._batch.exported = []
+        try:
+            with mock_base_exporter(exporter, ['_run', '_should_import',
+                                               '_commit',
+                                               ]):
+                exporter._should_import.return_value = False
+                exporter.run(record.id)
+            self.assertEqual(
+                [(self.model, record.id, True)],
+                export_synchronizer._batch.exported,
+            )
+        finally:
+            export_synchronizer._batch.exported = None
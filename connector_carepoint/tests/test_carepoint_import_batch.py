@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# Copyright 2015-2016 LasLabs Inc.
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from .common import SetUpCarepointBase
+
+
+class TestCarepointImportBatch(SetUpCarepointBase):
+
+    def setUp(self):
+        super(TestCarepointImportBatch, self).setUp()
+        self.Model = self.env['carepoint.import.batch']
+        self.batch = self.Model._new_batch(self.backend, 'model')
+
+    def test_new_batch_removes_done(self):
+        """ It should remove the batches done for the same import """
+        self.batch._set_done()
+        res = self.Model._new_batch(self.backend, 'model')
+        self.assertFalse(self.batch.exists())
+        self.assertEqual('pending', res.state)
+
+    def test_new_batch_keeps_running(self):
+        """ It should keep the batches that are not done """
+        self.Model._new_batch(self.backend, 'model')
+        self.assertTrue(self.batch.exists())
+
+    def test_get_cursor_empty(self):
+        """ It should return None when nothing was processed """
+        self.assertIs(None, self.batch._get_cursor())
+
+    def test_save_progress(self):
+        """ It should save the cursor and add up the records processed """
+        self.batch._save_progress(10, 10)
+        self.batch._save_progress(u'pk', 5)
+        self.assertEqual(u'pk', self.batch._get_cursor())
+        self.assertEqual(15, self.batch.processed_count)
+
+    def test_start_resumed(self):
+        """ It should not restart a batch that is already started """
+        self.batch._start(10)
+        self.batch._start(20)
+        self.assertEqual(10, self.batch.record_count)
+
+    def test_compute_progress(self):
+        """ It should compute the percentage and rate of the records """
+        self.batch.write({
+            'record_count': 200,
+            'processed_count': 50,
+            'date_start': '2016-01-01 00:00:00',
+            'date_progress': '2016-01-01 00:00:10',
+        })
+        self.assertEqual(25, self.batch.progress)
+        self.assertEqual(5, self.batch.rows_per_second)
+
+    def test_compute_progress_done(self):
+        """ It should be complete once done """
+        self.batch._set_done()
+        self.assertEqual(100, self.batch.progress)
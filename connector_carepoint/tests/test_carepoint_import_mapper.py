@@ -2,6 +2,8 @@
 # Copyright 2015-2016 LasLabs Inc.
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+import mock
+
 from odoo.addons.connector_carepoint.unit import mapper
 
 from .common import SetUpCarepointBase
@@ -29,3 +31,58 @@ class TestCarepointImporterMapper(SetUpCarepointBase):
         res = self.importer.company_id(True)
         expect = {'company_id': self.importer.backend_record.company_id.id}
         self.assertDictEqual(expect, res)
+
+    def test_prefetch_decorator(self):
+        """ It should mark the method as a prefetch hook """
+        func = mapper.prefetch(lambda self, records: None)
+        self.assertTrue(func.is_prefetch)
+
+    def test_prefetch_calls_hooks(self):
+        """ It should call the prefetch hooks with the records """
+        records = [{'col': 1}, {'col': 2}]
+        with mock.patch.object(self.importer, '_prefetch_methods') as mk:
+            hook = mock.MagicMock()
+            mk.return_value = [hook]
+            self.importer.prefetch(iter(records))
+            hook.assert_called_once_with(records)
+
+    def test_prefetch_resets(self):
+        """ It should reset the values prefetched for a previous batch """
+        self.importer.prefetched['key'] = True
+        self.importer.prefetch([])
+        self.assertDictEqual({}, self.importer.prefetched)
+
+    def test_reads_decorator(self):
+        """ It should store the declared source fields on the method """
+        func = mapper.reads('col1', 'col2')(lambda self, record: None)
+        self.assertEqual(('col1', 'col2'), func._cp_reads)
+
+    def test_modifier_source(self):
+        """ It should store the source field on the modifiers """
+        self.assertEqual('col', mapper.trim('col')._cp_source)
+        self.assertEqual('col', mapper.add_to('col', 1)._cp_source)
+
+    def test_source_fields(self):
+        """ It should gather direct and declared mapping sources """
+        self.importer.direct = [
+            ('col1', 'field1'),
+            (mapper.trim('col2'), 'field2'),
+        ]
+        self.assertEqual({'col1', 'col2'}, self.importer.source_fields())
+
+    def test_source_fields_unknown_modifier(self):
+        """ It should return None for modifiers without a known source """
+        self.importer.direct = [(lambda *args: None, 'field1')]
+        self.assertIs(None, self.importer.source_fields())
+
+    def test_source_fields_undeclared_mapping(self):
+        """ It should return None for mappings without declared sources """
+        methods = dict(self.importer._map_methods, undeclared=None)
+        self.importer.undeclared = lambda record: None
+        with mock.patch.object(self.importer, '_map_methods', methods):
+            self.assertIs(None, self.importer.source_fields())
+
+    def test_source_fields_children(self):
+        """ It should return None for mappers with children """
+        self.importer.children = [('lines', 'line_ids', 'model')]
+        self.assertIs(None, self.importer.source_fields())
@@ -3,11 +3,13 @@
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
 import mock
+import threading
 from contextlib import contextmanager
 
 from odoo import fields, _
 
 from odoo.addons.connector_carepoint.unit import import_synchronizer
+from odoo.addons.connector_carepoint.unit.mapper import CarepointImportMapper
 
 from .common import SetUpCarepointBase
 
@@ -109,6 +111,66 @@ class TestCarepointImporter(SetUpCarepointBase):
             res = importer._get_carepoint_data()
             self.assertEqual(mk.read(), res)
 
+    def test_get_read_attributes_no_mapper(self):
+        """ It should read all fields without a Carepoint mapper """
+        importer = self._new_importer(self.carepoint_id)
+        self.assertIs(None, importer._get_read_attributes())
+
+    def test_get_read_attributes_undeclared(self):
+        """ It should read all fields if the mapper sources are unknown """
+        importer = self._new_importer(self.carepoint_id)
+        importer._base_mapper = CarepointImportMapper
+        importer._mapper = mock.MagicMock()
+        importer._mapper.source_fields.return_value = None
+        self.assertIs(None, importer._get_read_attributes())
+
+    def test_get_read_attributes(self):
+        """ It should read the mapper sources, extras, pks and chg_date """
+        importer = self._new_importer(self.carepoint_id)
+        importer._base_mapper = CarepointImportMapper
+        importer._extra_columns = ['extra']
+        importer._mapper = mock.MagicMock()
+        importer._mapper.source_fields.return_value = {'col'}
+        with self.mock_adapter(importer) as mk:
+            mk.get_pks.return_value = ('pk', )
+            mk.get_columns.return_value = (
+                'pk', 'col', 'other', 'extra', 'chg_date',
+            )
+            self.assertEqual(
+                ['pk', 'col', 'extra', 'chg_date'],
+                importer._get_read_attributes(),
+            )
+
+    def test_get_read_attributes_cached(self):
+        """ It should compute the attributes once per importer """
+        importer = self._new_importer(self.carepoint_id)
+        importer._base_mapper = CarepointImportMapper
+        importer._mapper = mock.MagicMock()
+        importer._mapper.source_fields.return_value = None
+        importer._get_read_attributes()
+        importer._get_read_attributes()
+        importer._mapper.source_fields.assert_called_once_with()
+
+    def test_get_carepoint_data_projected(self):
+        """ It should read the projected fields and return a dict """
+        importer = self._new_importer(self.carepoint_id)
+        importer._read_attributes = ['col']
+        with self.mock_adapter(importer) as mk:
+            res = importer._get_carepoint_data()
+            mk.read.assert_called_once_with(self.carepoint_id, ['col'])
+            mk.to_dict.assert_called_once_with(mk.read())
+            self.assertEqual(mk.to_dict(), res)
+
+    def test_read_records(self):
+        """ It should read the projected fields of the records at once """
+        importer = self._new_importer()
+        importer._read_attributes = ['col']
+        with self.mock_adapter(importer) as mk:
+            mk.read_many.return_value = {1: 'record1', '2,3': 'record2'}
+            res = importer.read_records([1, '2,3'])
+            mk.read_many.assert_called_once_with([1, '2,3'], ['col'])
+            self.assertEqual({1: 'record1', '2,3': 'record2'}, res)
+
     def test_is_current_assert_record(self):
         """ It should assert that a carepoint_record is set """
         with self.assertRaises(AssertionError):
@@ -221,6 +283,84 @@ class TestCarepointImporter(SetUpCarepointBase):
                 self.carepoint_id
             )
 
+    def test_import_dependency_prefetched(self):
+        """ It should run importer w/ the prefetched record """
+        record = {'expect': 1}
+        importer = self._new_importer()
+        importer._prefetched_records[(self.model, self.carepoint_id)] = record
+        with mock_base_importer(importer):
+            importer._import_dependency(
+                self.carepoint_id, self.model, always=True
+            )
+            importer.unit_for().run.assert_called_once_with(
+                self.carepoint_id, record=record,
+            )
+        self.assertEqual({}, importer._prefetched_records)
+
+    def test_prefetch_dependencies_disabled(self):
+        """ It should not prefetch anything when no workers """
+        importer = self._new_importer()
+        with mock_base_importer(importer):
+            importer._prefetch_dependencies([(1, 'model1'), (2, 'model2')])
+            importer.unit_for.assert_not_called()
+
+    def test_prefetch_dependencies_skips_existing(self):
+        """ It should not prefetch dependencies that are already bound """
+        importer = self._new_importer()
+        importer._dependency_workers = 2
+        with mock_base_importer(importer):
+            importer.binder_for().to_odoo.return_value = 1
+            importer._prefetch_dependencies([(1, 'model1'), (2, 'model2')])
+            importer.unit_for.assert_not_called()
+
+    def test_prefetch_dependencies_reads(self):
+        """ It should read dependencies in threads & keep the records """
+        importer = self._new_importer()
+        importer._dependency_workers = 2
+        dep1, dep2 = mock.MagicMock(), mock.MagicMock()
+        dep1.model._name, dep2.model._name = 'model1', 'model2'
+        with mock_base_importer(importer):
+            importer.binder_for().to_odoo.return_value = None
+            importer.unit_for.side_effect = [dep1, dep2]
+            importer._prefetch_dependencies([(1, 'model1'), (2, 'model2')])
+        self.assertEqual(
+            {('model1', '1'): dep1._get_carepoint_data(),
+             ('model2', '2'): dep2._get_carepoint_data(),
+             },
+            importer._prefetched_records,
+        )
+
+    def test_prefetch_dependencies_adapter_main_thread(self):
+        """ It should build the dependency adapters in the job thread """
+        importer = self._new_importer()
+        importer._dependency_workers = 2
+        dep1, dep2 = mock.MagicMock(), mock.MagicMock()
+        threads = []
+        for dep in (dep1, dep2):
+            dep.backend_adapter.get_pks.side_effect = lambda: threads.append(
+                threading.current_thread(),
+            )
+        with mock_base_importer(importer):
+            importer.binder_for().to_odoo.return_value = None
+            importer.unit_for.side_effect = [dep1, dep2]
+            importer._prefetch_dependencies([(1, 'model1'), (2, 'model2')])
+        self.assertEqual([threading.current_thread()] * 2, threads)
+
+    def test_prefetch_dependencies_read_error(self):
+        """ It should leave failed reads to the sequential import """
+        importer = self._new_importer()
+        importer._dependency_workers = 2
+        dep1, dep2 = mock.MagicMock(), mock.MagicMock()
+        dep1.model._name, dep2.model._name = 'model1', 'model2'
+        dep1._get_carepoint_data.side_effect = IndexError
+        with mock_base_importer(importer):
+            importer.binder_for().to_odoo.return_value = None
+            importer.unit_for.side_effect = [dep1, dep2]
+            importer._prefetch_dependencies([(1, 'model1'), (2, 'model2')])
+        self.assertEqual(
+            [('model2', '2')], list(importer._prefetched_records),
+        )
+
     def test_import_dependencies_none(self):
         """ It should return None on base class """
         res = self._new_importer()._import_dependencies()
@@ -242,6 +382,22 @@ class TestCarepointImporter(SetUpCarepointBase):
             res = importer._map_data()
             self.assertEqual(importer.mapper.map_record(), res)
 
+    def test_prefetch_records_carepoint_mapper(self):
+        """ It should prefetch the records on a Carepoint mapper """
+        importer = self._new_importer()
+        importer._mapper = mock.MagicMock(spec=CarepointImportMapper)
+        importer.prefetch_records([self.carepoint_record])
+        importer._mapper.prefetch.assert_called_once_with(
+            [self.carepoint_record],
+        )
+
+    def test_prefetch_records_other_mapper(self):
+        """ It should not prefetch on mappers without batch support """
+        importer = self._new_importer()
+        importer._mapper = mock.MagicMock()
+        importer.prefetch_records([self.carepoint_record])
+        importer._mapper.prefetch.assert_not_called()
+
     def test_validate_data_none(self):
         """ It should return None on base class """
         res = self._new_importer()._validate_data(True)
@@ -371,6 +527,22 @@ class TestCarepointImporter(SetUpCarepointBase):
         res = self._new_importer()._after_import(None)
         self.assertEqual(None, res)
 
+    def test_get_import_hash_not_dict(self):
+        """ It should return None if the record is not a dict """
+        importer = self._new_importer(carepoint_record=mock.MagicMock())
+        self.assertIs(None, importer._get_import_hash())
+
+    def test_get_import_hash_ignore(self):
+        """ It should not hash the ignored fields """
+        importer = self._new_importer(carepoint_record={
+            'name': 'Test', 'chg_date': 1, 'chg_user_id': 2,
+        })
+        res = importer._get_import_hash()
+        importer.carepoint_record = {'name': 'Test', 'chg_date': 3}
+        self.assertEqual(res, importer._get_import_hash())
+        importer.carepoint_record = {'name': 'Other', 'chg_date': 3}
+        self.assertNotEqual(res, importer._get_import_hash())
+
     def test_run_sets_carepoint_id(self):
         """ It should set carepoint_id on importer """
         importer = self._new_importer()
@@ -380,6 +552,28 @@ class TestCarepointImporter(SetUpCarepointBase):
                 importer.run(self.carepoint_id)
             self.assertEqual(self.carepoint_id, importer.carepoint_id)
 
+    def test_run_reads_record(self):
+        """ It should read the record from Carepoint if not provided """
+        importer = self._new_importer()
+        with mock_base_importer(importer):
+            importer._must_skip.return_value = 'skip'
+            importer.run(self.carepoint_id)
+            importer._get_carepoint_data.assert_called_once_with()
+            self.assertEqual(
+                importer._get_carepoint_data(), importer.carepoint_record,
+            )
+
+    def test_run_uses_provided_record(self):
+        """ It should not read the record from Carepoint if provided """
+        importer = self._new_importer()
+        with mock_base_importer(importer):
+            importer._must_skip.return_value = 'skip'
+            importer.run(self.carepoint_id, record=self.carepoint_record)
+            importer._get_carepoint_data.assert_not_called()
+            self.assertEqual(
+                self.carepoint_record, importer.carepoint_record,
+            )
+
     def test_run_returns_skip_if_skip(self):
         """ It should return skip if skip """
         expect = 'expect'
@@ -419,6 +613,70 @@ class TestCarepointImporter(SetUpCarepointBase):
                 _('Already Up To Date.'), res,
             )
 
+    def test_run_same_import_hash(self):
+        """ It should only bind the record if its data did not change """
+        importer = self._new_importer()
+        binding = mock.MagicMock(import_hash='hash')
+        with mock_base_importer(importer, ['_get_binding',
+                                           '_is_current',
+                                           '_get_import_hash',
+                                           '_map_data',
+                                           ]):
+            importer._must_skip.return_value = False
+            importer._get_binding.return_value = binding
+            importer._is_current.return_value = False
+            importer._get_import_hash.return_value = 'hash'
+            res = importer.run(self.carepoint_id)
+            self.assertEqual(_('Already Up To Date.'), res)
+            importer._map_data.assert_not_called()
+            importer.binder_for().bind.assert_called_once_with(
+                self.carepoint_id, binding,
+            )
+
+    def test_run_clears_export_hash(self):
+        """ It should clear the export hash of an updated binding """
+        importer = self._new_importer()
+        binding = mock.MagicMock(import_hash=False, export_hash='hash')
+        with mock_base_importer(importer, ['_get_binding',
+                                           '_is_current',
+                                           '_get_import_hash',
+                                           '_map_data',
+                                           '_update_data',
+                                           '_update',
+                                           '_after_import',
+                                           ]):
+            importer._must_skip.return_value = False
+            importer._get_binding.return_value = binding
+            importer._is_current.return_value = False
+            importer._get_import_hash.return_value = None
+            importer._update_data.return_value = {'name': 'Test'}
+            importer.run(self.carepoint_id)
+            importer._update.assert_called_once_with(binding, {
+                'name': 'Test', 'export_hash': False,
+            })
+
+    def test_run_stores_import_hash(self):
+        """ It should write the import hash along with the data """
+        importer = self._new_importer()
+        binding = mock.MagicMock(import_hash='hash', export_hash=False)
+        with mock_base_importer(importer, ['_get_binding',
+                                           '_is_current',
+                                           '_get_import_hash',
+                                           '_map_data',
+                                           '_update_data',
+                                           '_update',
+                                           '_after_import',
+                                           ]):
+            importer._must_skip.return_value = False
+            importer._get_binding.return_value = binding
+            importer._is_current.return_value = False
+            importer._get_import_hash.return_value = 'new'
+            importer._update_data.return_value = {'name': 'Test'}
+            importer.run(self.carepoint_id)
+            importer._update.assert_called_once_with(binding, {
+                'name': 'Test', 'import_hash': 'new',
+            })
+
     def test_run_import_depends(self):
         """ It should import dependencies first """
         importer = self._new_importer()
@@ -502,3 +760,49 @@ class TestCarepointImporter(SetUpCarepointBase):
             importer._create.assert_called_once_with(
                 importer._create_data(),
             )
+
+    def test_run_create_bind_with_data(self):
+        """ It should create with the binding values when enabled """
+        importer = self._new_importer()
+        importer._bind_with_data = True
+        with mock_base_importer(importer, ['_map_data',
+                                           '_get_binding',
+                                           '_create_data',
+                                           '_create',
+                                           '_after_import',
+                                           ]):
+            importer._get_binding.return_value = False
+            importer._must_skip.return_value = False
+            importer._create_data.return_value = {'name': 'Test'}
+            binder = importer.binder_for()
+            binder.bind_values.return_value = {'sync_date': 'now'}
+            importer.run(self.carepoint_id, True)
+            importer._create.assert_called_once_with({
+                'name': 'Test', 'sync_date': 'now',
+            })
+            binder.bind.assert_called_once_with(
+                self.carepoint_id, importer._create(), write=False,
+            )
+
+    def test_run_update_bind_with_data(self):
+        """ It should update with the binding values when enabled """
+        importer = self._new_importer()
+        importer._bind_with_data = True
+        with mock_base_importer(importer, ['_map_data',
+                                           '_get_binding',
+                                           '_update_data',
+                                           '_update',
+                                           '_after_import',
+                                           ]):
+            importer._get_binding.return_value = True
+            importer._must_skip.return_value = False
+            importer._update_data.return_value = {'name': 'Test'}
+            binder = importer.binder_for()
+            binder.bind_values.return_value = {'sync_date': 'now'}
+            importer.run(self.carepoint_id, True)
+            importer._update.assert_called_once_with(True, {
+                'name': 'Test', 'sync_date': 'now',
+            })
+            binder.bind.assert_called_once_with(
+                self.carepoint_id, True, write=False,
+            )
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# Copyright 2015-2016 LasLabs Inc.
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+import mock
+import psycopg2
+from datetime import timedelta, datetime
+
+from odoo import fields
+
+from odoo.addons.connector_carepoint.models.carepoint_backend import (
+    IMPORT_DELTA_BUFFER
+)
+
+from .common import SetUpCarepointBase
+
+
+window_model = 'odoo.addons.connector_carepoint.models.carepoint_import_window'
+
+
+class TestCarepointSyncWatermark(SetUpCarepointBase):
+
+    def setUp(self):
+        super(TestCarepointSyncWatermark, self).setUp()
+        self.Model = self.env['carepoint.sync.watermark']
+        self.watermark = self.Model._get_watermark(self.backend, 'model')
+
+    def _new_window(self, date_to, state='pending', job_uuid=False):
+        return self.env['carepoint.import.window'].create({
+            'watermark_id': self.watermark.id,
+            'date_to': date_to,
+            'state': state,
+            'job_uuid': job_uuid,
+        })
+
+    def _buffered(self, date):
+        return (fields.Datetime.from_string(date) -
+                timedelta(seconds=IMPORT_DELTA_BUFFER))
+
+    def test_get_watermark_existing(self):
+        """ It should return the existing watermark of the model """
+        self.assertEqual(
+            self.watermark,
+            self.Model._get_watermark(self.backend, 'model'),
+        )
+
+    def test_get_watermark_column(self):
+        """ It should keep a watermark per change date column """
+        res = self.Model._get_watermark(self.backend, 'model', 'add_date')
+        self.assertNotEqual(self.watermark, res)
+        self.assertEqual('add_date', res.chg_date_field)
+
+    def test_get_import_start_empty(self):
+        """ It should return None to import the whole history """
+        self.assertIs(None, self.watermark._get_import_start())
+
+    def test_get_import_start_low_mark(self):
+        """ It should start from the low mark without pending windows """
+        self.watermark.write({
+            'low_mark': '2016-01-01 00:00:00',
+            'high_mark': '2016-02-01 00:00:00',
+        })
+        self.assertEqual(
+            fields.Datetime.from_string('2016-01-01 00:00:00'),
+            self.watermark._get_import_start(),
+        )
+
+    def test_get_import_start_pending(self):
+        """ It should start after the pending windows """
+        self.watermark.low_mark = '2016-01-01 00:00:00'
+        self.watermark._add_windows([
+            (None, datetime(2016, 2, 1), 10),
+        ])
+        self.assertEqual(
+            self._buffered('2016-02-01 00:00:00'),
+            self.watermark._get_import_start(),
+        )
+
+    def test_add_windows(self):
+        """ It should create the windows and move the high mark """
+        windows = self.watermark._add_windows([
+            (None, datetime(2016, 1, 1), 10),
+            (datetime(2016, 1, 1), datetime(2016, 2, 1), 0),
+        ])
+        self.assertEqual(['pending', 'done'], windows.mapped('state'))
+        self.assertEqual('2016-02-01 00:00:00', self.watermark.high_mark)
+
+    def test_advance(self):
+        """ It should advance the low mark up to the first pending window """
+        first = self._new_window('2016-01-01 00:00:00', 'done')
+        pending = self._new_window('2016-02-01 00:00:00')
+        last = self._new_window('2016-03-01 00:00:00', 'done')
+        self.watermark._advance()
+        self.assertEqual(
+            fields.Datetime.to_string(
+                self._buffered('2016-01-01 00:00:00'),
+            ),
+            self.watermark.low_mark,
+        )
+        self.assertFalse(first.exists())
+        self.assertTrue((pending + last).exists())
+
+    def test_advance_pending(self):
+        """ It should not move the low mark before a pending window """
+        self._new_window('2016-01-01 00:00:00')
+        self.watermark._advance()
+        self.assertFalse(self.watermark.low_mark)
+
+    def test_advance_locked(self):
+        """ It should skip the watermarks locked by another transaction """
+        first = self._new_window('2016-01-01 00:00:00', 'done')
+        with mock.patch.object(self.watermark.env.cr, 'execute') as execute:
+            execute.side_effect = psycopg2.OperationalError
+            self.watermark._advance()
+        self.assertFalse(self.watermark.low_mark)
+        self.assertTrue(first.exists())
+
+    def test_lock_sql(self):
+        """ It should lock the watermark row without waiting """
+        with mock.patch.object(self.watermark.env.cr, 'execute') as execute:
+            res = self.watermark._lock()
+            execute.assert_any_call(
+                'SELECT id FROM carepoint_sync_watermark WHERE id = %s '
+                'FOR UPDATE NOWAIT',
+                (self.watermark.id, ),
+                log_exceptions=False,
+            )
+        self.assertEqual(self.watermark, res)
+
+    def test_window_set_done(self):
+        """ It should advance the watermark once the windows are done """
+        window = self._new_window('2016-01-01 00:00:00')
+        window._set_done()
+        self.assertFalse(window.exists())
+        self.assertTrue(self.watermark.low_mark)
+
+    def test_window_get_filters(self):
+        """ It should filter on the change dates of the window """
+        window = self._new_window('2016-02-01 00:00:00')
+        window.date_from = '2016-01-01 00:00:00'
+        self.assertEqual(
+            {'chg_date': {
+                '>=': fields.Datetime.from_string('2016-01-01 00:00:00'),
+                '<=': fields.Datetime.from_string('2016-02-01 00:00:00'),
+            }},
+            window._get_filters(),
+        )
+
+    def test_resume_windows_lost(self):
+        """ It should delay again the windows whose job was lost """
+        window = self._new_window('2016-01-01 00:00:00', job_uuid='lost')
+        with mock.patch('%s.import_batch' % window_model) as batch:
+            batch.delay.return_value = 'uuid'
+            res = self.watermark._resume_windows(self.session)
+            batch.delay.assert_called_once_with(
+                self.session, 'model', self.backend.id,
+                filters=window._get_filters(), window_id=window.id,
+                batch_id=window._get_batch().id,
+            )
+        self.assertEqual(window, res)
+        self.assertEqual('uuid', window.job_uuid)
+
+    def test_window_get_batch(self):
+        """ It should reuse the batch of the window until it is done """
+        window = self._new_window('2016-01-01 00:00:00')
+        batch = window._get_batch()
+        self.assertEqual(window, batch.window_id)
+        self.assertEqual(batch, window._get_batch())
+        batch._set_done()
+        self.assertNotEqual(batch, window._get_batch())
+        self.assertFalse(batch.exists())
+
+    def test_resume_windows_done(self):
+        """ It should not delay the windows that are done again """
+        self._new_window('2016-01-01 00:00:00', 'done', job_uuid='lost')
+        with mock.patch('%s.import_batch' % window_model) as batch:
+            self.watermark._resume_windows(self.session)
+            batch.delay.assert_not_called()
@@ -10,6 +10,8 @@ from .common import SetUpCarepointBase
 
 
 mk_file = 'odoo.addons.connector_carepoint.consumer'
+exporter_file = 'odoo.addons.connector_carepoint.unit.export_synchronizer'
+base_file = 'odoo.addons.connector_carepoint.models.base'
 
 
 class TestConsumer(SetUpCarepointBase):
@@ -19,10 +21,10 @@ class TestConsumer(SetUpCarepointBase):
         self.model = 'carepoint.carepoint.store'
         self.binding_id = self._new_record()
 
-    def _new_record(self):
+    def _new_record(self, carepoint_id=1234567):
         return self.env[self.model].create({
             'name': 'Test Pharm',
-            'carepoint_id': 1234567,
+            'carepoint_id': carepoint_id,
             'backend_id': self.backend.id,
             'warehouse_id': self.env.ref('stock.warehouse0').id,
         })
@@ -38,7 +40,8 @@ class TestConsumer(SetUpCarepointBase):
         """ It should call export_record.delay w/ proper args """
         fields = {'test': 123, 'test2': 456}
         expect = [self.session, self.model, self.binding_id]
-        with mock.patch('%s.export_record' % mk_file) as mk:
+        with mock.patch('%s.export_record' % exporter_file) as mk:
+            mk.delay.return_value = 'uuid'
             consumer.delay_export(*expect, vals=fields)
             mk.delay.assert_called_once_with(*expect, fields=fields.keys())
 
@@ -54,6 +57,210 @@ class TestConsumer(SetUpCarepointBase):
         fields = {'test': 123, 'test2': 456}
         send = [self.session, 'carepoint.store', self.binding_id.odoo_id.id]
         expect = [self.session, self.model, self.binding_id.id]
-        with mock.patch('%s.export_record' % mk_file) as mk:
+        with mock.patch('%s.export_record' % exporter_file) as mk:
+            mk.delay.return_value = 'uuid'
             consumer.delay_export_all_bindings(*send, vals=fields)
             mk.delay.assert_called_once_with(*expect, fields=fields.keys())
+
+    def test_delay_export_all_bindings_skip(self):
+        """ It should not export if no exported field was written """
+        send = [self.session, 'carepoint.store', self.binding_id.odoo_id.id]
+        with mock.patch('%s.get_export_fields' % mk_file) as get_fields:
+            get_fields.return_value = {'name'}
+            with mock.patch('%s.delay_export_coalesced' % mk_file) as mk:
+                consumer.delay_export_all_bindings(*send, vals={'ref': 1})
+                mk.assert_not_called()
+
+    def test_delay_export_all_bindings_unknown_fields(self):
+        """ It should export if the exported fields are unknown """
+        send = [self.session, 'carepoint.store', self.binding_id.odoo_id.id]
+        with mock.patch('%s.get_export_fields' % mk_file) as get_fields:
+            get_fields.return_value = None
+            with mock.patch('%s.delay_export_coalesced' % mk_file) as mk:
+                consumer.delay_export_all_bindings(*send, vals={'ref': 1})
+                self.assertEqual(1, mk.call_count)
+
+    def test_delay_export_all_bindings_link_partner(self):
+        """ It should export the links whose partner only was written """
+        binding = mock.MagicMock(_name='carepoint.carepoint.address.patient')
+        binding.backend_id = self.backend
+        session = mock.MagicMock(context={})
+        record = session.env['carepoint.address.patient'].browse()
+        record.carepoint_bind_ids = [binding]
+        get_export_fields = consumer.get_export_fields
+        with mock.patch('%s.get_export_fields' % mk_file) as get_fields:
+            get_fields.side_effect = lambda _session, binding: (
+                get_export_fields(self.session, binding)
+            )
+            with mock.patch('%s.delay_export_coalesced' % mk_file) as mk:
+                consumer.delay_export_all_bindings(
+                    session, 'carepoint.address.patient', 1,
+                    vals={'partner_id': 1},
+                )
+                mk.assert_called_once_with(
+                    session, binding._name, binding.id,
+                    fields=['partner_id'],
+                )
+
+    def test_delay_export_all_bindings_collected(self):
+        """ It should add the bindings to the current collector """
+        send = [self.session, 'carepoint.store', self.binding_id.odoo_id.id]
+        with mock.patch('%s.delay_export_batch' % mk_file) as mk:
+            with mock.patch('%s.delay_export_coalesced' % mk_file) as single:
+                with consumer.export_collector():
+                    consumer.delay_export_all_bindings(*send,
+                                                       vals={'name': 1})
+                    mk.assert_not_called()
+                single.assert_not_called()
+            mk.assert_called_once_with(
+                self.session, self.model, [self.binding_id.id],
+                fields=['name'],
+            )
+
+    def test_export_collector_groups(self):
+        """ It should delay the bindings of the same fields together """
+        binding = self._new_record(7654321)
+        with mock.patch('%s.delay_export_batch' % mk_file) as mk:
+            with consumer.export_collector():
+                for record in (self.binding_id, binding, self.binding_id):
+                    consumer.delay_export_all_bindings(
+                        self.session, 'carepoint.store', record.odoo_id.id,
+                        vals={'name': 1},
+                    )
+            mk.assert_called_once_with(
+                self.session, self.model, [self.binding_id.id, binding.id],
+                fields=['name'],
+            )
+
+    def test_export_collector_error(self):
+        """ It should not delay anything if the block raises """
+        with mock.patch('%s.delay_export_batch' % mk_file) as mk:
+            with self.assertRaises(self.EndTestException):
+                with consumer.export_collector():
+                    consumer.delay_export_all_bindings(
+                        self.session, 'carepoint.store',
+                        self.binding_id.odoo_id.id, vals={'name': 1},
+                    )
+                    raise self.EndTestException()
+            mk.assert_not_called()
+
+    def test_delay_export_batch_single(self):
+        """ It should delay a single binding on its own """
+        with mock.patch('%s.delay_export_coalesced' % mk_file) as mk:
+            consumer.delay_export_batch(
+                self.session, self.model, [1], fields=['name'],
+            )
+            mk.assert_called_once_with(
+                self.session, self.model, 1, fields=['name'],
+            )
+
+    def test_delay_export_batch_chunks(self):
+        """ It should delay batch jobs of at most EXPORT_BATCH_SIZE """
+        with mock.patch('%s.EXPORT_BATCH_SIZE' % mk_file, 2):
+            with mock.patch('%s.export_batch' % mk_file) as mk:
+                consumer.delay_export_batch(
+                    self.session, self.model, [1, 2, 3], fields=['name'],
+                )
+                mk.delay.assert_has_calls([
+                    mock.call(self.session, self.model, [1, 2],
+                              fields=['name']),
+                    mock.call(self.session, self.model, [3],
+                              fields=['name']),
+                ])
+
+    def test_write_collects_exports(self):
+        """ It should collect the exports of the records written together """
+        records = self.binding_id.odoo_id | self._new_record(7654321).odoo_id
+        with mock.patch('%s.export_collector' % base_file) as mk:
+            records.write({'name': 'Test'})
+            self.assertEqual(1, mk().__enter__.call_count)
+
+    def test_write_single_record(self):
+        """ It should not collect the exports of a single record """
+        with mock.patch('%s.export_collector' % base_file) as mk:
+            self.binding_id.odoo_id.write({'name': 'Test'})
+            mk.assert_not_called()
+
+    def test_get_export_fields_cached(self):
+        """ It should compute the fields once per mapper class """
+        with mock.patch('%s.export_source_fields' % mk_file) as mk:
+            mk.return_value = {'name'}
+            with mock.patch.dict(consumer._export_fields, clear=True):
+                consumer.get_export_fields(self.session, self.binding_id)
+                res = consumer.get_export_fields(
+                    self.session, self.binding_id,
+                )
+            self.assertEqual(1, mk.call_count)
+            self.assertEqual({'name'}, res)
+
+    def _export_jobs(self):
+        return self.env['queue.job'].search([
+            ('carepoint_identity_key', '=', 'export_record(%s, %s)' % (
+                self.model, self.binding_id.id,
+            )),
+        ])
+
+    def test_delay_export_coalesced_identity(self):
+        """ It should store the identity of the new job """
+        uuid = consumer.delay_export_coalesced(
+            self.session, self.model, self.binding_id.id, ['name'],
+        )
+        job = self._export_jobs()
+        self.assertEqual(uuid, job.uuid)
+        self.assertEqual('name', job.carepoint_export_fields)
+
+    def test_delay_export_coalesced_absorbs(self):
+        """ It should not delay a job already covered by a pending one """
+        uuid = consumer.delay_export_coalesced(
+            self.session, self.model, self.binding_id.id, ['name', 'ref'],
+        )
+        res = consumer.delay_export_coalesced(
+            self.session, self.model, self.binding_id.id, ['name'],
+        )
+        self.assertEqual(uuid, res)
+        self.assertEqual(1, len(self._export_jobs()))
+
+    def test_delay_export_coalesced_all_fields(self):
+        """ It should absorb any job in a pending job for all fields """
+        uuid = consumer.delay_export_coalesced(
+            self.session, self.model, self.binding_id.id,
+        )
+        res = consumer.delay_export_coalesced(
+            self.session, self.model, self.binding_id.id, ['name'],
+        )
+        self.assertEqual(uuid, res)
+
+    def test_delay_export_coalesced_merges(self):
+        """ It should replace the pending job w/ one for all fields """
+        uuid = consumer.delay_export_coalesced(
+            self.session, self.model, self.binding_id.id, ['name'],
+        )
+        res = consumer.delay_export_coalesced(
+            self.session, self.model, self.binding_id.id, ['ref'],
+        )
+        job = self._export_jobs()
+        self.assertNotEqual(uuid, res)
+        self.assertEqual(res, job.uuid)
+        self.assertEqual('name,ref', job.carepoint_export_fields)
+
+    def test_delay_export_coalesced_started(self):
+        """ It should not coalesce into jobs that are already started """
+        consumer.delay_export_coalesced(
+            self.session, self.model, self.binding_id.id, ['name'],
+        )
+        self._export_jobs().write({'state': 'started'})
+        consumer.delay_export_coalesced(
+            self.session, self.model, self.binding_id.id, ['name'],
+        )
+        self.assertEqual(2, len(self._export_jobs()))
+
+    def test_delay_export_coalesced_enqueued(self):
+        """ It should not coalesce into jobs taken by the job runner """
+        consumer.delay_export_coalesced(
+            self.session, self.model, self.binding_id.id, ['name'],
+        )
+        self._export_jobs().write({'state': 'enqueued'})
+        consumer.delay_export_coalesced(
+            self.session, self.model, self.binding_id.id, ['name'],
+        )
+        self.assertEqual(2, len(self._export_jobs()))
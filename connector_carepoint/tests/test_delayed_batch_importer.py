@@ -30,17 +30,210 @@ class TestDelayedBatchImporter(SetUpCarepointBase):
         return importer
 
     def test_import_record(self):
-        """ It should call import_record w/ proper args """
+        """ It should delay the import w/ proper args """
         importer = self._new_importer()
         expect = 'expect'
         kwargs = {'test1': 1234, 'test2': 5678}
-        with mock.patch('%s.import_record' % model) as mk:
+        with mock.patch('%s.delay_import_coalesced' % model) as mk:
             with mock.patch('%s.int_or_str' % model) as int_or_str:
                 importer._import_record(expect, **kwargs)
-                mk.delay.assert_called_once_with(
+                mk.assert_called_once_with(
                     importer.session,
                     importer.model._name,
                     importer.backend_record.id,
                     int_or_str(expect),
                     **kwargs
                 )
+
+    def test_import_record_chunk(self):
+        """ It should not delay anything until the chunk is full """
+        importer = self._new_importer()
+        importer._job_chunk_size = 2
+        with mock.patch('%s.import_record_batch' % model) as mk:
+            importer._import_record(1)
+            mk.delay.assert_not_called()
+
+    def test_import_record_chunk_full(self):
+        """ It should delay a batch job of the ids once the chunk is full """
+        importer = self._new_importer()
+        importer._job_chunk_size = 2
+        with mock.patch('%s.import_record_batch' % model) as mk:
+            importer._import_record(1)
+            importer._import_record(2, record={'col': 1})
+            mk.delay.assert_called_once_with(
+                importer.session,
+                importer.model._name,
+                importer.backend_record.id,
+                [1, 2],
+            )
+
+    def test_import_record_no_data(self):
+        """ It should not delay the data of the record """
+        importer = self._new_importer()
+        with mock.patch('%s.delay_import_coalesced' % model) as mk:
+            importer._import_record(1, record={'col': 1})
+            mk.assert_called_once_with(
+                importer.session,
+                importer.model._name,
+                importer.backend_record.id,
+                1,
+            )
+
+    def test_get_chunk_attributes(self):
+        """ It should only read the change date in the chunks """
+        self.assertEqual(
+            ['chg_date'], self._new_importer()._get_chunk_attributes(),
+        )
+
+    def test_run_delays_partial_chunk(self):
+        """ It should delay the last partial chunk at the end of run """
+        importer = self._new_importer()
+        importer._job_chunk_size = 10
+        with self.mock_adapter(importer) as adapter:
+            adapter.iter_search.return_value = [1, 2, 3]
+            with mock.patch('%s.import_record_batch' % model) as mk:
+                importer.run()
+                mk.delay.assert_called_once_with(
+                    importer.session,
+                    importer.model._name,
+                    importer.backend_record.id,
+                    [1, 2, 3],
+                )
+
+    def test_checkpoint_delays_chunk(self):
+        """ It should delay the current chunk before saving a position """
+        importer = self._new_importer()
+        importer._job_chunk_size = 10
+        importer.batch = self.env['carepoint.import.batch']._new_batch(
+            self.backend, self.model,
+        )
+        with mock.patch('%s.import_record_batch' % model) as mk:
+            with mock.patch.object(importer.session, 'commit'):
+                importer._import_record(1)
+                importer._checkpoint(1, 1)
+            self.assertEqual(1, mk.delay.call_count)
+        self.assertEqual(1, importer.batch._get_cursor())
+
+    def test_import_record_batch_reads(self):
+        """ It should read the records of the chunk at once """
+        with mock.patch('%s.get_environment' % model) as env:
+            importer = env().get_connector_unit()
+            import_synchronizer.import_record_batch(
+                self.session, self.model, self.backend.id, [1, 2],
+            )
+            importer.read_records.assert_called_once_with([1, 2])
+
+    def test_import_record_batch_imports(self):
+        """ It should run the importer for every record of the chunk """
+        record = {'col': 1}
+        with mock.patch('%s.get_environment' % model) as env:
+            importer = env().get_connector_unit()
+            importer.read_records.return_value = {2: record}
+            import_synchronizer.import_record_batch(
+                self.session, self.model, self.backend.id, [1, 2],
+            )
+            env().get_connector_unit().to_odoo_many.assert_called_once_with(
+                [1, 2],
+            )
+            importer.run.assert_has_calls([
+                mock.call(1, force=False, record=None),
+                mock.call(2, force=False, record=record),
+            ])
+
+    def test_import_record_batch_prefetches(self):
+        """ It should prefetch the records read once for the chunk """
+        record = {'col': 1}
+        with mock.patch('%s.get_environment' % model) as env:
+            importer = env().get_connector_unit()
+            importer.read_records.return_value = {2: record}
+            import_synchronizer.import_record_batch(
+                self.session, self.model, self.backend.id, [1, 2],
+            )
+            importer.prefetch_records.assert_called_once_with([record])
+
+    def test_import_record_batch_prefetch_error(self):
+        """ It should import the records one at a time if prefetch fails """
+        with mock.patch('%s.get_environment' % model) as env:
+            importer = env().get_connector_unit()
+            importer.prefetch_records.side_effect = ValueError
+            with mock.patch('%s.delay_import_coalesced' % model) as mk:
+                import_synchronizer.import_record_batch(
+                    self.session, self.model, self.backend.id, [1, 2],
+                )
+                mk.assert_not_called()
+            importer.run.assert_has_calls([
+                mock.call(1, force=False, record=None),
+                mock.call(2, force=False, record=None),
+            ])
+
+    def test_import_record_batch_splits_failures(self):
+        """ It should delay failed records as separate jobs """
+        with mock.patch('%s.get_environment' % model) as env:
+            importer = env().get_connector_unit()
+            importer.run.side_effect = [None, ValueError]
+            with mock.patch('%s.delay_import_coalesced' % model) as mk:
+                import_synchronizer.import_record_batch(
+                    self.session, self.model, self.backend.id, [1, 2],
+                )
+                mk.assert_called_once_with(
+                    self.session, self.model, self.backend.id, 2,
+                    force=False,
+                )
+
+    def _import_jobs(self, carepoint_id=1):
+        return self.env['queue.job'].search([
+            ('carepoint_identity_key', '=', 'import_record(%s, %s, %s)' % (
+                self.model, self.backend.id, carepoint_id,
+            )),
+        ])
+
+    def _delay_import(self, carepoint_id=1, **kwargs):
+        return import_synchronizer.delay_import_coalesced(
+            self.session, self.model, self.backend.id, carepoint_id,
+            **kwargs
+        )
+
+    def test_delay_import_coalesced_identity(self):
+        """ It should store the identity of the new job """
+        uuid = self._delay_import(force=True)
+        job = self._import_jobs()
+        self.assertEqual(uuid, job.uuid)
+        self.assertTrue(job.carepoint_force)
+
+    def test_delay_import_coalesced_absorbs(self):
+        """ It should not delay a job identical to a pending one """
+        uuid = self._delay_import()
+        self.assertEqual(uuid, self._delay_import())
+        self.assertEqual(1, len(self._import_jobs()))
+
+    def test_delay_import_coalesced_forced_absorbs(self):
+        """ It should absorb any import in a pending forced job """
+        uuid = self._delay_import(force=True)
+        self.assertEqual(uuid, self._delay_import())
+
+    def test_delay_import_coalesced_force_wins(self):
+        """ It should replace a pending job that is not forced """
+        uuid = self._delay_import()
+        res = self._delay_import(force=True)
+        job = self._import_jobs()
+        self.assertNotEqual(uuid, res)
+        self.assertEqual(res, job.uuid)
+        self.assertTrue(job.carepoint_force)
+
+    def test_delay_import_coalesced_other_record(self):
+        """ It should not coalesce the imports of different records """
+        self.assertNotEqual(self._delay_import(1), self._delay_import(2))
+
+    def test_delay_import_coalesced_started(self):
+        """ It should not coalesce into jobs that are already started """
+        self._delay_import()
+        self._import_jobs().write({'state': 'started'})
+        self._delay_import()
+        self.assertEqual(2, len(self._import_jobs()))
+
+    def test_delay_import_coalesced_enqueued(self):
+        """ It should not coalesce into jobs taken by the job runner """
+        self._delay_import()
+        self._import_jobs().write({'state': 'enqueued'})
+        self._delay_import()
+        self.assertEqual(2, len(self._import_jobs()))
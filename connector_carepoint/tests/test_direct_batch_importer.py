@@ -42,3 +42,18 @@ class TestDirectBatchImporter(SetUpCarepointBase):
                     importer.backend_record.id,
                     int_or_str(expect)
                 )
+
+    def test_import_record_kwargs(self):
+        """ It should pass keyword arguments to import_record """
+        importer = self._new_importer()
+        expect = {'expect': 'record'}
+        with mock.patch('%s.import_record' % model) as mk:
+            with mock.patch('%s.int_or_str' % model) as int_or_str:
+                importer._import_record(1, record=expect)
+                mk.assert_called_once_with(
+                    importer.session,
+                    importer.model._name,
+                    importer.backend_record.id,
+                    int_or_str(1),
+                    record=expect,
+                )
@@ -2,6 +2,8 @@
 # Copyright 2015-2016 LasLabs Inc.
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+from odoo.addons.connector.unit.mapper import convert, mapping, none
+
 from odoo.addons.connector_carepoint.unit import mapper
 
 from .common import SetUpCarepointBase
@@ -37,3 +39,52 @@ class TestPersonExportMapper(SetUpCarepointBase):
                   'lname': 'Lname',
                   }
         self.assertDictEqual(expect, res)
+
+    def test_export_source_fields(self):
+        """ It should return the changed_by fields of the mappings """
+        self.assertEqual(
+            {'name'}, mapper.export_source_fields(self.exporter),
+        )
+
+    def test_export_source_fields_direct(self):
+        """ It should go through the modifiers of direct mappings """
+        self.exporter.direct = [
+            ('ref', 'ssn'),
+            (none(convert('birth_date', str)), 'dob'),
+        ]
+        self.assertEqual(
+            {'name', 'ref', 'birth_date'},
+            mapper.export_source_fields(self.exporter),
+        )
+
+    def test_export_source_fields_unknown(self):
+        """ It should return None if a direct source is unknown """
+        self.exporter.direct = [(lambda *args: None, 'dob')]
+        self.assertIs(None, mapper.export_source_fields(self.exporter))
+
+    def test_export_source_fields_undeclared(self):
+        """ It should return None if a mapping does not declare its fields """
+        class Mapper(self.Exporter):
+            @mapping
+            def static(self, record):
+                return {'col': 1}
+
+        self.assertIs(None, mapper.export_source_fields(Mapper(self.mock_env)))
+
+    def test_export_source_fields_reads(self):
+        """ It should add the fields read by the mappings w/o changed_by """
+        class Mapper(self.Exporter):
+            @mapping
+            @mapper.reads('res_id')
+            def res(self, record):
+                return {'col': record.res_id}
+
+            @mapping
+            @mapper.reads()
+            def static(self, record):
+                return {'col': 1}
+
+        self.assertEqual(
+            {'name', 'res_id'},
+            mapper.export_source_fields(Mapper(self.mock_env)),
+        )
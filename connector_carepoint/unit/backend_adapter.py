@@ -2,9 +2,16 @@
 # Copyright 2015-2016 LasLabs Inc.
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+import logging
+import threading
+
+from collections import deque
+from contextlib import contextmanager
+
 from odoo.addons.connector.unit.backend_adapter import CRUDAdapter
 
 try:
+    from sqlalchemy import and_, bindparam, func, inspect, or_, text
     from sqlalchemy.exc import InvalidRequestError
     from sqlalchemy.exc import TimeoutError
 except ImportError:
@@ -12,10 +19,242 @@ except ImportError:
 
 try:
     from carepoint import Carepoint
+    from carepoint.db import Db as CarepointDb
+    from carepoint.db.carepoint import dbs as carepoint_dbs
 except ImportError:
     pass
 
 
+_logger = logging.getLogger(__name__)
+
+# Backend fields that are used to build a CarePoint connection. Writing any
+# of these on a backend invalidates its pooled connection.
+CONNECTION_FIELDS = [
+    'server',
+    'username',
+    'password',
+    'db_driver',
+    'db_pool_size',
+    'db_max_overflow',
+    'db_pool_timeout',
+]
+
+# Process-wide registry of CarePoint connections, keyed by backend ID.
+# Values are ``(key, carepoint)`` tuples, where ``key`` is a tuple of the
+# connection field values that were used to build the instance.
+_connections = {}
+# Also held while the engines of a connection are built or rebuilt, since
+# the CarePoint library builds them in a module-global dict
+_connections_lock = threading.RLock()
+
+# Process-wide cache of the resolved CarePoint model metadata, keyed by
+# ``(backend ID, _cp_lib)``. Values are dicts holding the reflected model
+# class (``model``), its primary keys (``pks``) and, once requested, its
+# column names (``columns``). Entries of a backend are dropped along with
+# its connection, or when its connection environment is reinitialized.
+_metadata = {}
+
+# Process-wide pools of primary keys reserved from the CarePoint sequences,
+# keyed by ``(backend ID, sequence name)``. Values are ``(keys, lock)``
+# tuples, where ``keys`` is a deque of the reserved keys and ``lock`` is
+# held while a block is reserved for the sequence. ``_sequences_lock`` only
+# guards the registry itself. Keys are reserved in CarePoint before being
+# handed out, so they are never given twice, but the ones left when the
+# process stops or the connection is dropped are lost.
+_sequences = {}
+_sequences_lock = threading.Lock()
+
+# Thread-local state of the current ``carepoint_transaction``. Its
+# ``sessions`` attribute maps the bind (engine) of each CarePoint database
+# used in the transaction to the SQLAlchemy session writing to it.
+_transaction = threading.local()
+
+
+def _connection_key(backend):
+    """ Return the connection key for a backend record
+    :param backend: Singleton of ``carepoint.backend``
+    :rtype: tuple
+    """
+    return tuple(backend[name] for name in CONNECTION_FIELDS)
+
+
+def _build_carepoint(backend):
+    """ Build a CarePoint connection owning its database engines
+
+    The CarePoint library keeps its engines in a module-global dict, and
+    only builds one when it is missing, so every instance would use the
+    engine built first. The dict is emptied before the instance builds its
+    engine, which is then moved in a dict of its own. This is done while
+    holding the registry lock, so that concurrent builds do not take each
+    other's engine.
+
+    :param backend: Singleton of ``carepoint.backend``
+    :rtype: :class:`carepoint.Carepoint`
+    """
+    engine_args = {}
+    # SQLite engines use a pool that does not take these arguments
+    if backend.db_driver != CarepointDb.SQLITE:
+        engine_args.update(
+            pool_size=backend.db_pool_size,
+            max_overflow=backend.db_max_overflow,
+            pool_timeout=backend.db_pool_timeout,
+        )
+    with _connections_lock:
+        carepoint_dbs.clear()
+        carepoint = Carepoint(
+            server=backend.server,
+            user=backend.username,
+            passwd=backend.password,
+            db_args={'drv': backend.db_driver},
+            **engine_args
+        )
+        if carepoint.dbs is carepoint_dbs:
+            carepoint.dbs = dict(carepoint_dbs)
+            carepoint_dbs.clear()
+    return carepoint
+
+
+def _dispose_carepoint(carepoint):
+    """ Close the pooled connections of the engines of a connection
+    Connections that are checked out are closed when they are returned.
+    :param carepoint: Instance of :class:`carepoint.Carepoint`
+    """
+    for engine in carepoint.dbs.values():
+        engine.dispose()
+
+
+def reset_carepoint(carepoint):
+    """ Rebuild the database engines and sessions of a connection
+    The connection is shared by the threads of the process, so it is
+    rebuilt while holding the registry lock.
+    :param carepoint: Instance of :class:`carepoint.Carepoint`
+    """
+    with _connections_lock:
+        _dispose_carepoint(carepoint)
+        carepoint.dbs.clear()
+        carepoint.env.clear()
+        carepoint._init_env()
+
+
+def get_carepoint(backend):
+    """ Return the shared CarePoint connection for a backend
+
+    The instance (and therefore its SQLAlchemy engines and pools) is built
+    once per process and shared by every adapter and job runner thread
+    that works with the backend. It is rebuilt if the connection settings
+    of the backend no longer match the ones it was built with.
+
+    :param backend: Singleton of ``carepoint.backend``
+    :rtype: :class:`carepoint.Carepoint`
+    """
+    key = _connection_key(backend)
+    with _connections_lock:
+        try:
+            cached_key, carepoint = _connections[backend.id]
+            if cached_key == key:
+                return carepoint
+            _dispose_carepoint(carepoint)
+        except KeyError:
+            pass
+        _logger.debug('Opening CarePoint connection for backend %s',
+                      backend.id)
+        carepoint = _build_carepoint(backend)
+        _connections[backend.id] = (key, carepoint)
+        return carepoint
+
+
+def clear_carepoint(backend_ids=None):
+    """ Drop the shared CarePoint connections of the given backends
+    Their engines are disposed.
+    :param backend_ids: List of backend IDs to clear. None to clear all
+    :type backend_ids: list or None
+    """
+    with _connections_lock:
+        if backend_ids is None:
+            backend_ids_cleared = list(_connections)
+        else:
+            backend_ids_cleared = backend_ids
+        for backend_id in backend_ids_cleared:
+            try:
+                _key, carepoint = _connections.pop(backend_id)
+            except KeyError:
+                continue
+            _dispose_carepoint(carepoint)
+    clear_metadata(backend_ids)
+    clear_sequences(backend_ids)
+
+
+def clear_metadata(backend_ids=None):
+    """ Drop the cached model metadata of the given backends
+    :param backend_ids: List of backend IDs to clear. None to clear all
+    :type backend_ids: list or None
+    """
+    if backend_ids is None:
+        _metadata.clear()
+        return
+    for key in list(_metadata):
+        if key[0] in backend_ids:
+            _metadata.pop(key, None)
+
+
+def clear_sequences(backend_ids=None):
+    """ Drop the reserved primary keys of the given backends
+    :param backend_ids: List of backend IDs to clear. None to clear all
+    :type backend_ids: list or None
+    """
+    with _sequences_lock:
+        if backend_ids is None:
+            _sequences.clear()
+            return
+        for key in list(_sequences):
+            if key[0] in backend_ids:
+                del _sequences[key]
+
+
+def in_carepoint_transaction():
+    """ Return True if a ``carepoint_transaction`` is open in this thread
+    :rtype: bool
+    """
+    return getattr(_transaction, 'sessions', None) is not None
+
+
+@contextmanager
+def carepoint_transaction(before_commit=None):
+    """ Defer the CarePoint commits of the adapters to the end of the block
+
+    While the block runs, the ``create``, ``write``, ``write_many`` and
+    ``delete`` of the adapters in the current thread write through one
+    session per CarePoint database, without committing. The sessions are
+    all committed when the block exits, or all rolled back if it raises.
+    Nested blocks join the outer one.
+
+    Values from CarePoint sequences and stored procedures (primary keys,
+    script numbers) are still allocated in their own transactions, so a
+    rolled back block leaves gaps in them.
+
+    :param before_commit: Called when the block exits without error, before
+        the sessions are committed. They are rolled back if it raises.
+        Ignored by nested blocks.
+    :type before_commit: callable or None
+    """
+    if in_carepoint_transaction():
+        yield
+        return
+    _transaction.sessions = {}
+    try:
+        yield
+        if before_commit is not None:
+            before_commit()
+        for session in _transaction.sessions.values():
+            session.commit()
+    except Exception:
+        for session in _transaction.sessions.values():
+            session.rollback()
+        raise
+    finally:
+        _transaction.sessions = None
+
+
 class CarepointCRUDAdapter(CRUDAdapter):
     """ External Records Adapter for Carepoint """
 
@@ -24,19 +263,16 @@ class CarepointCRUDAdapter(CRUDAdapter):
         TimeoutError,
     ]
 
+    # Default amount of records read per query by the iterative searches
+    PAGE_SIZE = 1000
+
     def __init__(self, connector_env):
         """ Ready the DB adapter
         :param connector_env: current environment (backend, session, ...)
         :type connector_env: :class:`connector.connector.ConnectorEnvironment`
         """
         super(CarepointCRUDAdapter, self).__init__(connector_env)
-        backend = self.backend_record
-        self.carepoint = Carepoint(
-            server=backend.server,
-            user=backend.username,
-            passwd=backend.password,
-            db_args={'drv': backend.db_driver},
-        )
+        self.carepoint = get_carepoint(self.backend_record)
 
     def __to_camel_case(self, snake_case):
         """ Convert the snake_case to CamelCase
@@ -47,19 +283,78 @@ class CarepointCRUDAdapter(CRUDAdapter):
         parts = snake_case.split('_')
         return "".join(x.title() for x in parts)
 
-    def __get_cp_model(self, retry=True):
-        """ Get the correct model object by name from Carepoint lib
-        :rtype: :class:`sqlalchemy.schema.Table`
+    def __get_metadata(self, retry=True):
+        """ Get the cached metadata of the model from Carepoint lib
+        The model is resolved and its primary keys are read on the first
+        call for the backend, then served from the cache until the
+        connection is reinitialized.
+        :rtype: dict
         """
         name = self.connector_env.model._cp_lib
+        key = (self.backend_record.id, name)
+        metadata = _metadata.get(key)
+        if metadata is not None:
+            return metadata
         camel_name = self.__to_camel_case(name)
         try:
-            return self.carepoint[camel_name]
+            model_obj = self.carepoint[camel_name]
         except tuple(self.RECONNECT_EXCEPTIONS):
             if retry:
-                self.carepoint._init_env(True)
-                return self.__get_cp_model(False)
+                reset_carepoint(self.carepoint)
+                clear_metadata([self.backend_record.id])
+                return self.__get_metadata(False)
             raise
+        metadata = {
+            'model': model_obj,
+            'pks': self.carepoint.get_pks(model_obj),
+        }
+        _metadata[key] = metadata
+        return metadata
+
+    def __get_cp_model(self):
+        """ Get the correct model object by name from Carepoint lib
+        :rtype: :class:`sqlalchemy.schema.Table`
+        """
+        return self.__get_metadata()['model']
+
+    def get_pks(self):
+        """ Return the primary key names of the model
+        :rtype: tuple
+        """
+        return self.__get_metadata()['pks']
+
+    def get_columns(self):
+        """ Return the column names of the model
+        :rtype: tuple
+        """
+        metadata = self.__get_metadata()
+        if 'columns' not in metadata:
+            metadata['columns'] = tuple(
+                attr.key
+                for attr in inspect(metadata['model']).mapper.column_attrs
+            )
+        return metadata['columns']
+
+    def __search(self, model_obj, filters, attributes=None):
+        """ Return a query on the model, selecting only the attributes
+        The Carepoint lib does not apply the attributes it is given to its
+        queries, so the columns are selected here. The rows are then keyed
+        tuples, which are read by attribute. Unknown columns are ignored,
+        as in the lib.
+        :param model_obj: Table class to search
+        :param filters: Filters to apply to search
+        :type filters: dict
+        :param attributes: Attributes to rcv from db. None for *
+        :type attributes: list or None
+        :rtype: :class:`sqlalchemy.orm.query.Query`
+        """
+        query = self.carepoint.search(model_obj, filters, None)
+        if attributes:
+            columns = [getattr(model_obj, name) for name in attributes
+                       if hasattr(model_obj, name)]
+            if columns:
+                query = query.with_entities(*columns)
+        return query
 
     def search(self, **filters):
         """ Search table by filters and return record ids
@@ -69,16 +364,57 @@ class CarepointCRUDAdapter(CRUDAdapter):
         :rtype: list
         """
         model_obj = self.__get_cp_model()
-        pk = self.carepoint.get_pks(model_obj)[0]
-        res = self.carepoint.search(model_obj, filters, [pk])
+        pk = self.get_pks()[0]
+        res = self.__search(model_obj, filters, [pk])
         return [getattr(row, pk) for row in res]
 
+    def __get_pk_domain(self, _id):
+        """ Return the search domain of a record by its id
+        :param _id: Id of record. Can be comma sep str for multiple indexes
+        :type _id: mixed
+        :rtype: dict
+        """
+        pks = self.get_pks()
+        domain = {}
+        try:
+            for idx, id_part in enumerate(_id.split(',')):
+                domain[pks[idx]] = id_part
+        except AttributeError:
+            domain[pks[0]] = _id
+        return domain
+
+    def __get_pk_query(self, model_obj, _id, session=None):
+        """ Return a query on a record by its id
+        :param session: SQLAlchemy session to build the query in. The
+            session of the current ``carepoint_transaction`` is used when
+            None, or a new search is done on the model outside of one
+        :rtype: :class:`sqlalchemy.orm.query.Query`
+        """
+        domain = self.__get_pk_domain(_id)
+        if session is None:
+            session = self.__get_transaction_session(model_obj)
+        if session is None:
+            return self.carepoint.search(model_obj, domain, None)
+        return session.query(model_obj).filter_by(**domain)
+
+    def __get_transaction_session(self, model_obj):
+        """ Return the session of the current ``carepoint_transaction``
+        for the database of the model
+        :return: SQLAlchemy session, or None outside of a transaction
+        """
+        if not in_carepoint_transaction():
+            return None
+        session = self.carepoint.search(model_obj, {}, None).session
+        bind = session.get_bind(mapper=model_obj)
+        return _transaction.sessions.setdefault(bind, session)
+
     def read(self, _id, attributes=None, return_all=False):
         """ Gets record by id and returns the object
         :param _id: Id of record to get from Db. Can be comma sep str
             for multiple indexes
         :type _id: mixed
-        :param attributes: Attributes to rcv from db. None for *
+        :param attributes: Attributes to rcv from db. None for *. The
+            records are then returned as ``dict``s of these attributes
         :type attributes: list or None
         :rtype: :class:`sqlalchemy.engine.ResultProxy`
 
@@ -86,15 +422,49 @@ class CarepointCRUDAdapter(CRUDAdapter):
         """
         # @TODO: Fix lookup by ident
         model_obj = self.__get_cp_model()
-        pks = self.carepoint.get_pks(model_obj)
-        domain = {}
-        try:
-            for idx, id_part in enumerate(_id.split(',')):
-                domain[pks[idx]] = id_part
-        except AttributeError:
-            domain[pks[0]] = _id
-        res = self.carepoint.search(model_obj, domain, attributes)
-        return res if return_all else res[0]
+        domain = self.__get_pk_domain(_id)
+        res = self.__search(model_obj, domain, attributes)
+        if not attributes:
+            return res if return_all else res[0]
+        if return_all:
+            return [self.to_dict(row) for row in res]
+        return self.to_dict(res[0])
+
+    def read_many(self, ids, attributes=None):
+        """ Get several records by id, in one query
+        :param ids: Ids of the records. Comma sep str for composite
+            primary keys
+        :type ids: list
+        :param attributes: Attributes to rcv from db. None for *. The
+            records are then returned as ``dict``s of these attributes
+        :type attributes: list or None
+        :return: Records keyed by their id, as returned by
+            :meth:`iter_search`. Missing records are left out.
+        :rtype: dict
+        """
+        if not ids:
+            return {}
+        model_obj = self.__get_cp_model()
+        pks = self.get_pks()
+        if attributes is not None:
+            attributes = list(attributes)
+            for name in pks:
+                if name not in attributes:
+                    attributes.append(name)
+        pk_cols = [getattr(model_obj, name) for name in pks]
+        query = self.__search(model_obj, {}, attributes)
+        if len(pks) == 1:
+            query = query.filter(pk_cols[0].in_(ids))
+        else:
+            query = query.filter(or_(*[
+                and_(*[col == value for col, value in
+                       zip(pk_cols, self.__get_pk_values(_id))])
+                for _id in ids
+            ]))
+        if attributes is None:
+            return {self.__get_record_id(row): row for row in query}
+        return {self.__get_record_id(row): self.to_dict(row)
+                for row in query}
 
     def read_image(self, path):
         """ Returns an image resource from CarePoint
@@ -121,13 +491,266 @@ class CarepointCRUDAdapter(CRUDAdapter):
 
     def search_read(self, attributes=None, **filters):
         """ Search table by filters and return records
+        :param attributes: Attributes to rcv from db. None for *. The
+            records are then yielded as ``dict``s of these attributes
+        :type attributes: list or None
+        :param filters: Filters to apply to search
+        :rtype: :class:`sqlalchemy.engine.ResultProxy` or generator
+        """
+        model_obj = self.__get_cp_model()
+        res = self.__search(model_obj, filters, attributes)
+        if not attributes:
+            return res
+        return (self.to_dict(row) for row in res)
+
+    def __get_record_id(self, row):
+        """ Return the id of a record read from the model
+        The values of composite primary keys are joined by commas, as in
+        the ids returned by :meth:`create`.
+        :rtype: mixed
+        """
+        pks = self.get_pks()
+        if len(pks) == 1:
+            return getattr(row, pks[0])
+        return ','.join(str(getattr(row, pk)) for pk in pks)
+
+    def __get_pk_values(self, _id):
+        """ Return the primary key values of a record id
+        :param _id: Id of record. Comma sep str for composite primary keys
+        :type _id: mixed
+        :rtype: tuple
+        """
+        if len(self.get_pks()) == 1:
+            return (_id, )
+        return tuple(_id.split(','))
+
+    def __get_keyset_filter(self, columns, values):
+        """ Return a clause on the rows after ``values`` in the order of
+        ``columns``
+        Row value comparisons are not supported by SQL Server, so they are
+        expanded column by column.
+        :param columns: Columns the query is ordered by
+        :type columns: list
+        :param values: Values of the columns for the last row read
+        :type values: tuple
+        """
+        clause = columns[-1] > values[-1]
+        for column, value in reversed(zip(columns[:-1], values[:-1])):
+            clause = or_(column > value, and_(column == value, clause))
+        return clause
+
+    def iter_search_read(self, attributes=None, page_size=None, after=None,
+                         order_field=None, **filters):
+        """ Search table by filters and yield the records one by one
+
+        Records are read page by page, using keyset pagination on all of
+        the primary keys of the table, so memory use does not depend on the
+        size of the result.
+
+        :param attributes: Attributes to rcv from db. None for *. The
+            primary keys and ``order_field`` are always received.
+        :type attributes: list or None
+        :param page_size: Amount of records to read per query. Defaults to
+            ``PAGE_SIZE``
+        :type page_size: int or None
+        :param after: Only yield records after this position. This is a
+            record id, as yielded by :meth:`iter_search`, or a
+            ``(order_field value, record id)`` tuple if ``order_field`` is
+            set.
+        :param order_field: Name of a column to order by before the primary
+            keys, such as ``chg_date``. It must not contain null values in
+            the searched records.
+        :type order_field: str or None
+        :param filters: Filters to apply to search
+        :rtype: generator
+        """
+        model_obj = self.__get_cp_model()
+        keys = list(self.get_pks())
+        if order_field:
+            keys.insert(0, order_field)
+        if attributes is not None:
+            attributes = list(attributes)
+            for name in keys:
+                if name not in attributes:
+                    attributes.append(name)
+        key_cols = [getattr(model_obj, name) for name in keys]
+        query = self.__search(model_obj, filters, attributes)
+        query = query.order_by(*key_cols)
+        page_size = page_size or self.PAGE_SIZE
+        if after is not None:
+            if order_field:
+                after = (after[0], ) + self.__get_pk_values(after[1])
+            else:
+                after = self.__get_pk_values(after)
+        while True:
+            page = query
+            if after is not None:
+                page = page.filter(self.__get_keyset_filter(key_cols, after))
+            rows = page.limit(page_size).all()
+            for row in rows:
+                yield row
+            if len(rows) < page_size:
+                return
+            after = tuple(getattr(rows[-1], name) for name in keys)
+
+    def iter_search(self, page_size=None, after=None, order_field=None,
+                    **filters):
+        """ Search table by filters and yield record ids one by one
+        The values of composite primary keys are joined by commas in the
+        ids. See :meth:`iter_search_read` for the parameters.
+        :rtype: generator
+        """
+        rows = self.iter_search_read(list(self.get_pks()), page_size, after,
+                                     order_field, **filters)
+        for row in rows:
+            yield self.__get_record_id(row)
+
+    def search_read_chunks(self, chunk_size=None, attributes=None,
+                           after=None, **filters):
+        """ Search table by filters and yield the records in chunks
+
+        Each chunk is read with its own query, see :meth:`iter_search_read`.
+
+        :param chunk_size: Maximum amount of records per chunk. Defaults to
+            ``PAGE_SIZE``
+        :type chunk_size: int or None
         :param attributes: Attributes to rcv from db. None for *
         :type attributes: list or None
+        :param after: Only yield records after this record id
         :param filters: Filters to apply to search
-        :rtype: :class:`sqlalchemy.engine.ResultProxy`
+        :return: Generator of lists of ``(record_id, record)`` tuples, where
+            ``record_id`` is the id of the record, as yielded by
+            :meth:`iter_search`, and ``record`` is a ``dict`` of the row
+        :rtype: generator
+        """
+        chunk_size = chunk_size or self.PAGE_SIZE
+        chunk = []
+        rows = self.iter_search_read(attributes, chunk_size, after,
+                                     **filters)
+        for row in rows:
+            chunk.append((self.__get_record_id(row), self.to_dict(row)))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def search_count(self, **filters):
+        """ Return the amount of records matching the filters
+        :param filters: Filters to apply to search
+        :rtype: int
+        """
+        model_obj = self.__get_cp_model()
+        query = self.carepoint.search(model_obj, filters, None)
+        return query.with_entities(func.count()).scalar()
+
+    def get_change_signature(self, date_field='chg_date', **filters):
+        """ Return a signature of the records, which changes when records
+        are added, removed or changed
+        It is made of the amount of records and of their latest change
+        date, read in a single query.
+        :param date_field: Name of the change date column
+        :type date_field: str
+        :param filters: Filters to apply to search
+        :rtype: str
+        """
+        model_obj = self.__get_cp_model()
+        query = self.carepoint.search(model_obj, filters, None)
+        count, max_date = query.with_entities(
+            func.count(), func.max(getattr(model_obj, date_field)),
+        ).one()
+        return '%s,%s' % (count, max_date)
+
+    def get_date_range(self, date_field='chg_date', **filters):
+        """ Return the amount of records and the range of their change
+        dates, read in a single query
+        :param date_field: Name of the change date column
+        :type date_field: str
+        :param filters: Filters to apply to search
+        :return: Amount of records, earliest and latest change dates
+        :rtype: tuple
         """
         model_obj = self.__get_cp_model()
-        return self.carepoint.search(model_obj, filters, attributes)
+        date_col = getattr(model_obj, date_field)
+        query = self.carepoint.search(model_obj, filters, None)
+        return query.with_entities(
+            func.count(), func.min(date_col), func.max(date_col),
+        ).one()
+
+    def to_dict(self, row):
+        """ Convert a result row into a ``dict`` of column values
+        :param row: Model instance, keyed tuple, or dict from a search
+        :rtype: dict
+        """
+        if isinstance(row, dict):
+            return row
+        try:
+            return row._asdict()
+        except AttributeError:
+            return {name: getattr(row, name) for name in self.get_columns()}
+
+    def get_next_sequence(self, sequence_name):
+        """ Return the next value of a CarePoint sequence
+        When the ``db_sequence_block_size`` of the backend is greater than
+        1, the values are reserved by blocks of this size in one round trip
+        and handed out from a process-wide pool, shared by all threads.
+        :param sequence_name: Name of the sequence, usually the primary key
+        :type sequence_name: str
+        :rtype: int
+        """
+        block_size = self.backend_record.db_sequence_block_size
+        if block_size <= 1:
+            return self.carepoint.get_next_sequence(sequence_name)
+        key = (self.backend_record.id, sequence_name)
+        with _sequences_lock:
+            reserved, lock = _sequences.setdefault(
+                key, (deque(), threading.Lock()),
+            )
+        while True:
+            try:
+                return reserved.popleft()
+            except IndexError:
+                pass
+            # Only the threads waiting on this sequence are blocked during
+            # the round trip to CarePoint
+            with lock:
+                if not reserved:
+                    reserved.extend(
+                        self._reserve_sequence(sequence_name, block_size)
+                    )
+
+    def _reserve_sequence(self, sequence_name, count):
+        """ Reserve a block of values from a CarePoint sequence
+        :param sequence_name: Name of the sequence
+        :type sequence_name: str
+        :param count: Amount of values to reserve
+        :type count: int
+        :rtype: list
+        """
+        with self.carepoint.dbs['cph'].begin() as conn:
+            res = conn.execute(
+                text(
+                    "SET NOCOUNT ON;"
+                    "DECLARE @out INT, @i INT;"
+                    "DECLARE @ids TABLE (id INT);"
+                    "SET @i = 0;"
+                    "WHILE @i < :count "
+                    "BEGIN "
+                    "EXEC CsGenerateIntId :seq_name, @out output;"
+                    "INSERT INTO @ids VALUES (@out);"
+                    "SET @i = @i + 1;"
+                    "END;"
+                    "SELECT id FROM @ids ORDER BY id;"
+                    "SET NOCOUNT OFF;",
+                    bindparams=[
+                        bindparam('seq_name'),
+                        bindparam('count'),
+                    ],
+                ),
+                seq_name=sequence_name,
+                count=count,
+            )
+            return [row[0] for row in res.fetchall()]
 
     def create(self, data):
         """ Wrapper to create a record on the external system
@@ -137,27 +760,62 @@ class CarepointCRUDAdapter(CRUDAdapter):
             ``str`` of external carepoint_id
         """
         model_obj = self.__get_cp_model()
-        pks = self.carepoint.get_pks(model_obj)
+        pks = self.get_pks()
         out_pks = []
         for pk in pks:
             if not data.get(pk):
-                data[pk] = self.carepoint.get_next_sequence(pk)
+                data[pk] = self.get_next_sequence(pk)
             out_pks.append(str(data[pk]))
-        self.carepoint.create(model_obj, data)
+        session = self.__get_transaction_session(model_obj)
+        if session is None:
+            self.carepoint.create(model_obj, data)
+        else:
+            session.add(model_obj(**data))
+            session.flush()
         return ','.join(out_pks)
 
     def write(self, _id, data):
         """ Update record on the external system
+        The record is updated with a single UPDATE statement on its primary
+        keys, only setting the columns in ``data``.
         :param _id: Id of record to manipulate
         :type _id: int
         :param data: Data to create record with
         :type data: dict
-        :rtype: :class:`sqlalchemy.engine.ResultProxy`
+        :rtype: :class:`sqlalchemy.orm.query.Query`
+        """
+        query = self.__get_pk_query(self.__get_cp_model(), _id)
+        query.update(data, synchronize_session=False)
+        if not in_carepoint_transaction():
+            query.session.commit()
+        return query
+
+    def write_many(self, ids_to_data):
+        """ Update several records on the external system at once
+        All of the updates are sent in the same transaction, which is
+        rolled back if any of them fails. Inside a ``carepoint_transaction``
+        they are left for it to commit.
+        :param ids_to_data: Data to update, keyed by id of record
+        :type ids_to_data: dict
         """
-        record = self.read(_id, return_all=True)
-        record.update(data)
-        record.session.commit()
-        return record
+        model_obj = self.__get_cp_model()
+        if in_carepoint_transaction():
+            for _id, data in ids_to_data.items():
+                query = self.__get_pk_query(model_obj, _id)
+                query.update(data, synchronize_session=False)
+            return
+        session = None
+        try:
+            for _id, data in ids_to_data.items():
+                query = self.__get_pk_query(model_obj, _id, session)
+                session = query.session
+                query.update(data, synchronize_session=False)
+            if session is not None:
+                session.commit()
+        except Exception:
+            if session is not None:
+                session.rollback()
+            raise
 
     def delete(self, _id):
         """ Delete record on the external system
@@ -166,4 +824,7 @@ class CarepointCRUDAdapter(CRUDAdapter):
         :rtype: bool
         """
         model_obj = self.__get_cp_model()
+        if in_carepoint_transaction():
+            query = self.__get_pk_query(model_obj, _id)
+            return bool(query.delete(synchronize_session=False))
         return self.carepoint.delete(model_obj, _id)
@@ -3,8 +3,11 @@
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
 import logging
+import weakref
 import odoo
 
+from collections import OrderedDict
+
 from odoo.addons.connector.connector import Binder
 
 from ..backend import carepoint
@@ -12,6 +15,82 @@ from ..backend import carepoint
 
 _logger = logging.getLogger(__name__)
 
+# Binder caches, keyed by database cursor. A cache is dropped when the
+# transaction of its cursor is committed or rolled back.
+_binder_caches = weakref.WeakKeyDictionary()
+
+
+class BinderCache(object):
+    """ Bounded LRU cache of binder lookups for one transaction
+
+    Only lookups that found a binding are cached, so a binding that is
+    created later in the transaction is always found.
+    """
+
+    def __init__(self, size):
+        """
+        :param size: Maximum amount of entries to keep
+        :type size: int
+        """
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """ Return the cached value for key, or None if not cached """
+        try:
+            value = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries[key] = value
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """ Cache a value for key, evicting the least recently used """
+        self._entries.pop(key, None)
+        self._entries[key] = value
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """ Drop all cached values """
+        self._entries.clear()
+
+
+def get_binder_cache(cr, size):
+    """ Return the binder cache of the current transaction of a cursor
+    :param cr: Database cursor
+    :param size: Maximum size of the cache, if it must be created
+    :type size: int
+    :rtype: :class:`BinderCache`
+    """
+    try:
+        return _binder_caches[cr]
+    except KeyError:
+        pass
+    cache = _binder_caches[cr] = BinderCache(size)
+
+    def _drop_cache():
+        if _binder_caches.get(cr) is cache:
+            del _binder_caches[cr]
+
+    cr.after('commit', _drop_cache)
+    cr.after('rollback', _drop_cache)
+    return cache
+
+
+def clear_binder_cache(cr):
+    """ Drop the binder cache of a cursor, if any
+    :param cr: Database cursor
+    """
+    _binder_caches.pop(cr, None)
+
 
 class CarepointBinder(Binder):
     """ Generic Binder for Carepoint """
@@ -74,6 +153,23 @@ class CarepointModelBinder(CarepointBinder):
         'carepoint.fdb.pem.moe',
     ]
 
+    # Maximum amount of lookups cached per transaction
+    _cache_size = 10000
+
+    @property
+    def cache(self):
+        """ Binder cache of the current transaction
+        :rtype: :class:`BinderCache`
+        """
+        return get_binder_cache(self.session.cr, self._cache_size)
+
+    def _cache_key(self, direction, record_id):
+        return (direction,
+                self.model._name,
+                self.backend_record.id,
+                record_id,
+                )
+
     def to_odoo(self, external_id, unwrap=True, browse=False):
         """ Give the Odoo ID for an external ID
         :param external_id: external ID for which we want the Odoo ID
@@ -84,10 +180,17 @@ class CarepointModelBinder(CarepointBinder):
                  or an empty recordset if no binding is found
         :rtype: recordset
         """
-        bindings = self.model.with_context(active_test=False).search([
-            ('carepoint_id', '=', str(external_id)),
-            ('backend_id', '=', self.backend_record.id)
-        ])
+        cache_key = self._cache_key('odoo', str(external_id))
+        binding_id = self.cache.get(cache_key)
+        if binding_id:
+            bindings = self.model.browse(binding_id)
+        else:
+            bindings = self.model.with_context(active_test=False).search([
+                ('carepoint_id', '=', str(external_id)),
+                ('backend_id', '=', self.backend_record.id)
+            ])
+            if len(bindings) == 1:
+                self.cache.set(cache_key, bindings.id)
         if not bindings:
             return self.model.browse() if browse else None
         assert len(bindings) == 1, odoo._(
@@ -98,6 +201,72 @@ class CarepointModelBinder(CarepointBinder):
         else:
             return bindings if browse else bindings.id
 
+    def to_odoo_many(self, external_ids, unwrap=True):
+        """ Give the Odoo IDs for several external IDs in one query
+        :param external_ids: external IDs for which we want the Odoo IDs
+        :type external_ids: list
+        :param unwrap: if True, returns the IDs of the normal records (the
+                       ones inherits'ed), else the IDs of the bindings
+        :return: Odoo IDs keyed by external ID (as ``str``). The external
+                 IDs without a binding are not in the result.
+        :rtype: dict
+        """
+        external_ids = list(set(str(i) for i in external_ids))
+        if not external_ids:
+            return {}
+        bindings = self.model.with_context(active_test=False).search([
+            ('carepoint_id', 'in', external_ids),
+            ('backend_id', '=', self.backend_record.id),
+        ])
+        res = {}
+        for binding in bindings:
+            self.cache.set(
+                self._cache_key('odoo', binding.carepoint_id), binding.id,
+            )
+            if unwrap:
+                res[binding.carepoint_id] = binding.odoo_id.id
+            else:
+                res[binding.carepoint_id] = binding.id
+        return res
+
+    def to_backend_many(self, record_ids, wrap=True):
+        """ Give the external IDs for several Odoo IDs in one query
+        :param record_ids: Odoo IDs for which we want the external IDs,
+                           or a recordset
+        :param wrap: if False, record_ids are the IDs of the bindings,
+            if True, record_ids are the IDs of the normal records, and the
+            method will search the corresponding bindings
+        :return: external IDs keyed by the Odoo IDs that were given. The
+                 records without a bound external ID are not in the result.
+        :rtype: dict
+        """
+        if isinstance(record_ids, odoo.models.BaseModel):
+            record_ids = record_ids.ids
+        record_ids = list(set(record_ids))
+        if not record_ids:
+            return {}
+        if wrap:
+            bindings = self.model.with_context(active_test=False).search([
+                ('odoo_id', 'in', record_ids),
+                ('backend_id', '=', self.backend_record.id),
+            ])
+        else:
+            bindings = self.model.browse(record_ids)
+        res = {}
+        for binding in bindings:
+            if not binding.carepoint_id:
+                continue
+            if wrap:
+                record_id = binding.odoo_id.id
+                self.cache.set(
+                    self._cache_key('backend', record_id),
+                    binding.carepoint_id,
+                )
+            else:
+                record_id = binding.id
+            res[record_id] = binding.carepoint_id
+        return res
+
     def to_backend(self, record_id, wrap=True):
         """ Give the external ID for an Odoo ID
         :param record_id: Odoo ID for which we want the external id
@@ -114,12 +283,18 @@ class CarepointModelBinder(CarepointBinder):
             record = record_id
             record_id = record_id.id
         if wrap:
+            cache_key = self._cache_key('backend', record_id)
+            carepoint_id = self.cache.get(cache_key)
+            if carepoint_id:
+                return carepoint_id
             binding = self.model.with_context(active_test=False).search([
                 ('odoo_id', '=', record_id),
                 ('backend_id', '=', self.backend_record.id),
             ])
             if binding:
                 binding.ensure_one()
+                if binding.carepoint_id:
+                    self.cache.set(cache_key, binding.carepoint_id)
                 return binding.carepoint_id
             else:
                 return None
@@ -128,12 +303,26 @@ class CarepointModelBinder(CarepointBinder):
         assert record
         return record.id
 
-    def bind(self, external_id, binding_id):
+    def bind_values(self, external_id):
+        """ Return the values written on a binding by :meth:`bind`
+        :param external_id: External ID to bind
+        :rtype: dict
+        """
+        return {
+            'carepoint_id': str(external_id),
+            'sync_date': odoo.fields.Datetime.now(),
+        }
+
+    def bind(self, external_id, binding_id, write=True):
         """ Create the link between an external ID and an Odoo ID and
         update the last synchronization date.
         :param external_id: External ID to bind
         :param binding_id: Odoo ID to bind
         :type binding_id: int
+        :param write: False if the values of :meth:`bind_values` were
+            already written along with the record data, only the binder
+            cache is updated then.
+        :type write: bool
         """
         # the external ID can be 0 on Carepoint! Prevent False values
         # like False, None, or "", but not 0.
@@ -141,14 +330,26 @@ class CarepointModelBinder(CarepointBinder):
             "external_id or binding_id missing, "
             "got: %s, %s" % (external_id, binding_id)
         )
-        # avoid to trigger the export when we modify the `carepoint_id`
-        now_fmt = odoo.fields.Datetime.now()
         if not isinstance(binding_id, odoo.models.BaseModel):
             binding_id = self.model.browse(binding_id)
-        binding_id.with_context(connector_no_export=True).write({
-            'carepoint_id': str(external_id),
-            'sync_date': now_fmt,
-        })
+        if write:
+            # avoid to trigger the export when we modify the `carepoint_id`
+            binding_id.with_context(connector_no_export=True).write(
+                self.bind_values(external_id),
+            )
+        self._cache_binding(binding_id, external_id)
+
+    def _cache_binding(self, binding, external_id):
+        """ Cache the lookups of a binding in both directions
+        :param binding: Singleton of the binding record
+        :param external_id: External ID of the binding
+        """
+        external_id = str(external_id)
+        self.cache.set(self._cache_key('odoo', external_id), binding.id)
+        if 'odoo_id' in self.model._fields:
+            self.cache.set(
+                self._cache_key('backend', binding.odoo_id.id), external_id,
+            )
 
     def unwrap_binding(self, binding_id, browse=False):
         """ For a binding record, gives the normal record.
@@ -2,7 +2,9 @@
 # Copyright 2015-2016 LasLabs Inc.
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+import hashlib
 import logging
+import threading
 
 from contextlib import contextmanager
 
@@ -15,12 +17,30 @@ from odoo.addons.connector.unit.synchronizer import Exporter
 from odoo.addons.connector.exception import (IDMissingInBackend,
                                              RetryableJobError,
                                              )
-from .import_synchronizer import import_record
+from .backend_adapter import carepoint_transaction, in_carepoint_transaction
+from .binder import clear_binder_cache
+from .import_synchronizer import import_record, delay_import_coalesced
 from ..connector import get_environment
 from ..related_action import unwrap_binding
 
 _logger = logging.getLogger(__name__)
 
+# Thread-local state of the current ``export_batch``. Its ``exported``
+# attribute lists the ``(model name, binding id, created)`` tuples of the
+# bindings exported in the batch, dependencies included. It is None out
+# of a batch.
+_batch = threading.local()
+
+
+def _add_batch_export(model_name, binding_id, created):
+    """ Record the export of a binding in the current ``export_batch``
+    :param created: Whether the record was created on Carepoint
+    :type created: bool
+    """
+    exported = getattr(_batch, 'exported', None)
+    if exported is not None:
+        exported.append((model_name, binding_id, created))
+
 
 """
 Exporters for Carepoint.
@@ -52,9 +72,9 @@ class CarepointBaseExporter(Exporter):
         # force is True because the sync_date will be more recent
         # so the import would be skipped
         assert self.carepoint_id
-        import_record.delay(self.session, self.model._name,
-                            self.backend_record.id, self.carepoint_id,
-                            force=True)
+        delay_import_coalesced(self.session, self.model._name,
+                               self.backend_record.id, self.carepoint_id,
+                               force=True)
 
     def _immediate_import(self):
         """ Perform an immediate import of the record
@@ -93,11 +113,12 @@ class CarepointBaseExporter(Exporter):
         """ Return the raw Odoo data for ``self.binding_id`` """
         return self.model.browse(self.binding_id)
 
-    def run(self, binding_id, *args, **kwargs):
-        """ Run the synchronization
+    def _start_export(self, binding_id):
+        """ Load the binding record to export
+        An import of the record is delayed when it changed on Carepoint
+        since its last synchronization.
         :param binding_id: identifier of the binding record to export
         """
-
         self.binding_id = binding_id
         self.binding_record = self._get_odoo_data()
         self.carepoint_id = self.binding_record.carepoint_id
@@ -111,19 +132,48 @@ class CarepointBaseExporter(Exporter):
         if should_import:
             self._delay_import()
 
+    def run(self, binding_id, *args, **kwargs):
+        """ Run the synchronization
+        :param binding_id: identifier of the binding record to export
+        """
+
+        self._start_export(binding_id)
+
+        created = not self.carepoint_id
         result = self._run(*args, **kwargs)
 
         self.binder.bind(self.carepoint_id, self.binding_id)
+        _add_batch_export(self.model._name, self.binding_id, created)
 
         # Commit so we keep the external ID when there are several
         # exports (due to dependencies) and one of them fails.
         # The commit will also release the lock acquired on the binding
         # record
-        self.session.commit()
+        self._commit()
 
         self._after_export()
         return result
 
+    def run_batch(self, binding_ids, fields=None):
+        """ Export several records, as done by :func:`export_batch`
+        The records are exported one by one. Inherited classes can export
+        them in bulk instead.
+        :param binding_ids: identifiers of the binding records to export
+        :type binding_ids: list
+        :param fields: fields to export
+        """
+        for binding_id in binding_ids:
+            self.run(binding_id, fields=fields)
+
+    def _commit(self):
+        """ Commit the Odoo transaction
+        It is skipped when exporting in a ``carepoint_transaction`` (see
+        :func:`export_batch`), where both sides are committed at once at
+        the end of the batch.
+        """
+        if not in_carepoint_transaction():
+            self.session.commit()
+
     def _run(self):
         """ Flow of the synchronization, implemented in inherited classes"""
         raise NotImplementedError
@@ -136,6 +186,99 @@ class CarepointBaseExporter(Exporter):
 class CarepointExporter(CarepointBaseExporter):
     """ A common flow for the exports to Carepoint """
 
+    # Create the new records of a :meth:`run_batch` at once, with
+    # :meth:`_create_many`. Only for models whose records do not depend on
+    # each other.
+    _batch_create = False
+    # Update the records of a :meth:`run_batch` already on Carepoint at
+    # once, with :meth:`_write_many`.
+    _batch_write = False
+
+    def run_batch(self, binding_ids, fields=None):
+        """ Export several records, as done by :func:`export_batch`
+        When ``_batch_create`` or ``_batch_write`` is set, the records
+        that are respectively not on Carepoint yet or already on Carepoint
+        are prepared one by one, then sent at once.
+        :param binding_ids: identifiers of the binding records to export
+        :type binding_ids: list
+        :param fields: fields to export, for the records already on
+            Carepoint
+        """
+        bindings = self.model.browse(binding_ids)
+        self._prefetch_batch(bindings)
+        if not (self._batch_create or self._batch_write):
+            return super(CarepointExporter, self).run_batch(
+                binding_ids, fields=fields,
+            )
+        created = []
+        written = []
+        for binding in bindings:
+            if binding.carepoint_id:
+                batched = self._batch_write
+            else:
+                batched = self._batch_create
+            if not batched:
+                self.run(binding.id, fields=fields)
+                continue
+            self._start_export(binding.id)
+            if self.carepoint_id:
+                record, _result = self._prepare_export(fields)
+                if record:
+                    # The other fields of a partial export may differ
+                    export_hash = (fields is None and
+                                   self._get_export_hash(record))
+                    written.append((binding, self.carepoint_id,
+                                    export_hash, record))
+            else:
+                record, _result = self._prepare_export()
+                if record:
+                    created.append((binding, self._get_export_hash(record),
+                                    record))
+        if not (created or written):
+            return
+        if created:
+            carepoint_ids = self._create_many(
+                [record for _binding, _export_hash, record in created],
+            )
+            for (binding, export_hash, _record), carepoint_id in zip(
+                    created, carepoint_ids):
+                self._finish_batch_export(binding, carepoint_id,
+                                          export_hash, True)
+        if written:
+            self._write_many(dict(
+                (carepoint_id, record)
+                for _binding, carepoint_id, _export_hash, record in written
+            ))
+            for binding, carepoint_id, export_hash, _record in written:
+                self._finish_batch_export(binding, carepoint_id,
+                                          export_hash, False)
+        self._commit()
+
+    def _prefetch_batch(self, bindings):
+        """ Hook called by :meth:`run_batch` before the export of the
+        records, to resolve their lookups at once, for instance by filling
+        the binder cache with ``to_backend_many``
+        :param bindings: Binding records about to be exported
+        """
+        return
+
+    def _finish_batch_export(self, binding, carepoint_id, export_hash,
+                             created):
+        """ Bind a record sent to Carepoint by :meth:`run_batch`
+        :param binding: Binding record exported
+        :param carepoint_id: External id of the record
+        :param export_hash: Hash of the values exported, or False
+        :param created: Whether the record was created on Carepoint
+        :type created: bool
+        """
+        self.binding_id = binding.id
+        self.binding_record = binding
+        self.carepoint_id = carepoint_id
+        self._set_export_hash(export_hash)
+        self.binder.bind(carepoint_id, binding.id)
+        _add_batch_export(self.model._name, binding.id, created)
+        self._after_export()
+
     def _lock(self):
         """ Lock the binding record.
         Lock the binding record so we are sure that only one export
@@ -275,7 +418,7 @@ class CarepointExporter(CarepointBaseExporter):
                     # will pop if an other job already created
                     # the same binding. It will be caught and
                     # raise a RetryableJobError.
-                    self.session.commit()
+                    self._commit()
         else:
             # If carepoint_bind_ids does not exist we are typically in a
             # "direct" binding (the binding record is the same record).
@@ -290,6 +433,30 @@ class CarepointExporter(CarepointBaseExporter):
         """ Export the dependencies for the record"""
         return
 
+    def _get_export_hash(self, record):
+        """ Return a hash of all of the values mapped for the record
+        :param record: Values mapped for the record, as returned by
+            :meth:`_create_data` or :meth:`_update_data`
+        :type record: dict
+        :rtype: str
+        """
+        return hashlib.sha1(repr(sorted(record.items()))).hexdigest()
+
+    def _is_unchanged(self, record):
+        """ Return True if the record was already exported with the same
+        values, so that Carepoint already holds them.
+        :param record: Values mapped for the record
+        :type record: dict
+        """
+        return (self._get_export_hash(record) ==
+                self.binding_record.export_hash)
+
+    def _set_export_hash(self, export_hash):
+        """ Store the hash of the values exported for the record """
+        self.binding_record.with_context(connector_no_export=True).write({
+            'export_hash': export_hash,
+        })
+
     def _map_data(self):
         """ Returns an instance of
         :py:class:`~odoo.addons.connector.unit.mapper.MapRecord`
@@ -322,6 +489,24 @@ class CarepointExporter(CarepointBaseExporter):
         self._validate_create_data(data)
         return self.backend_adapter.create(data)
 
+    def _create_many(self, data_list):
+        """ Create several Carepoint records, for :meth:`run_batch`
+        :param data_list: Data of each record to create
+        :type data_list: list
+        :return: External ids of the records, in the same order
+        :rtype: list
+        """
+        return [self._create(data) for data in data_list]
+
+    def _write_many(self, ids_to_data):
+        """ Update several Carepoint records, for :meth:`run_batch`
+        :param ids_to_data: Data to update, keyed by external id
+        :type ids_to_data: dict
+        """
+        for data in ids_to_data.values():
+            self._validate_update_data(data)
+        self.backend_adapter.write_many(ids_to_data)
+
     def _update_data(self, map_record, fields=None, **kwargs):
         """ Get the data to pass to :py:meth:`_update` """
         return map_record.values(fields=fields, **kwargs)
@@ -333,16 +518,29 @@ class CarepointExporter(CarepointBaseExporter):
         self._validate_update_data(data)
         self.backend_adapter.write(self.carepoint_id, data)
 
-    def _run(self, fields=None):
-        """ Flow of the synchronization, implemented in inherited classes """
-        assert self.binding_id
-        assert self.binding_record
-
-        if not self.carepoint_id:
-            fields = None  # should be created with all the fields
-
+    def _prepare_export(self, fields=None):
+        """ Prepare the export of the record, up to the values to write
+        The dependencies of the record are exported, then the record is
+        locked and mapped.
+        :param fields: fields to export, None for all
+        :return: ``(record, result)``, where ``record`` holds the values to
+            write, or is empty if there is nothing to write. ``result`` is
+            then the message of the export.
+        :rtype: tuple
+        """
         if self._has_to_skip():
-            return
+            return None, None
+
+        # The record is mapped once, since the mappings can have side
+        # effects, such as the reset of a trigger field
+        record = None
+        # skip the record, and its dependencies, when the values are
+        # the ones already exported
+        if (self.carepoint_id and fields is None and
+                self.binding_record.export_hash):
+            record = self._update_data(self._map_data())
+            if record and self._is_unchanged(record):
+                return None, _('Nothing to export, the values are unchanged.')
 
         # export the missing linked resources
         self._export_dependencies()
@@ -351,18 +549,36 @@ class CarepointExporter(CarepointBaseExporter):
         # will be released on commit (or rollback)
         self._lock()
 
-        map_record = self._map_data()
+        if record is None:
+            # mapped after the dependencies, which may have been bound since.
+            # The dependencies of a record already exported are bound.
+            map_record = self._map_data()
+            if self.carepoint_id:
+                record = self._update_data(map_record, fields=fields)
+            else:
+                record = self._create_data(map_record, fields=fields)
+        if not record:
+            return None, _('Nothing to export.')
+        return record, None
+
+    def _run(self, fields=None):
+        """ Flow of the synchronization, implemented in inherited classes """
+        assert self.binding_id
+        assert self.binding_record
+
+        if not self.carepoint_id:
+            fields = None  # should be created with all the fields
 
+        record, result = self._prepare_export(fields)
+        if not record:
+            return result
+        # The other fields of a partial export may differ on Carepoint
+        export_hash = fields is None and self._get_export_hash(record)
         if self.carepoint_id:
-            record = self._update_data(map_record, fields=fields)
-            if not record:
-                return _('Nothing to export.')
             self._update(record)
         else:
-            record = self._create_data(map_record, fields=fields)
-            if not record:
-                return _('Nothing to export.')
             self.carepoint_id = self._create(record)
+        self._set_export_hash(export_hash)
         return _(
             'Record exported with ID %s on Carepoint.'
         ) % self.carepoint_id
@@ -376,3 +592,105 @@ def export_record(session, model_name, binding_id, fields=None):
     env = get_environment(session, model_name, record.backend_id.id)
     exporter = env.get_connector_unit(CarepointExporter)
     return exporter.run(binding_id, fields=fields)
+
+
+def delay_export_coalesced(session, model_name, binding_id, fields=None):
+    """ Delay a job which export a binding record, unless one is pending.
+    A pending export job of the same binding that is not started yet
+    absorbs the request if it already exports all of the fields. Otherwise
+    it is replaced by one job exporting the fields of both.
+    :return: UUID of the job exporting the binding
+    """
+    job_obj = session.env['queue.job'].sudo()
+    identity_key = 'export_record(%s, %s)' % (model_name, binding_id)
+    pending = job_obj._carepoint_lock_pending(identity_key)
+    if pending:
+        pending_fields = pending._carepoint_get_export_fields()
+        if pending_fields is None:
+            return pending.uuid
+        if fields is not None:
+            if set(fields) <= set(pending_fields):
+                return pending.uuid
+            fields = sorted(set(fields) | set(pending_fields))
+        _logger.debug('Replacing pending job %s with fields %s',
+                      identity_key, fields)
+        pending.unlink()
+    uuid = export_record.delay(session, model_name, binding_id,
+                               fields=fields)
+    job_obj._carepoint_set_identity(uuid, identity_key, fields)
+    return uuid
+
+
+def _reset_batch_exports(session, exported):
+    """ Reset the bindings of an ``export_batch`` rolled back on Carepoint
+    only, so they are all exported again. The new records are unbound, and
+    the hash of the others is cleared.
+    :param exported: ``(model name, binding id, created)`` tuples of the
+        bindings exported in the batch
+    :type exported: list
+    """
+    for model_name, binding_id, created in exported:
+        values = {'export_hash': False}
+        if created:
+            values['carepoint_id'] = False
+        binding = session.env[model_name].browse(binding_id)
+        binding.with_context(connector_no_export=True).write(values)
+
+
+@job(default_channel='root.carepoint')
+def export_batch(session, model_name, binding_ids, fields=None):
+    """ Export several records to Carepoint in a single transaction
+
+    The bindings and their dependencies are exported in one
+    ``carepoint_transaction``. The bindings of each backend are exported
+    by the ``run_batch`` of its exporter.
+
+    Odoo is committed before Carepoint, so nothing is left on Carepoint if
+    the Odoo commit fails. If the Carepoint commit fails afterwards, the
+    exported bindings are reset (see :func:`_reset_batch_exports`), so the
+    records rolled back on Carepoint are not taken as exported.
+
+    If any of the exports fails, both sides are rolled back. In all of the
+    failure cases, each binding is delayed again as a separate export job.
+    """
+    records = session.env[model_name].browse(binding_ids)
+    # bindings committed on Odoo, to reset if Carepoint is not committed
+    committed = []
+
+    def commit_odoo():
+        session.commit()
+        committed.extend(_batch.exported)
+
+    _batch.exported = []
+    try:
+        with carepoint_transaction(before_commit=commit_odoo):
+            with session.cr.savepoint():
+                for backend in records.mapped('backend_id'):
+                    env = get_environment(session, model_name, backend.id)
+                    exporter = env.get_connector_unit(CarepointExporter)
+                    exporter.run_batch(
+                        records.filtered(
+                            lambda r: r.backend_id == backend
+                        ).ids,
+                        fields=fields,
+                    )
+    except Exception as e:
+        _logger.info('Batch export of %d records from %s failed, delaying '
+                     'them separately: %s', len(binding_ids), model_name, e)
+        session.env.invalidate_all()
+        clear_binder_cache(session.cr)
+        _reset_batch_exports(session, committed)
+        for binding_id in binding_ids:
+            delay_export_coalesced(session, model_name, binding_id,
+                                   fields=fields)
+        # the dependencies rolled back on Carepoint are exported again too
+        for dependency_model, binding_id, _created in committed:
+            if dependency_model != model_name or \
+                    binding_id not in binding_ids:
+                delay_export_coalesced(session, dependency_model, binding_id)
+        return _('Batch export failed, %d records delayed separately.') % (
+            len(binding_ids),
+        )
+    finally:
+        _batch.exported = None
+    return _('%d records exported.') % len(binding_ids)
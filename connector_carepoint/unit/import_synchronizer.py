@@ -12,13 +12,17 @@ are already bound, to update the last sync date.
 """
 
 
+import hashlib
 import logging
+from multiprocessing.pool import ThreadPool
 from odoo import fields, _
 from odoo.addons.connector.queue.job import job
-from odoo.addons.connector.connector import ConnectorUnit
+from odoo.addons.connector.connector import ConnectorUnit, Binder
 from odoo.addons.connector.unit.synchronizer import Importer
 from ..backend import carepoint
 from ..connector import get_environment, add_checkpoint
+from .binder import clear_binder_cache
+from .mapper import CarepointImportMapper
 
 
 _logger = logging.getLogger(__name__)
@@ -31,9 +35,38 @@ def int_or_str(val):
         return str(val)
 
 
+def _read_dependency(importer):
+    """ Read the Carepoint data of a dependency importer in a worker thread.
+    Errors are left to the sequential import, which reads the data again.
+    """
+    try:
+        return importer._get_carepoint_data()
+    except Exception:
+        _logger.debug('Prefetch of CP Record %s from %s failed',
+                      importer.carepoint_id, importer.model._name,
+                      exc_info=True)
+
+
 class CarepointImporter(Importer):
     """ Base importer for Carepoint """
 
+    # Maximum amount of threads used by :meth:`_prefetch_dependencies`.
+    # Dependencies are not prefetched when 0.
+    _dependency_workers = 0
+    # Write the binding fields (``carepoint_id``, ``sync_date``) in the
+    # same create or write as the record data, instead of a separate write
+    # in ``Binder.bind``. Meant for simple reference tables without any
+    # dependency on the binding being created.
+    _bind_with_data = False
+
+    # Carepoint fields read by the importer itself (dependencies, hooks),
+    # on top of the ones read by its mapper. See _get_read_attributes.
+    _extra_columns = []
+
+    # Carepoint fields left out of the fingerprint of the records. They
+    # change without any change of the data (see _get_import_hash).
+    _import_hash_ignore = ['chg_date', 'chg_user_id']
+
     def __init__(self, connector_env):
         """
         :param connector_env: current environment (backend, session, ...)
@@ -42,11 +75,59 @@ class CarepointImporter(Importer):
         super(CarepointImporter, self).__init__(connector_env)
         self.carepoint_id = None
         self.carepoint_record = None
+        self._prefetched_records = {}
+        # False until computed by _get_read_attributes
+        self._read_attributes = False
+
+    def _get_read_attributes(self):
+        """ Return the Carepoint fields to read for a record
+        They are the source fields of the mapper, the ``_extra_columns``,
+        the primary keys and ``chg_date`` when the table has it.
+        :return: List of field names, or None to read all of them, when
+            the mapper does not declare all of its source fields
+        :rtype: list or None
+        """
+        if self._read_attributes is not False:
+            return self._read_attributes
+        attributes = None
+        base_mapper = self._base_mapper
+        if base_mapper and issubclass(base_mapper, CarepointImportMapper):
+            fields = self.mapper.source_fields()
+            if fields is not None:
+                fields.update(self._extra_columns)
+                fields.update(self.backend_adapter.get_pks())
+                fields.add('chg_date')
+                attributes = [name for name in
+                              self.backend_adapter.get_columns()
+                              if name in fields]
+        self._read_attributes = attributes
+        return attributes
 
     def _get_carepoint_data(self):
-        """ Return the raw Carepoint data for ``self.carepoint_id`` """
+        """ Return the raw Carepoint data for ``self.carepoint_id``
+        Only the columns of :meth:`_get_read_attributes` are read when
+        they are known, and the record is then returned as a ``dict``.
+        """
         _logger.debug('Getting CP data for %s', self.carepoint_id)
-        return self.backend_adapter.read(self.carepoint_id)
+        attributes = self._get_read_attributes()
+        if attributes is None:
+            return self.backend_adapter.read(self.carepoint_id)
+        record = self.backend_adapter.read(self.carepoint_id, attributes)
+        return self.backend_adapter.to_dict(record)
+
+    def read_records(self, carepoint_ids):
+        """ Return the raw Carepoint data of several records, read at once
+        The same columns are read as by :meth:`_get_carepoint_data`.
+        :param carepoint_ids: identifiers of the records on Carepoint
+        :type carepoint_ids: list
+        :return: Records keyed by their ``carepoint_id``. The records that
+            are not found are left out.
+        :rtype: dict
+        """
+        records = self.backend_adapter.read_many(
+            carepoint_ids, self._get_read_attributes(),
+        )
+        return {int_or_str(_id): record for _id, record in records.items()}
 
     def _before_import(self):
         """ Hook called before the import, when we have the Carepoint
@@ -74,6 +155,22 @@ class CarepointImporter(Importer):
         # miss changes done in Carepoint
         return carepoint_date < sync_date
 
+    def _get_import_hash(self):
+        """ Return a fingerprint of the Carepoint record
+        It is stored on the binding, so that a record whose data did not
+        change is not mapped and written again.
+        :return: Hash of the record, or None if the record is not a
+            ``dict``, which happens when its columns are not projected.
+        :rtype: str or None
+        """
+        if not isinstance(self.carepoint_record, dict):
+            return None
+        values = sorted(
+            (k, v) for k, v in self.carepoint_record.items()
+            if k not in self._import_hash_ignore
+        )
+        return hashlib.sha1(repr(values)).hexdigest()
+
     def _import_dependency(self, carepoint_id, binding_model,
                            importer_class=None, always=False):
         """ Import a dependency.
@@ -102,7 +199,55 @@ class CarepointImporter(Importer):
         binder = self.binder_for(binding_model)
         if always or binder.to_odoo(carepoint_id) is None:
             importer = self.unit_for(importer_class, model=binding_model)
-            importer.run(carepoint_id)
+            record = self._prefetched_records.pop(
+                (binding_model, str(carepoint_id)), None,
+            )
+            if record is None:
+                importer.run(carepoint_id)
+            else:
+                importer.run(carepoint_id, record=record)
+
+    def _prefetch_dependencies(self, dependencies):
+        """ Read the Carepoint data of several dependencies concurrently
+        The data of the dependencies that are not imported yet is read in a
+        pool of at most ``_dependency_workers`` threads, then used by
+        :meth:`_import_dependency` instead of reading it again. The Odoo
+        side of the imports is still done sequentially in the job cursor,
+        so the ``_get_carepoint_data`` of the dependency importers must only
+        use their backend adapter.
+        :param dependencies: ``(carepoint_id, binding_model)`` tuples of the
+            dependencies that do not depend on each other
+        :type dependencies: list
+        """
+        if not self._dependency_workers:
+            return
+        importers = []
+        for carepoint_id, binding_model in dependencies:
+            if not carepoint_id:
+                continue
+            binder = self.binder_for(binding_model)
+            if binder.to_odoo(carepoint_id) is not None:
+                continue
+            importer = self.unit_for(CarepointImporter, model=binding_model)
+            importer.carepoint_id = carepoint_id
+            # Build the adapter (reading the connection settings of the
+            # backend and resolving the model metadata) and the mapper in
+            # this thread, so the workers only query Carepoint
+            importer.backend_adapter.get_pks()
+            importer._get_read_attributes()
+            importers.append(importer)
+        if len(importers) < 2:
+            return
+        pool = ThreadPool(min(self._dependency_workers, len(importers)))
+        try:
+            records = pool.map(_read_dependency, importers)
+        finally:
+            pool.close()
+            pool.join()
+        for importer, record in zip(importers, records):
+            if record is not None:
+                key = (importer.model._name, str(importer.carepoint_id))
+                self._prefetched_records[key] = record
 
     def _import_dependencies(self):
         """ Import the dependencies for the record
@@ -117,6 +262,17 @@ class CarepointImporter(Importer):
         """
         return self.mapper.map_record(self.carepoint_record)
 
+    def prefetch_records(self, records):
+        """ Let the mapper resolve the lookups of many records at once
+        The importer can then be run for each of these records, and its
+        mapper will use the prefetched values instead of searching them
+        one record at a time.
+        :param records: Carepoint records that will be imported next
+        :type records: list
+        """
+        if isinstance(self.mapper, CarepointImportMapper):
+            self.mapper.prefetch(records)
+
     def _validate_data(self, data):
         """ Check if the values to import are correct
         Pro-actively check before the ``_create`` or
@@ -173,16 +329,30 @@ class CarepointImporter(Importer):
         )
         return
 
+    def _with_bind_values(self, data):
+        """ Add the binding fields to the record data if they are written
+        along with it (see ``_bind_with_data``)
+        """
+        if self._bind_with_data:
+            data = dict(data, **self.binder.bind_values(self.carepoint_id))
+        return data
+
     def _after_import(self, binding):
         """ Hook called at the end of the import """
         return
 
-    def run(self, carepoint_id, force=False):
+    def run(self, carepoint_id, force=False, record=None):
         """ Run the synchronization
         :param carepoint_id: identifier of the record on Carepoint
+        :param force: import the record even if it is already up to date
+        :param record: raw Carepoint data for the record, if already read
+            by the caller. It is read from Carepoint when not provided.
+        :type record: dict or None
         """
         self.carepoint_id = carepoint_id
-        self.carepoint_record = self._get_carepoint_data()
+        if record is None:
+            record = self._get_carepoint_data()
+        self.carepoint_record = record
         _logger.debug('self.carepoint_record - %s', self.carepoint_record)
         lock_name = 'import({}, {}, {}, {})'.format(
             self.backend_record._name,
@@ -201,6 +371,14 @@ class CarepointImporter(Importer):
 
         if not force and self._is_current(binding):
             return _('Already Up To Date.')
+
+        import_hash = self._get_import_hash()
+        if not force and binding and import_hash and \
+                binding.import_hash == import_hash:
+            # Same data as the last import, only the sync date is updated
+            self.binder.bind(self.carepoint_id, binding)
+            return _('Already Up To Date.')
+
         self._before_import()
 
         # import the missing linked resources
@@ -211,12 +389,24 @@ class CarepointImporter(Importer):
 
         if binding:
             record = self._update_data(map_record)
-            self._update(binding, record)
+            if import_hash:
+                record = dict(record, import_hash=import_hash)
+            if getattr(binding, 'export_hash', False):
+                # The record now holds the Carepoint data, which may differ
+                # from the values exported last, so the next export must
+                # not be skipped
+                record = dict(record, export_hash=False)
+            self._update(binding, self._with_bind_values(record))
         else:
             record = self._create_data(map_record)
-            binding = self._create(record)
+            if import_hash:
+                record = dict(record, import_hash=import_hash)
+            binding = self._create(self._with_bind_values(record))
 
-        self.binder.bind(self.carepoint_id, binding)
+        if self._bind_with_data:
+            self.binder.bind(self.carepoint_id, binding, write=False)
+        else:
+            self.binder.bind(self.carepoint_id, binding)
 
         self._after_import(binding)
 
@@ -225,20 +415,152 @@ class BatchImporter(Importer):
     """ The role of a BatchImporter is to search for a list of
     items to import, then it can either import them directly or delay
     the import of each item separately.
+
+    When ``_chunk_size`` is set, records are read from Carepoint in
+    chunks of this size. The columns of :meth:`_get_chunk_attributes` are
+    read, and handed to the record importers.
+
+    When the search is filtered on ``chg_date`` (incremental imports) and
+    ``_skip_current`` is set, the records whose bindings were synchronized
+    after their last change on Carepoint are not imported.
+
+    When ``batch`` is set, the position of the import is saved in this
+    ``carepoint.import.batch`` every ``_checkpoint_size`` records, and a
+    restarted import resumes after it.
     """
 
+    _chunk_size = None
+    _skip_current = True
+    _checkpoint_size = 1000
+    batch = None
+
+    def _must_filter_current(self, filters):
+        """ Return True if current records can be filtered out in bulk """
+        return self._skip_current and 'chg_date' in filters
+
+    def _filter_current(self, record_dates):
+        """ Return the IDs of the records that are not up to date in Odoo
+        It mirrors :meth:`CarepointImporter._is_current` for many records,
+        using one query on the bindings.
+        :param record_dates: ``chg_date`` of the records, keyed by ID
+        :type record_dates: dict
+        :rtype: list
+        """
+        if not record_dates:
+            return []
+        bindings = self.model.with_context(active_test=False).search_read(
+            [('carepoint_id', 'in', [str(i) for i in record_dates]),
+             ('backend_id', '=', self.backend_record.id),
+             ],
+            ['carepoint_id', 'sync_date'],
+        )
+        sync_dates = {b['carepoint_id']: b['sync_date'] for b in bindings}
+        from_string = fields.Datetime.from_string
+        record_ids = []
+        for record_id in sorted(record_dates):
+            carepoint_date = record_dates[record_id]
+            sync = sync_dates.get(str(record_id))
+            if not (carepoint_date and sync and
+                    carepoint_date < from_string(sync)):
+                record_ids.append(record_id)
+        _logger.debug('%d of %d %s records are not up to date',
+                      len(record_ids), len(record_dates), self.model._name)
+        return record_ids
+
+    def _start_batch(self, filters):
+        """ Start the batch of the import, if any
+        :return: Id of the record to resume after, or None
+        """
+        if not self.batch:
+            return None
+        if not self.batch.date_start:
+            self.batch._start(self.backend_adapter.search_count(**filters))
+        after = self.batch._get_cursor()
+        if after is not None:
+            _logger.info('Resuming the import of %s after %s',
+                         self.model._name, after)
+        return after
+
+    def _checkpoint(self, record_id, count):
+        """ Save the position of the import in its batch
+        The transaction is committed, so that the jobs delayed up to this
+        record are kept when the import is restarted.
+        :param record_id: ID of the last record processed
+        :param count: Amount of records processed since the last checkpoint
+        :type count: int
+        """
+        if not self.batch:
+            return
+        self.batch._save_progress(record_id, count)
+        self.session.commit()
+
     def run(self, filters=None):
         """ Run the synchronization """
         if filters is None:
             filters = {}
-        record_ids = self.backend_adapter.search(**filters)
-        _logger.info('Search for carepoint companies %s returned %s\n',
-                     filters, record_ids)
+        after = self._start_batch(filters)
+        if self._chunk_size:
+            return self._run_chunked(filters, after)
+        if self._must_filter_current(filters):
+            return self._run_filter_current(filters, after)
+        record_ids = self.backend_adapter.iter_search(after=after, **filters)
+        _logger.info('Searching for carepoint records with %s', filters)
+        count = 0
         for record_id in record_ids:
             _logger.info('In record loop with %s', record_id)
             self._import_record(record_id)
+            count += 1
+            if count >= self._checkpoint_size:
+                self._checkpoint(record_id, count)
+                count = 0
+        if count:
+            self._checkpoint(record_id, count)
+
+    def _run_filter_current(self, filters, after=None):
+        """ Run the synchronization for the records that are not current """
+        chunks = self.backend_adapter.search_read_chunks(
+            attributes=['chg_date'], after=after, **filters
+        )
+        for chunk in chunks:
+            record_ids = self._filter_current({
+                record_id: record['chg_date'] for record_id, record in chunk
+            })
+            for record_id in record_ids:
+                self._import_record(record_id)
+            self._checkpoint(chunk[-1][0], len(chunk))
+
+    def _get_chunk_attributes(self):
+        """ Return the Carepoint fields read by :meth:`_run_chunked`
+        They are the ones read by the record importer, so that the records
+        it is handed, and their ``import_hash``, are the same as when it
+        reads them itself.
+        :return: List of field names, or None to read all of them
+        :rtype: list or None
+        """
+        return self.unit_for(CarepointImporter)._get_read_attributes()
 
-    def _import_record(self, record_id):
+    def _run_chunked(self, filters, after=None):
+        """ Run the synchronization using chunks of records """
+        chunks = self.backend_adapter.search_read_chunks(
+            self._chunk_size, self._get_chunk_attributes(), after=after,
+            **filters
+        )
+        for chunk in chunks:
+            _logger.info('Search for %s with %s returned a chunk of %d',
+                         self.model._name, filters, len(chunk))
+            if self._must_filter_current(filters):
+                stale_ids = set(self._filter_current({
+                    record_id: record.get('chg_date')
+                    for record_id, record in chunk
+                }))
+                stale = [c for c in chunk if c[0] in stale_ids]
+            else:
+                stale = chunk
+            for record_id, record in stale:
+                self._import_record(record_id, record=record)
+            self._checkpoint(chunk[-1][0], len(chunk))
+
+    def _import_record(self, record_id, **kwargs):
         """ Import a record directly or delay the import of the record.
         Method to implement in sub-classes.
         """
@@ -249,25 +571,79 @@ class DirectBatchImporter(BatchImporter):
     """ Import the records directly, without delaying the jobs. """
     _model_name = None
 
-    def _import_record(self, record_id):
+    def _import_record(self, record_id, **kwargs):
         """ Import the record directly """
         import_record(self.session,
                       self.model._name,
                       self.backend_record.id,
-                      int_or_str(record_id))
+                      int_or_str(record_id),
+                      **kwargs)
 
 
 class DelayedBatchImporter(BatchImporter):
-    """ Delay import of the records """
+    """ Delay import of the records
+
+    When ``_job_chunk_size`` is set, one ``import_record_batch`` job is
+    delayed for every chunk of this many records, instead of one
+    ``import_record`` job per record.
+
+    Only the ids of the records are delayed. The jobs read the records
+    again, so the queue does not store the Carepoint data.
+    """
     _model_name = None
+    _job_chunk_size = None
 
-    def _import_record(self, record_id, **kwargs):
+    def __init__(self, connector_env):
+        """
+        :param connector_env: current environment (backend, session, ...)
+        :type connector_env: :class:`connector.connector.ConnectorEnvironment`
+        """
+        super(DelayedBatchImporter, self).__init__(connector_env)
+        self._chunk_ids = []
+
+    def _get_chunk_attributes(self):
+        """ Only read what is needed to filter the current records """
+        return ['chg_date']
+
+    def _checkpoint(self, record_id, count):
+        """ Delay the current chunk before saving the position """
+        if self.batch:
+            self._delay_chunk()
+        return super(DelayedBatchImporter, self)._checkpoint(
+            record_id, count,
+        )
+
+    def run(self, filters=None):
+        """ Run the synchronization, then delay the last partial chunk """
+        res = super(DelayedBatchImporter, self).run(filters)
+        self._delay_chunk()
+        return res
+
+    def _import_record(self, record_id, record=None, **kwargs):
         """ Delay the import of the records"""
-        import_record.delay(self.session,
-                            self.model._name,
-                            self.backend_record.id,
-                            int_or_str(record_id),
-                            **kwargs)
+        if self._job_chunk_size:
+            return self._add_to_chunk(record_id)
+        delay_import_coalesced(self.session,
+                               self.model._name,
+                               self.backend_record.id,
+                               int_or_str(record_id),
+                               **kwargs)
+
+    def _add_to_chunk(self, record_id):
+        """ Add a record to the current chunk, delay it once full """
+        self._chunk_ids.append(int_or_str(record_id))
+        if len(self._chunk_ids) >= self._job_chunk_size:
+            self._delay_chunk()
+
+    def _delay_chunk(self):
+        """ Delay the import of the current chunk of records """
+        if not self._chunk_ids:
+            return
+        import_record_batch.delay(self.session,
+                                  self.model._name,
+                                  self.backend_record.id,
+                                  self._chunk_ids)
+        self._chunk_ids = []
 
 
 @carepoint
@@ -297,17 +673,118 @@ class AddCheckpoint(ConnectorUnit):
 
 
 @job(default_channel='root.carepoint')
-def import_batch(session, model_name, backend_id, filters=None):
-    """ Prepare a batch import of records from Carepoint """
+def import_batch(session, model_name, backend_id, filters=None,
+                 window_id=None, batch_id=None):
+    """ Prepare a batch import of records from Carepoint
+    :param window_id: ID of the ``carepoint.import.window`` imported by the
+        job, which is marked as done at the end of the import
+    :type window_id: int or None
+    :param batch_id: ID of the ``carepoint.import.batch`` keeping the
+        progress of the job, which resumes from its cursor when restarted
+    :type batch_id: int or None
+    """
     env = get_environment(session, model_name, backend_id)
     importer = env.get_connector_unit(BatchImporter)
+    batch = session.env['carepoint.import.batch'].browse(batch_id).exists()
+    if batch:
+        importer.batch = batch
     importer.run(filters=filters)
+    if batch:
+        batch._set_done()
+    if window_id:
+        window = session.env['carepoint.import.window'].browse(window_id)
+        if window.exists():
+            window._set_done()
 
 
 @job(default_channel='root.carepoint')
-def import_record(session, model_name, backend_id, carepoint_id, force=False):
+def import_record(session, model_name, backend_id, carepoint_id, force=False,
+                  record=None):
     """ Import a record from Carepoint """
     env = get_environment(session, model_name, backend_id)
     importer = env.get_connector_unit(CarepointImporter)
     _logger.debug('Importing CP Record %s from %s', carepoint_id, model_name)
-    importer.run(carepoint_id, force=force)
+    importer.run(carepoint_id, force=force, record=record)
+
+
+def delay_import_coalesced(session, model_name, backend_id, carepoint_id,
+                           force=False):
+    """ Delay a job which import a record, unless one is pending.
+    A pending import job of the same record that is not started yet
+    absorbs the request, unless only the request is forced. Otherwise it
+    is replaced by a forced job.
+    :return: UUID of the job importing the record
+    """
+    job_obj = session.env['queue.job'].sudo()
+    identity_key = 'import_record(%s, %s, %s)' % (
+        model_name, backend_id, carepoint_id,
+    )
+    pending = job_obj._carepoint_lock_pending(identity_key)
+    if pending:
+        if pending.carepoint_force or not force:
+            return pending.uuid
+        _logger.debug('Replacing pending job %s with a forced import',
+                      identity_key)
+        pending.unlink()
+    uuid = import_record.delay(session, model_name, backend_id,
+                               carepoint_id, force=force)
+    job_obj._carepoint_set_identity(uuid, identity_key, force=force)
+    return uuid
+
+
+@job(default_channel='root.carepoint')
+def import_record_batch(session, model_name, backend_id, carepoint_ids,
+                        force=False):
+    """ Import a chunk of records from Carepoint
+
+    The records are read from Carepoint in one query, then each record is
+    imported in its own savepoint. The records that fail are delayed again
+    as separate ``import_record`` jobs, so one bad record does not fail the
+    whole chunk.
+    """
+    env = get_environment(session, model_name, backend_id)
+    records = {}
+    # Resolve the existing bindings of the chunk at once, the importers
+    # will then find them in the binder cache
+    env.get_connector_unit(Binder).to_odoo_many(carepoint_ids)
+    # The same importer is used for the whole chunk, so that its mapper
+    # prefetches the lookups of all the records once
+    importer = env.get_connector_unit(CarepointImporter)
+    try:
+        with session.cr.savepoint():
+            records = importer.read_records(carepoint_ids)
+            importer.prefetch_records(
+                [records[_id] for _id in carepoint_ids if records.get(_id)]
+            )
+    except Exception as e:
+        # The records are then read and imported one at a time
+        _logger.info('Prefetch of a chunk of %s failed, importing its '
+                     'records one at a time: %s', model_name, e)
+        records = {}
+        session.env.invalidate_all()
+        importer = env.get_connector_unit(CarepointImporter)
+    failed_ids = []
+    for carepoint_id in carepoint_ids:
+        try:
+            with session.cr.savepoint():
+                importer.run(carepoint_id,
+                             force=force,
+                             record=records.get(carepoint_id))
+        except Exception as e:
+            _logger.info('Import of CP Record %s from %s failed in chunk, '
+                         'delaying it separately: %s',
+                         carepoint_id, model_name, e)
+            session.env.invalidate_all()
+            clear_binder_cache(session.cr)
+            failed_ids.append(carepoint_id)
+            # Prefetched values may refer to rolled back records
+            importer = env.get_connector_unit(CarepointImporter)
+    for carepoint_id in failed_ids:
+        delay_import_coalesced(session,
+                               model_name,
+                               backend_id,
+                               carepoint_id,
+                               force=force)
+    return _('%d records imported, %d delayed separately.') % (
+        len(carepoint_ids) - len(failed_ids), len(failed_ids),
+    )
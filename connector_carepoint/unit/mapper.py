@@ -22,6 +22,7 @@ def trim(field):
         if not value:
             return False
         return str(value).strip()
+    modifier._cp_source = field
     return modifier
 
 
@@ -38,6 +39,7 @@ def trim_and_titleize(field):
         if not value:
             return False
         return str(value).strip().title()
+    modifier._cp_source = field
     return modifier
 
 
@@ -54,6 +56,7 @@ def to_float(field):
         if not value:
             return False
         return float(value)
+    modifier._cp_source = field
     return modifier
 
 
@@ -70,6 +73,7 @@ def to_int(field):
         if not value:
             return False
         return int(value)
+    modifier._cp_source = field
     return modifier
 
 
@@ -85,16 +89,162 @@ def add_to(field, number):
     def modifier(self, record, to_attr):
         value = record[field]
         return float(value) + number
+    modifier._cp_source = field
     return modifier
 
 
+def reads(*fields):
+    """ Decorator to declare the source fields read by a ``@mapping``
+    method of an import mapper, so that only the needed columns are read
+    from Carepoint (see :meth:`CarepointImportMapper.source_fields`).
+    A mapping without this declaration is assumed to read any field.
+    On an export mapper, it declares the Odoo fields read by a mapping
+    method that has no ``@changed_by``, such as ``@reads()`` for static
+    values (see :func:`export_source_fields`).
+    Example::
+        @mapping
+        @reads('fname', 'lname')
+        def name(self, record):
+            return {'name': '%s %s' % (record['fname'], record['lname'])}
+    :param fields: names of the source fields in the record
+    """
+
+    def decorator(func):
+        func._cp_reads = fields
+        return func
+    return decorator
+
+
+def prefetch(func):
+    """ Decorator to declare a bulk prefetch hook on an import mapper.
+    The hook receives all the records of a batch before they are mapped
+    one by one (see :meth:`CarepointImporter.prefetch_records`), so it can
+    resolve their lookups with a single query and store the result in
+    ``self.prefetched`` for the ``@mapping`` methods.
+    Example::
+        @prefetch
+        def _prefetch_codes(self, records):
+            codes = [r['code'] for r in records]
+            self.prefetched['code'] = dict(...)
+    """
+    func.is_prefetch = True
+    return func
+
+
+def _direct_source_field(source):
+    """ Return the source field name of a ``direct`` mapping entry
+    It goes through the modifiers, such as ``none(convert('field', str))``,
+    that keep their source field in a ``field`` closure variable.
+    :param source: source of the ``direct`` mapping entry
+    :return: Name of the source field, or None if it cannot be determined
+    :rtype: str or None
+    """
+    while callable(source):
+        if getattr(source, '_cp_source', None):
+            return source._cp_source
+        code = getattr(source, '__code__', None)
+        if code is None or not source.__closure__:
+            return None
+        cells = dict(zip(
+            code.co_freevars,
+            (cell.cell_contents for cell in source.__closure__),
+        ))
+        if 'field' not in cells:
+            return None
+        source = cells['field']
+    return source
+
+
+def export_source_fields(mapper):
+    """ Return the Odoo fields read by an export mapper
+    They are the sources of its ``direct`` mappings and the fields of the
+    ``@changed_by`` of its ``@mapping`` methods. A mapping method without
+    ``@changed_by`` is applied on every export, so it must declare the
+    fields it reads with ``@reads``, otherwise they cannot be determined.
+    :param mapper: Export mapper instance
+    :type mapper: :class:`odoo.addons.connector.unit.mapper.ExportMapper`
+    :return: Set of field names, or None if they cannot all be determined
+    :rtype: set or None
+    """
+    if mapper.children:
+        return None
+    fields = set()
+    for source, _ in mapper.direct:
+        source = _direct_source_field(source)
+        if source is None:
+            return None
+        fields.add(source)
+    for name, definition in mapper._map_methods.items():
+        if definition.changed_by:
+            fields.update(definition.changed_by)
+            continue
+        method_reads = getattr(getattr(mapper, name), '_cp_reads', None)
+        if method_reads is None:
+            return None
+        fields.update(method_reads)
+    return fields
+
+
 class CarepointImportMapper(ImportMapper):
 
+    def __init__(self, connector_env):
+        """
+        :param connector_env: current environment (backend, session, ...)
+        :type connector_env: :class:`connector.connector.ConnectorEnvironment`
+        """
+        super(CarepointImportMapper, self).__init__(connector_env)
+        self.prefetched = {}
+
+    def _prefetch_methods(self):
+        """ Return the bound prefetch hooks of the mapper """
+        cls = type(self)
+        return [getattr(self, name) for name in dir(cls)
+                if getattr(getattr(cls, name), 'is_prefetch', False)]
+
+    def prefetch(self, records):
+        """ Run the prefetch hooks over a batch of records
+        :param records: Carepoint records that will be mapped next
+        :type records: list
+        """
+        self.prefetched = {}
+        records = list(records)
+        if not records:
+            return
+        for method in self._prefetch_methods():
+            method(records)
+
+    def source_fields(self):
+        """ Return the Carepoint fields read by the mapper
+        They are gathered from the ``direct`` mappings and the fields
+        declared with :func:`reads` on the ``@mapping`` methods.
+        :return: Set of field names, or None if the mapper may read other
+            fields (modifiers or mappings without declared sources, or
+            children mappings)
+        :rtype: set or None
+        """
+        if self.children:
+            return None
+        fields = set()
+        for source, _ in self.direct:
+            if callable(source):
+                source = getattr(source, '_cp_source', None)
+                if source is None:
+                    return None
+            fields.add(source)
+        for name in self._map_methods:
+            method_fields = getattr(getattr(self, name), '_cp_reads', None)
+            if method_fields is None:
+                return None
+            fields.update(method_fields)
+        return fields
+
     @mapping
+    @reads()
     def backend_id(self, record):
         return {'backend_id': self.backend_record.id}
 
     @mapping
+    @reads()
     def company_id(self, record):
         return {'company_id': self.backend_record.company_id.id}
 
@@ -102,14 +252,17 @@ class CarepointImportMapper(ImportMapper):
 class PartnerImportMapper(CarepointImportMapper):
 
     @mapping
+    @reads()
     def tz(self, record):
         return {'tz': self.backend_record.default_tz}
 
     @mapping
+    @reads()
     def currency_id(self, record):
         return {'currency_id': self.backend_record.company_id.currency_id.id}
 
     @mapping
+    @reads()
     def property_account_payable_id(self, record):
         return {
             'property_account_payable_id':
@@ -117,6 +270,7 @@ class PartnerImportMapper(CarepointImportMapper):
         }
 
     @mapping
+    @reads()
     def property_payment_term_id(self, record):
         return {
             'property_payment_term_id':
@@ -124,6 +278,7 @@ class PartnerImportMapper(CarepointImportMapper):
         }
 
     @mapping
+    @reads()
     def property_supplier_payment_term_id(self, record):
         return {
             'property_supplier_payment_term_id':
@@ -131,6 +286,7 @@ class PartnerImportMapper(CarepointImportMapper):
         }
 
     @mapping
+    @reads()
     def property_account_receivable_id(self, record):
         return {
             'property_account_receivable_id':
@@ -150,6 +306,7 @@ class PersonImportMapper(PartnerImportMapper):
         return ' '.join(name).title()
 
     @mapping
+    @reads('fname', 'lname')
     def name(self, record):
         return {'name': self._get_name(record)}
 